@@ -0,0 +1,82 @@
+""" Compare the per-title CPU time and memory of extracting fields with the compiled plan (a MovieRecord per title)
+against the per-movie dicts built before it, over the recorded page for The Matrix.
+
+    python benchmarks/bench_extract.py --titles 200000 --cast 100
+"""
+import argparse
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from imdb import Cinemagoer  # noqa: E402
+
+from cli import quiet_cinemagoer  # noqa: E402
+from fake_imdb import FakeIMDbServer  # noqa: E402
+from movie_data import IMDbData  # noqa: E402
+
+
+def dict_metadata(movie):
+    """ The extraction as it was: a dict built by walking the chosen fields, and getters that copy each list before
+    slicing it. """
+    return {field: field_data.get('method')(movie) for field, field_data in DICT_FIELDS.items()}
+
+
+DICT_METHODS = {
+    'Genres': lambda movie: ', '.join([g for g in movie.get('genres')][:IMDbData.MAX_GENRES]),
+    'Countries': lambda movie: ', '.join([c for c in movie.get('countries')][:IMDbData.MAX_COUNTRIES]),
+    'Cast': lambda movie: ', '.join([c['name'] for c in movie.get('cast')][:IMDbData.MAX_CAST]),
+    'Language': lambda movie: ', '.join([lang for lang in movie.get('languages')][:IMDbData.MAX_LANGS]),
+}
+DICT_FIELDS = {}
+
+
+def measure(extract, movie, titles):
+    """ Extract titles results, keeping them all (as a full reorder buffer or a batch awaiting a write would), and
+    return the microseconds of CPU and bytes of memory per title. Memory is traced in a second pass, as tracing slows
+    everything down. """
+    start = time.process_time()
+    results = [extract(movie) for _ in range(titles)]
+    elapsed = time.process_time() - start
+    del results
+
+    tracemalloc.start()
+    results = [extract(movie) for _ in range(titles)]
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del results
+    return elapsed / titles * 1e6, memory / titles
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--titles', type=int, default=100_000, help='titles to extract')
+    parser.add_argument('--cast', type=int, default=60, help='pad the cast list to this many names, as on a real page')
+    args = parser.parse_args()
+
+    quiet_cinemagoer()
+    data_source = IMDbData()
+    with FakeIMDbServer() as server:
+        movie = Cinemagoer(imdbURL_base=server.url).get_movie('0133093', info=('main', 'plot'))
+    cast = movie['cast']
+    movie['cast'] = (cast * (args.cast // len(cast) + 1))[:args.cast]
+
+    fields = [field for field in data_source.get_field_names() if field != 'Synopsis (long)']
+    data_source.set_chosen_fields(fields)
+    DICT_FIELDS.update({field: {'method': DICT_METHODS.get(field, field_data['method'])}
+                        for field, field_data in data_source.chosen_fields.items()})
+    assert dict(data_source._get_metadata(movie)) == dict_metadata(movie)
+
+    baseline = None
+    for name, extract in (('dict per title', dict_metadata), ('compiled plan', data_source._get_metadata)):
+        cpu, memory = measure(extract, movie, args.titles)
+        baseline = baseline or (cpu, memory)
+        print(f'{name:>15}: {cpu:6.2f} us/title ({baseline[0] / cpu:4.2f}x), {memory:6.0f} bytes/title '
+              f'({memory / baseline[1]:4.0%})')
+
+
+if __name__ == '__main__':
+    main()
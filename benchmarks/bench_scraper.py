@@ -0,0 +1,157 @@
+""" End-to-end, offline benchmark of the scraper against the local stand-in for IMDb.
+
+Runs Scraper.run for every combination of concurrency level and field selection, each in a fresh process so that peak
+RSS and CPU time are its own, and reports titles/s, per-title latency percentiles, peak RSS and CPU time. Results are
+saved as JSON so that runs from different versions can be compared:
+
+    python benchmarks/bench_scraper.py --ids 2000 --concurrency 8 32 128 --fields Title,Year all -o after.json
+    python benchmarks/bench_scraper.py ... --compare before.json
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from multiprocessing import Process, Queue
+from pathlib import Path
+from statistics import quantiles
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / 'src'))
+sys.path.insert(0, str(ROOT / 'benchmarks'))
+
+from cli import ConsoleProgress, quiet_cinemagoer  # noqa: E402
+from clients import ClientPool  # noqa: E402
+from fake_imdb import FakeIMDbServer  # noqa: E402
+from file_handler import CsvHandler  # noqa: E402
+from movie_data import IMDbData  # noqa: E402
+from scraper import ID_PATTERN, Scraper  # noqa: E402
+
+
+class TimedScraper(Scraper):
+    """ Records how long each title takes to fetch and extract. """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.latencies = []
+
+    def _get_movie(self, identifier, spec=None):
+        start = time.perf_counter()
+        result = super()._get_movie(identifier, spec)
+        self.latencies.append(time.perf_counter() - start)
+        return result
+
+
+def peak_rss_mb(usage):
+    # ru_maxrss is in kilobytes on Linux but bytes on macOS
+    return usage.ru_maxrss / (1024 * 1024 if platform.system() == 'Darwin' else 1024)
+
+
+def run_config(server_url, ids, fields, concurrency, results):
+    """ Scrape ids in this (child) process and put a summary of the run on the results queue. """
+    quiet_cinemagoer()
+    data_source = IMDbData()
+    data_source.set_client_pool(ClientPool(imdbURL_base=server_url))
+    scraper = TimedScraper(CsvHandler(ID_PATTERN), data_source, concurrency)
+    progress = ConsoleProgress(interval=float('inf'), stream=io.StringIO())
+    scraper.set_ui(progress)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        before = resource.getrusage(resource.RUSAGE_SELF)
+        start = time.perf_counter()
+        scraper.run(ids, fields, {}, os.path.join(tmp, 'output.csv'))
+        elapsed = time.perf_counter() - start
+        after = resource.getrusage(resource.RUSAGE_SELF)
+
+    latencies = quantiles(scraper.latencies, n=100) if len(scraper.latencies) > 1 else [0.0] * 99
+    results.put({'titles': progress.valid, 'invalid': progress.invalid, 'seconds': round(elapsed, 3),
+                 'titles_per_sec': round(progress.valid / elapsed, 2),
+                 'latency_ms': {'p50': round(latencies[49] * 1000, 2), 'p95': round(latencies[94] * 1000, 2),
+                                'p99': round(latencies[98] * 1000, 2)},
+                 'cpu_seconds': round(after.ru_utime + after.ru_stime - before.ru_utime - before.ru_stime, 3),
+                 'peak_rss_mb': round(peak_rss_mb(after), 1)})
+
+
+def benchmark(server, ids, field_sets, concurrency_levels):
+    all_fields = list(IMDbData().get_field_names())
+    for concurrency in concurrency_levels:
+        for field_set in field_sets:
+            fields = all_fields if field_set == 'all' else field_set.split(',')
+            requests = server.requests
+            results = Queue()
+            child = Process(target=run_config, args=(server.url, ids, fields, concurrency, results))
+            child.start()
+            result = results.get()
+            child.join()
+            result.update({'concurrency': concurrency, 'fields': field_set, 'requests': server.requests - requests})
+            yield result
+
+
+def key(result):
+    return result['concurrency'], result['fields']
+
+
+def compare(results, baseline_path):
+    """ Print how each configuration has changed since a saved baseline run. """
+    with open(baseline_path) as baseline_file:
+        baseline = {key(result): result for result in json.load(baseline_file)['results']}
+
+    print(f'\nCompared with {baseline_path}:')
+    for result in results:
+        old = baseline.get(key(result))
+        if old:
+            speed = (result['titles_per_sec'] / old['titles_per_sec'] - 1) if old['titles_per_sec'] else 0
+            p95 = result['latency_ms']['p95'] - old['latency_ms']['p95']
+            rss = result['peak_rss_mb'] - old['peak_rss_mb']
+            print(f'  x{result["concurrency"]:<4} {result["fields"]:<20} '
+                  f'titles/s {speed:+.1%}  p95 {p95:+.1f}ms  peak RSS {rss:+.1f}MB')
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--ids', type=int, default=1000, help='number of titles per run')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[8, 32, 128])
+    parser.add_argument('--fields', nargs='+', default=['Title,Year', 'all'],
+                        help="field selections to try: comma-separated field names, or 'all'")
+    parser.add_argument('--latency', type=float, default=0.05, help='base server latency, in seconds')
+    parser.add_argument('--jitter', type=float, default=0.05, help='extra random latency, up to this many seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests that fail with a 503')
+    parser.add_argument('-o', '--output', help='save the results to this JSON file')
+    parser.add_argument('--compare', help='a previously saved JSON file to compare against')
+    args = parser.parse_args()
+
+    ids = [f'{i:07d}' for i in range(1, args.ids + 1)]
+    server_config = {'latency': args.latency, 'jitter': args.jitter, 'error_rate': args.error_rate}
+    with FakeIMDbServer(seed=0, **server_config) as server:
+        results = []
+        for result in benchmark(server, ids, args.fields, args.concurrency):
+            results.append(result)
+            print(f'x{result["concurrency"]:<4} {result["fields"]:<20} '
+                  f'{result["titles_per_sec"]:8.1f} titles/s  p50/p95/p99 {result["latency_ms"]["p50"]:.0f}/'
+                  f'{result["latency_ms"]["p95"]:.0f}/{result["latency_ms"]["p99"]:.0f}ms  '
+                  f'cpu {result["cpu_seconds"]:.2f}s  peak RSS {result["peak_rss_mb"]:.0f}MB')
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump({'revision': git_revision(), 'python': platform.python_version(),
+                       'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'), 'ids': args.ids, 'server': server_config,
+                       'results': results}, output, indent=2)
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
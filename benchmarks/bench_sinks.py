@@ -0,0 +1,71 @@
+""" Compare the write throughput and file size of each output sink against plain CSV.
+
+    python benchmarks/bench_sinks.py --rows 200000
+"""
+import argparse
+import importlib.util
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+
+from file_handler import CsvHandler  # noqa: E402
+
+FIELDS = ['Title', 'Director', 'Genres', 'Synopsis (short)', 'Year', 'Countries', 'Cast', 'Runtime', 'Language',
+          'IMDb rating', 'IMDb ID', 'URL']
+WORDS = ('the', 'matrix', 'neo', 'reality', 'hacker', 'machine', 'war', 'city', 'dream', 'night', 'love', 'story')
+
+
+def make_rows(count, seed=0):
+    """ Rows shaped like the scraper's output, with all fields chosen. """
+    rng = random.Random(seed)
+    for i in range(count):
+        words = [rng.choice(WORDS) for _ in range(25)]
+        yield {'Title': ' '.join(words[:3]).title(), 'Director': 'Lana Wachowski, Lilly Wachowski',
+               'Genres': 'Action, Sci-Fi', 'Synopsis (short)': ' '.join(words).capitalize() + '.',
+               'Year': rng.randint(1920, 2024), 'Countries': 'United States, Australia',
+               'Cast': 'Keanu Reeves, Laurence Fishburne, Carrie-Anne Moss', 'Runtime': str(rng.randint(80, 180)),
+               'Language': 'English', 'IMDb rating': round(rng.uniform(1, 10), 1), 'IMDb ID': f'tt{i:07d}',
+               'URL': f'http://www.imdb.com/title/tt{i:07d}'}
+
+
+def run(path, rows):
+    """ Stream rows to path, returning the seconds taken. """
+    handler = CsvHandler(r'tt(\d+)')
+    start = time.perf_counter()
+    with handler.open_writer(FIELDS, path) as writer:
+        for row in rows:
+            writer.write_row(row)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100_000, help='rows to write to each sink')
+    args = parser.parse_args()
+
+    names = ['movies.csv', 'movies.csv.gz', 'movies.jsonl', 'movies.jsonl.gz', 'movies.sqlite']
+    if importlib.util.find_spec('zstandard'):
+        names[2:2] = ['movies.csv.zst']
+        names.append('movies.jsonl.zst')
+    else:
+        print('(zstandard is not installed, skipping .zst)')
+
+    rows = list(make_rows(args.rows))
+    with tempfile.TemporaryDirectory() as tmp:
+        baseline = None
+        for name in names:
+            path = os.path.join(tmp, name)
+            elapsed = run(path, rows)
+            size = os.path.getsize(path)
+            baseline = baseline or (elapsed, size)
+            print(f'{name:>18}: {args.rows / elapsed:9.0f} rows/s ({baseline[0] / elapsed:4.2f}x csv), '
+                  f'{size / 1e6:7.1f} MB ({size / baseline[1]:4.0%} of csv)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+""" Cold-start benchmark: how long each entry point takes to import, and how long the CLI takes from launch until its
+first request reaches the local stand-in for IMDb. Every measurement is the median of several fresh processes, and is
+checked against a budget, so that a slower start shows up (and fails the run) the release it creeps in:
+
+    python benchmarks/bench_startup.py --runs 9 -o startup.json
+    python benchmarks/bench_startup.py --compare startup.json
+"""
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from statistics import median
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / 'benchmarks'))
+
+from fake_imdb import FakeIMDbServer  # noqa: E402
+
+ENTRY_POINTS = ('movie_data', 'scraper', 'cli', 'service')
+# milliseconds, with headroom over a typical run; tighten them as cold start improves
+BUDGETS = {'import movie_data': 60, 'import scraper': 80, 'import cli': 100, 'import service': 120,
+           'first request': 250}
+IMPORT = 'import time; start = time.perf_counter(); import {}; print(time.perf_counter() - start)'
+
+
+def import_ms(module):
+    """ The time a fresh interpreter takes to import module, in milliseconds. """
+    output = subprocess.run([sys.executable, '-c', IMPORT.format(module)], cwd=ROOT / 'src', capture_output=True,
+                            text=True, check=True).stdout
+    return float(output) * 1000
+
+
+def first_request_ms(server, tmp):
+    """ The time from launching the CLI on a single ID until the server sees its first request, in milliseconds. """
+    requests = server.requests
+    command = [sys.executable, str(ROOT / 'src' / 'cli.py'), '-', '-o', str(Path(tmp) / 'output.csv'),
+               '--fields', 'Title', '--no-cache', '--imdb-url', server.url]
+    start = time.perf_counter()
+    with subprocess.Popen(command, stdin=subprocess.PIPE, stderr=subprocess.DEVNULL) as cli:
+        cli.stdin.write(b'tt0133093\n')
+        cli.stdin.close()
+        while server.requests == requests and cli.poll() is None:
+            time.sleep(0.0005)
+        elapsed = time.perf_counter() - start
+    if server.requests == requests:
+        raise RuntimeError('the CLI exited without sending a request')
+    return elapsed * 1000
+
+
+def benchmark(runs):
+    results = {f'import {module}': median(import_ms(module) for _ in range(runs)) for module in ENTRY_POINTS}
+    with FakeIMDbServer() as server, tempfile.TemporaryDirectory() as tmp:
+        results['first request'] = median(first_request_ms(server, tmp) for _ in range(runs))
+    return {name: round(ms, 1) for name, ms in results.items()}
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=7, help='fresh processes per measurement')
+    parser.add_argument('-o', '--output', help='save the results to this JSON file')
+    parser.add_argument('--compare', help='a previously saved JSON file to compare against')
+    args = parser.parse_args()
+
+    results = benchmark(args.runs)
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)['results']
+
+    over = []
+    for name, ms in results.items():
+        budget = BUDGETS[name]
+        change = f'  ({ms - baseline[name]:+.1f}ms)' if name in baseline else ''
+        print(f'{name:>18}: {ms:7.1f}ms of {budget}ms{change}')
+        if ms > budget:
+            over.append(name)
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump({'revision': git_revision(), 'python': platform.python_version(),
+                       'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'), 'budgets': BUDGETS, 'results': results},
+                      output, indent=2)
+    if over:
+        sys.exit(f"Over budget: {', '.join(over)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+""" A local stand-in for www.imdb.com, so the scraper can be exercised without touching the real site.
+
+Point Cinemagoer at it with Cinemagoer(imdbURL_base=server.url). Pages recorded under pages_dir (see
+record_pages.py) are served as they are; every other tt ID resolves to a small synthetic title. Each response can be
+delayed by a latency plus random jitter, and a share of them can fail with an HTTP error, to mimic the real site.
+"""
+import os
+import random
+import re
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+
+REFERENCE_PAGE = '''<html><head>
+<meta property="og:title" content="Movie {id} (1999) - IMDb"/>
+<meta property="pageId" content="tt{id}"/>
+</head><body>
+<header><div><h4 class="ipl-header__content" name="directors">Directed by</h4></div></header>
+<table><tr><td><a href="/name/nm0905154/">Lana Wachowski</a></td></tr>
+<tr><td><a href="/name/nm0905152/">Lilly Wachowski</a></td></tr></table>
+<table class="cast_list">
+<tr><td></td><td><a href="/name/nm0000206/">Keanu Reeves</a></td><td>...</td><td>Neo</td></tr>
+<tr><td></td><td><a href="/name/nm0000401/">Laurence Fishburne</a></td><td>...</td><td>Morpheus</td></tr>
+<tr><td></td><td><a href="/name/nm0005251/">Carrie-Anne Moss</a></td><td>...</td><td>Trinity</td></tr>
+</table>
+<table>
+<tr><td>Genres</td><td><ul><li><a href="/genre/action">Action</a></li><li><a href="/genre/scifi">Sci-Fi</a></li></ul></td></tr>
+<tr><td>Runtime</td><td><ul><li>136 min</li></ul></td></tr>
+<tr><td>Countries</td><td><ul><li><a href="/country/us">United States</a></li>
+<li><a href="/country/au">Australia</a></li></ul></td></tr>
+<tr><td>Language</td><td><ul><li><a href="/language/en">English</a></li></ul></td></tr>
+<tr><td>Plot Summary</td><td><p>A computer hacker learns the true nature of his reality.</p></td></tr>
+</table>
+<span class="ipl-rating-star__rating">8.7</span>
+</body></html>'''
+
+PLOT_PAGE = '''<html><body>
+<div data-testid="sub-section-summaries"><ul><li>A computer hacker learns the true nature of his reality.</li></ul></div>
+<div data-testid="sub-section-synopsis"><ul><li>Thomas Anderson leads a double life.</li></ul></div>
+</body></html>'''
+
+PAGES = {'reference': REFERENCE_PAGE, 'plotsummary': PLOT_PAGE}
+TITLE_PATH = re.compile(r'/title/tt(\d+)/(\w*)')
+PAGES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pages')
+
+
+class FakeIMDbServer:
+    """ Serves IMDb title pages from a background thread. Use it as a context manager.
+
+    latency and jitter are in seconds (each response waits latency plus a uniform random share of jitter);
+    error_rate is the fraction of requests answered with error_status instead of the page. To simulate rate limiting,
+    any request beyond max_in_flight concurrent ones, or beyond max_rps in the current second, is answered at once
+    with a 429 (the throttled count).
+    """
+
+    def __init__(self, latency=0.0, invalid=(), jitter=0.0, error_rate=0.0, error_status=503, pages_dir=PAGES_DIR,
+                 seed=None, max_in_flight=None, max_rps=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.invalid = set(invalid)
+        self.pages_dir = pages_dir
+        self.random = random.Random(seed)
+        self.max_in_flight = max_in_flight
+        self.max_rps = max_rps
+        self.requests = 0
+        self.errors = 0
+        self.throttled = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self._second = (0, 0)  # (the current second, requests in it)
+        self._lock = Lock()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self.server.daemon_threads = True
+        self.url = f'http://127.0.0.1:{self.server.server_port}/'
+
+    def __enter__(self):
+        Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def delay(self):
+        """ How long the next response should take. """
+        return self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0)
+
+    def admit(self):
+        """ Start a request, returning False if the rate limits say it should be throttled instead. """
+        with self._lock:
+            second, count = self._second
+            now = int(time.monotonic())
+            self._second = (now, count + 1 if now == second else 1)
+            if ((self.max_in_flight and self.in_flight >= self.max_in_flight)
+                    or (self.max_rps and self._second[1] > self.max_rps)):
+                self.requests += 1
+                self.throttled += 1
+                return False
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            return True
+
+    def finish(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def respond(self, path):
+        """ Return the status and body for a request path. """
+        with self._lock:
+            self.requests += 1
+            failed = self.error_rate and self.random.random() < self.error_rate
+            if failed:
+                self.errors += 1
+        if failed:
+            return self.error_status, b'<html><body>Service unavailable</body></html>'
+
+        match = TITLE_PATH.match(path)
+        if not match or match.group(1) in self.invalid or match.group(2) not in PAGES:
+            return 404, b'<html><body>Not found</body></html>'
+
+        recording = os.path.join(self.pages_dir or '', f'tt{match.group(1)}', f'{match.group(2)}.html')
+        if self.pages_dir and os.path.exists(recording):
+            with open(recording, 'rb') as page:
+                return 200, page.read()
+        return 200, PAGES[match.group(2)].format(id=match.group(1)).encode()
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True  # otherwise keep-alive clients stall on delayed ACKs
+
+            def do_GET(self):
+                if not server.admit():
+                    status, body = 429, b'<html><body>Too many requests</body></html>'
+                else:
+                    try:
+                        delay = server.delay()
+                        if delay:
+                            time.sleep(delay)
+                        status, body = server.respond(self.path)
+                    finally:
+                        server.finish()
+                self.send_response(status)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
@@ -0,0 +1,47 @@
+""" Record real IMDb title pages for the stand-in server to replay, so benchmarks run on realistic HTML offline.
+
+    python benchmarks/record_pages.py tt0133093 tt0234215 --pages reference plotsummary
+"""
+import argparse
+import os
+import re
+import sys
+import time
+from urllib.request import Request, urlopen
+
+from fake_imdb import PAGES, PAGES_DIR
+
+BASE_URL = 'https://www.imdb.com/title/'
+USER_AGENT = 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/107.0.0.0 Safari/537.36'
+
+
+def record(identifier, page, pages_dir=PAGES_DIR):
+    """ Save one page of one title under pages_dir/tt<id>/<page>.html. """
+    request = Request(f'{BASE_URL}tt{identifier}/{page}', headers={'User-Agent': USER_AGENT})
+    with urlopen(request, timeout=30) as response:
+        body = response.read()
+
+    directory = os.path.join(pages_dir, f'tt{identifier}')
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, f'{page}.html'), 'wb') as recording:
+        recording.write(body)
+    return len(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('ids', nargs='+', help='IMDb IDs to record')
+    parser.add_argument('--pages', nargs='+', choices=sorted(PAGES), default=sorted(PAGES))
+    parser.add_argument('--pages-dir', default=PAGES_DIR)
+    parser.add_argument('--delay', type=float, default=1.0, help='seconds to wait between requests, to be polite')
+    args = parser.parse_args()
+
+    for identifier in (i for arg in args.ids for i in re.findall(r'tt(\d+)', arg) or [arg]):
+        for page in args.pages:
+            size = record(identifier, page, args.pages_dir)
+            print(f'tt{identifier}/{page}: {size} bytes', file=sys.stderr)
+            time.sleep(args.delay)
+
+
+if __name__ == '__main__':
+    main()
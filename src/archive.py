@@ -0,0 +1,90 @@
+""" An archive of the raw title pages fetched from IMDb, so that fields can be extracted from them again later (with a
+different field selection or limits) without refetching anything. See reprocess.py. """
+import re
+import sqlite3
+import time
+import zlib
+from threading import Lock
+
+from imdb import Cinemagoer
+from imdb._exceptions import IMDbDataAccessError
+from imdb.parser.http import IMDbURLopener
+
+TITLE_PAGE = re.compile(r'/title/tt(\d+)/(\w*)')  # e.g. /title/tt0133093/reference, the ID then the page
+COMPRESSION_LEVEL = 6
+
+
+def page_key(url):
+    """ The (ID, page) a title page URL is archived under, or None for any other URL. """
+    match = TITLE_PAGE.search(url)
+    return match.groups() if match else None
+
+
+class PageArchive:
+    """ A single-file store of zlib-compressed pages, addressed by IMDb ID and page name. Safe to share between the
+    threads of a scraping job; each process should open its own. Storing a page again replaces the earlier copy. """
+
+    def __init__(self, path='pages.sqlite'):
+        self.path = path
+        self.stored = 0
+        self._lock = Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS pages '
+                           '(id TEXT, page TEXT, fetched REAL, body BLOB, PRIMARY KEY (id, page)) WITHOUT ROWID')
+
+    def __len__(self):
+        """ The number of titles with at least one archived page. """
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(DISTINCT id) FROM pages').fetchone()[0]
+
+    def put(self, identifier, page, text):
+        body = zlib.compress(text.encode('utf-8'), COMPRESSION_LEVEL)
+        with self._lock:
+            self._conn.execute('INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?)',
+                               (identifier, page, time.time(), body))
+            self.stored += 1
+
+    def get(self, identifier, page):
+        """ Return the archived page, or None if it was never archived. """
+        with self._lock:
+            row = self._conn.execute('SELECT body FROM pages WHERE id = ? AND page = ?', (identifier, page)).fetchone()
+        return zlib.decompress(row[0]).decode('utf-8') if row else None
+
+    def ids(self):
+        """ Every archived ID, in ID order. """
+        with self._lock:
+            rows = self._conn.execute('SELECT DISTINCT id FROM pages ORDER BY id').fetchall()
+        return [identifier for identifier, in rows]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class ArchiveURLopener(IMDbURLopener):
+    """ A URL opener that answers Cinemagoer's requests for title pages from a PageArchive instead of the network.
+
+    A page that was never archived is reported as a 404, so Cinemagoer treats the title as it would an invalid ID.
+    """
+
+    def __init__(self, archive, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.archive = archive
+
+    def retrieve_unicode(self, url, size=-1):
+        key = page_key(url)
+        text = self.archive.get(*key) if key else None
+        if text is None:
+            raise IMDbDataAccessError({'errcode': 404, 'errmsg': 'not in the archive', 'url': url, 'proxy': '',
+                                       'exception type': 'HTTPError', 'original exception': None})
+        self._last_url = url
+        return text if size == -1 else text[:size]
+
+
+def archive_client(archive):
+    """ A Cinemagoer client that reads title pages from archive rather than IMDb. """
+    imdb = Cinemagoer()
+    imdb.urlOpener = ArchiveURLopener(archive)
+    return imdb
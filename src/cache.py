@@ -0,0 +1,237 @@
+import hashlib
+import math
+import pickle
+import sqlite3
+import time
+from concurrent.futures import Future
+from threading import Lock
+
+
+class ResponseCache:
+    """ A persistent, single-file cache of fetched responses keyed by identifier.
+
+    Entries expire after their TTL and the least recently used entries are evicted once the cache holds more than
+    max_entries. Safe to share between the threads of a scraping job.
+    """
+    DEFAULT_TTL = 7 * 24 * 60 * 60  # one week, in seconds
+    DEFAULT_MAX_ENTRIES = 500_000
+    EVICT_TO = 0.9  # evict in batches so a full cache doesn't pay for a sweep on every insert
+
+    def __init__(self, path='cache.sqlite', ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS responses '
+                           '(key TEXT PRIMARY KEY, value BLOB, expires REAL, accessed REAL)')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)')
+        self._size = self._conn.execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+
+    def __len__(self):
+        return self._size
+
+    def get(self, key):
+        """ Return the cached value for key, or None if it is missing or has expired. """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute('SELECT value, expires FROM responses WHERE key = ?', (key,)).fetchone()
+            if row and (row[1] is None or row[1] > now):
+                self._conn.execute('UPDATE responses SET accessed = ? WHERE key = ?', (now, key))
+                self.hits += 1
+                return pickle.loads(row[0])
+
+            if row:
+                # the entry is stale, drop it now rather than waiting for it to be evicted
+                self._conn.execute('DELETE FROM responses WHERE key = ?', (key,))
+                self._size -= 1
+            self.misses += 1
+            return None
+
+    def put(self, key, value, ttl=None):
+        """ Store value under key for ttl seconds (the cache default if not given, forever if ttl <= 0). """
+        ttl = self.ttl if ttl is None else ttl
+        now = time.time()
+        expires = now + ttl if ttl and ttl > 0 else None
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+
+        with self._lock:
+            existed = self._conn.execute('SELECT 1 FROM responses WHERE key = ?', (key,)).fetchone()
+            self._conn.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)', (key, blob, expires, now))
+            if not existed:
+                self._size += 1
+            if self._size > self.max_entries:
+                self._evict(now)
+
+    def _evict(self, now):
+        """ Drop expired entries, then the least recently used ones until the cache has some headroom again. """
+        target = int(self.max_entries * self.EVICT_TO)
+        removed = self._conn.execute('DELETE FROM responses WHERE expires IS NOT NULL AND expires <= ?',
+                                     (now,)).rowcount
+        excess = self._size - removed - target
+        if excess > 0:
+            removed += self._conn.execute('DELETE FROM responses WHERE key IN '
+                                          '(SELECT key FROM responses ORDER BY accessed LIMIT ?)',
+                                          (excess,)).rowcount
+        self._size -= removed
+        self.evictions += removed
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute('DELETE FROM responses')
+            self._size = 0
+
+    def stats(self):
+        """ Summarise how effective the cache has been so far. """
+        lookups = self.hits + self.misses
+        return {'entries': self._size, 'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class BloomFilter:
+    """ A fixed-size set membership filter with no false negatives and about error_rate false positives once it holds
+    capacity keys. """
+
+    def __init__(self, capacity, error_rate=0.01):
+        self.capacity = max(capacity, 1)
+        self.error_rate = error_rate
+        self.size = math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2)  # bits
+        self.hashes = max(round(self.size / self.capacity * math.log(2)), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key):
+        # double hashing: k positions from the two halves of a single digest
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return ((first + i * second) % self.size for i in range(self.hashes))
+
+    def add(self, key):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class NegativeCache:
+    """ A persistent record of IDs confirmed not to exist, each until it expires (an unused ID may yet be assigned to a
+    new title), so that junk resubmitted run after run isn't fetched again every time.
+
+    With bloom set, every entry is also loaded into an in-memory BloomFilter that answers most lookups for IDs that
+    aren't in the cache (by far the most common case) without touching SQLite; it is rebuilt, twice the size, whenever
+    it fills up. Safe to share between the threads of a scraping job.
+    """
+    DEFAULT_TTL = 30 * 24 * 60 * 60  # a month, in seconds
+    BLOOM_CAPACITY = 100_000
+
+    def __init__(self, path='invalid.sqlite', ttl=DEFAULT_TTL, bloom=False, error_rate=0.01):
+        self.path = path
+        self.ttl = ttl
+        self.error_rate = error_rate
+        self.hits = 0
+        self.misses = 0
+        self.filtered = 0
+        self._lock = Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS invalid (id TEXT PRIMARY KEY, expires REAL) WITHOUT ROWID')
+        self.bloom = None
+        if bloom:
+            with self._lock:
+                self._build_bloom(self.BLOOM_CAPACITY)
+
+    def _build_bloom(self, capacity):
+        entries = self._conn.execute('SELECT COUNT(*) FROM invalid').fetchone()[0]
+        self.bloom = BloomFilter(max(capacity, 2 * entries), self.error_rate)
+        for identifier, in self._conn.execute('SELECT id FROM invalid'):
+            self.bloom.add(identifier)
+
+    def __contains__(self, identifier):
+        """ Whether identifier is known to be invalid (and that knowledge hasn't expired). """
+        with self._lock:
+            if self.bloom is not None and identifier not in self.bloom:
+                self.filtered += 1
+                self.misses += 1
+                return False
+
+            row = self._conn.execute('SELECT expires FROM invalid WHERE id = ?', (identifier,)).fetchone()
+            if row and (row[0] is None or row[0] > time.time()):
+                self.hits += 1
+                return True
+            if row:
+                self._conn.execute('DELETE FROM invalid WHERE id = ?', (identifier,))
+            self.misses += 1
+            return False
+
+    def add(self, identifier, ttl=None):
+        """ Record identifier as invalid for ttl seconds (the cache default if not given, forever if ttl <= 0). """
+        ttl = self.ttl if ttl is None else ttl
+        expires = time.time() + ttl if ttl and ttl > 0 else None
+        with self._lock:
+            self._conn.execute('INSERT OR REPLACE INTO invalid VALUES (?, ?)', (identifier, expires))
+            if self.bloom is not None:
+                if self.bloom.count >= self.bloom.capacity:
+                    self._build_bloom(2 * self.bloom.capacity)
+                else:
+                    self.bloom.add(identifier)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'filtered': self.filtered,
+                'hit_rate': self.hits / lookups if lookups else 0.0}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class InFlight:
+    """ Coalesces concurrent fetches of the same thing: while one caller is fetching a key, any other caller asking
+    for it waits for that fetch and gets its result (or its exception) instead of fetching again. Nothing is kept once
+    the fetch is over; that is the response cache's job. """
+
+    def __init__(self):
+        self.fetched = 0
+        self.coalesced = 0
+        self._pending = {}
+        self._lock = Lock()
+
+    def call(self, key, fetch):
+        """ Return fetch(), or the result of the call already fetching key. """
+        with self._lock:
+            future = self._pending.get(key)
+            leader = future is None
+            if leader:
+                future = self._pending[key] = Future()
+                self.fetched += 1
+            else:
+                self.coalesced += 1
+        if not leader:
+            return future.result()
+
+        try:
+            result = fetch()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._pending[key]
+
+    def stats(self):
+        return {'fetched': self.fetched, 'coalesced': self.coalesced}
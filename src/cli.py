@@ -0,0 +1,254 @@
+""" Headless batch entry point: scrape IDs streamed from files or stdin without ever importing tkinter.
+
+    python src/cli.py ids.csv -o movies.csv --fields "Title,Year,IMDb rating" --limit Cast=5
+    cat ids.txt | python src/cli.py --concurrency 300 > movies.csv
+    python src/cli.py ids.csv -o movies.csv --metrics /var/lib/node_exporter/scraper.prom
+    python src/cli.py ids.csv -o movies.csv --archive pages.sqlite --no-cache  # then see reprocess.py
+    python src/cli.py movies.csv -o movies.csv --refresh fields.sqlite --previous movies.csv  # see refresh.py
+"""
+import argparse
+import logging
+import sys
+import time
+from threading import Lock
+
+from cache import NegativeCache, ResponseCache
+from file_handler import STDOUT, WRITERS, CsvHandler, IdSet
+from limiter import MAX_LIMIT, AdaptiveLimiter, RateLimiter
+from metrics import EXPORT_INTERVAL, Metrics, MetricsExporter
+from policy import RETRIES, CircuitBreaker, FetchPolicy
+from refresh import FieldStore, RefreshData, seed_from_output
+from movie_data import IMDbData
+from scraper import CACHE_PATH, ID_PATTERN, INVALID_CACHE_PATH, Scraper
+
+STATS_INTERVAL = 10  # seconds
+
+
+class ConsoleProgress:
+    """ Stands in for the GUI, reporting progress and throughput to stderr rather than a window. Safe to call from any
+    thread. """
+
+    def __init__(self, interval=STATS_INTERVAL, stream=sys.stderr):
+        self.interval = interval
+        self.stream = stream
+        self.total = None
+        self.valid = 0
+        self.invalid = 0
+        self.failed = 0
+        self.start = self.last_report = time.monotonic()
+        self._lock = Lock()
+
+    def alert_user(self, heading, txt):
+        print(f'{heading}: {txt}', file=self.stream)
+
+    def set_progress_bar_max(self, count):
+        self.total = count
+
+    def update_progress(self, title, valid=True, error=None):
+        with self._lock:
+            if valid:
+                self.valid += 1
+            elif error:
+                self.failed += 1
+                print(f'Could not fetch {title}: {error}', file=self.stream)
+            else:
+                self.invalid += 1
+
+            now = time.monotonic()
+            if now - self.last_report >= self.interval:
+                self.last_report = now
+                self.report()
+
+    def report(self):
+        done = self.valid + self.invalid + self.failed
+        elapsed = time.monotonic() - self.start
+        rate = done / elapsed if elapsed else 0.0
+        total = f'/{self.total}' if self.total else ''
+        failed = f', {self.failed} failed' if self.failed else ''
+        print(f'[{elapsed:7.1f}s] {done}{total} processed ({self.invalid} invalid{failed}), {rate:.1f} titles/s',
+              file=self.stream, flush=True)
+
+
+def stream_ids(paths, file_handler):
+    """ Yield each distinct ID from the given files ('-' for stdin) as soon as it is read, in input order. """
+    seen = IdSet()
+    for path in paths:
+        yield from file_handler.iter_ids(sys.stdin.buffer if path == '-' else path, seen)
+
+
+def quiet_cinemagoer():
+    """ Cinemagoer logs a full traceback for every invalid ID, which would drown out everything else on stderr. """
+    logging.getLogger('imdbpy').setLevel(logging.CRITICAL + 1)
+
+
+def parse_limits(limits):
+    """ Turn ['Cast=5', 'Genres=2'] into {'Cast': 5, 'Genres': 2}. """
+    parsed = {}
+    for limit in limits:
+        field, _, value = limit.partition('=')
+        if not value.isdigit():
+            raise argparse.ArgumentTypeError(f"Invalid limit '{limit}', expected FIELD=N.")
+        parsed[field] = int(value)
+    return parsed
+
+
+def build_parser(field_names):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('inputs', nargs='*', default=['-'],
+                        help="files to read IMDb IDs from ('-' or nothing for stdin)")
+    parser.add_argument('-o', '--output', default=STDOUT,
+                        help="file to write ('-' for stdout, the default); .csv, .jsonl or .sqlite, optionally "
+                             "followed by .gz or .zst for csv and jsonl")
+    parser.add_argument('--format', choices=tuple(WRITERS), help='output format (default: from the output extension)')
+    parser.add_argument('-f', '--fields', default=','.join(field_names),
+                        help=f"comma-separated fields to extract (default: all of {', '.join(field_names)})")
+    parser.add_argument('-l', '--limit', action='append', default=[], metavar='FIELD=N',
+                        help='cap a multi-valued field, e.g. Cast=5 (repeatable)')
+    parser.add_argument('--concurrency', type=int, help='maximum fetches in flight')
+    parser.add_argument('--adaptive', action='store_true',
+                        help=f'tune the fetches in flight to what IMDb can take, up to --concurrency ({MAX_LIMIT})')
+    parser.add_argument('--max-rps', type=float, help='never send more than this many requests per second')
+    parser.add_argument('--pool-size', type=int, help='maximum Cinemagoer clients (default: one per worker)')
+    parser.add_argument('--connect-timeout', type=float, default=5, help='seconds to wait for a connection')
+    parser.add_argument('--read-timeout', type=float, default=30, help='seconds to wait for a response')
+    parser.add_argument('--retries', type=int, default=RETRIES,
+                        help='retries for timeouts, server errors and throttling, with exponential backoff')
+    parser.add_argument('--hedge', action='store_true',
+                        help='send a duplicate request when a fetch runs slower than the recent p95')
+    parser.add_argument('--ordered', action='store_true', help='write rows in input order rather than as they finish')
+    parser.add_argument('--resume', action='store_true', help='skip IDs already written to the output file')
+    parser.add_argument('--dump-index', metavar='PATH',
+                        help='look titles up offline in an index of the IMDb dataset dumps (see dump_data.py)')
+    parser.add_argument('--archive', metavar='PATH',
+                        help='keep the raw pages fetched, to extract other fields later with reprocess.py (titles '
+                             'served from the response cache are not fetched, so use --no-cache to archive them all)')
+    parser.add_argument('--refresh', metavar='STORE',
+                        help='only fetch the fields whose TTL has run out since they were last fetched into this '
+                             'store, and take the rest from it (bypasses the response cache)')
+    parser.add_argument('--previous', metavar='PATH',
+                        help='with --refresh, first add the rows of an earlier output to the store, as fetched when '
+                             'the file was last modified')
+    parser.add_argument('--imdb-url', help='fetch from a mirror or stand-in instead of www.imdb.com')
+    parser.add_argument('--cache', default=CACHE_PATH, help='response cache file')
+    parser.add_argument('--no-cache', action='store_true', help='always fetch from IMDb')
+    parser.add_argument('--invalid-cache', default=INVALID_CACHE_PATH,
+                        help="IDs IMDb has reported don't exist, skipped without a request until their entry expires")
+    parser.add_argument('--bloom', action='store_true',
+                        help='screen IDs against the invalid cache with an in-memory Bloom filter first, for inputs '
+                             'that are mostly junk')
+    parser.add_argument('--stats-interval', type=float, default=STATS_INTERVAL,
+                        help='seconds between throughput reports on stderr')
+    parser.add_argument('--metrics', metavar='PATH',
+                        help='periodically write timing metrics here: Prometheus text for a .prom file, else JSON')
+    parser.add_argument('--metrics-interval', type=float, default=EXPORT_INTERVAL,
+                        help='seconds between metrics snapshots')
+    parser.add_argument('-v', '--verbose', action='store_true', help="show Cinemagoer's own error logging")
+    return parser
+
+
+def main(argv=None):
+    data_source = IMDbData()
+    field_names = list(data_source.get_field_names())
+    parser = build_parser(field_names)
+    args = parser.parse_args(argv)
+
+    fields = [field.strip() for field in args.fields.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in field_names]
+    if unknown or not fields:
+        parser.error(f"Unknown or missing fields: {', '.join(unknown)}. Choose from: {', '.join(field_names)}.")
+    try:
+        limits = parse_limits(args.limit)
+    except argparse.ArgumentTypeError as e:
+        parser.error(str(e))
+    if args.previous and not args.refresh:
+        parser.error('--previous needs --refresh.')
+
+    if not args.verbose:
+        quiet_cinemagoer()
+    metrics = Metrics() if args.metrics else None
+    client_pool = fetch_policy = archive = None
+    concurrency = args.concurrency
+    negative_cache = None
+    # the dump index and the network clients are imported only by the mode that uses them, as each takes a while
+    if args.dump_index:
+        from dump_data import DumpData
+        data_source = DumpData(args.dump_index)
+    else:
+        from archive import PageArchive
+        from clients import ClientPool
+        if not args.no_cache and not args.refresh:
+            data_source.set_cache(ResponseCache(args.cache))
+        if not args.no_cache:
+            negative_cache = NegativeCache(args.invalid_cache, bloom=args.bloom)
+        archive = PageArchive(args.archive) if args.archive else None
+        client_pool = ClientPool(args.pool_size, args.connect_timeout, args.read_timeout, archive,
+                                 **({'imdbURL_base': args.imdb_url} if args.imdb_url else {}))
+        data_source.set_client_pool(client_pool)
+        limiter = None
+        if args.adaptive:
+            concurrency = concurrency or MAX_LIMIT
+            limiter = AdaptiveLimiter(max_limit=concurrency, max_rps=args.max_rps, metrics=metrics)
+        elif args.max_rps:
+            limiter = RateLimiter(args.max_rps)
+        fetch_policy = FetchPolicy(args.retries, breaker=CircuitBreaker(), hedge=args.hedge, limiter=limiter,
+                                   metrics=metrics, concurrency=concurrency)
+        data_source.set_fetch_policy(fetch_policy)
+
+    file_handler = CsvHandler(ID_PATTERN, args.format)
+    store = refresh_data = None
+    if args.refresh:
+        store = FieldStore(args.refresh)
+        if args.previous:
+            seeded = seed_from_output(store, args.previous, ID_PATTERN)
+            print(f'{seeded} titles seeded from {args.previous}', file=sys.stderr)
+        refresh_data = RefreshData(data_source, store)
+
+    scraper = Scraper(file_handler, refresh_data or data_source, concurrency)
+    scraper.set_ordering(args.ordered)
+    if negative_cache is not None:
+        scraper.set_negative_cache(negative_cache)
+    progress = ConsoleProgress(args.stats_interval)
+    scraper.set_ui(progress)
+    exporter = None
+    if metrics:
+        scraper.set_metrics(metrics)
+        exporter = MetricsExporter(scraper.metrics, args.metrics, args.metrics_interval).start()
+
+    try:
+        scraper.run(stream_ids(args.inputs, file_handler), fields, limits, args.output, args.resume)
+    except KeyboardInterrupt:
+        scraper.cancel()
+    finally:
+        if exporter:
+            exporter.stop()
+    progress.report()
+    if scraper.stats:
+        stats = scraper.stats
+        print(f"head-of-line blocking: {stats['head_of_line_blocking']:.1f}s "
+              f"{'absorbed by the reorder buffer' if args.ordered else 'avoided by writing in completion order'}; "
+              f"at most {stats['peak_reorder_buffer']} titles waited on a slower one", file=sys.stderr)
+    if progress.failed:
+        print(f'{progress.failed} IDs could not be fetched; run again with --resume to retry them', file=sys.stderr)
+
+    if client_pool:
+        fetch_policy.close()
+        connections = client_pool.stats()
+        print(f"{connections['requests']} requests over {connections['connections_opened']} connections "
+              f"({connections['reuse_rate']:.0%} reused)", file=sys.stderr)
+    if refresh_data:
+        stats = refresh_data.stats()
+        print(f"refresh: {stats['fetched']} titles fetched, {stats['skipped']} still fresh", file=sys.stderr)
+        store.close()
+    if archive is not None:
+        print(f'{archive.stored} pages archived in {args.archive}', file=sys.stderr)
+        archive.close()
+    if data_source.cache is not None:
+        print(f"cache: {data_source.cache.stats()['hit_rate']:.0%} hit rate", file=sys.stderr)
+    if negative_cache is not None:
+        print(f"{scraper.stats.get('skipped_invalid', 0)} invalid IDs skipped without a request "
+              f"({negative_cache.stats()['hits']} known from {args.invalid_cache})", file=sys.stderr)
+        negative_cache.close()
+
+
+if __name__ == '__main__':
+    main()
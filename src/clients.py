@@ -0,0 +1,203 @@
+import http.client
+import ssl
+from contextlib import contextmanager
+from functools import lru_cache
+from threading import BoundedSemaphore, Lock
+from time import perf_counter
+from urllib.parse import urljoin, urlsplit
+
+from imdb import Cinemagoer
+from imdb._exceptions import IMDbDataAccessError
+from imdb.parser.http import IMDbURLopener
+
+from archive import page_key
+
+MAX_REDIRECTS = 5
+
+
+@lru_cache(maxsize=None)
+def _tls_context():
+    """ The TLS settings every HTTPS connection shares: the defaults, loaded once rather than for each connection. """
+    return ssl.create_default_context()
+
+
+class KeepAliveURLopener(IMDbURLopener):
+    """ A drop-in replacement for Cinemagoer's URL opener that keeps its HTTP(S) connections open between requests.
+
+    Cinemagoer's own opener builds a fresh urllib opener, and so a fresh TCP/TLS connection, for every page. This one
+    holds one persistent connection per host, with separate connect and read timeouts, and counts how often a request
+    could reuse an existing connection, and how long it spent waiting on the network. Given a PageArchive (see
+    archive.py), it also keeps a copy of every title page it fetches.
+    """
+
+    def __init__(self, connect_timeout=5, read_timeout=30, archive=None, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._setup(connect_timeout, read_timeout, archive)
+
+    @classmethod
+    def wrap(cls, opener, connect_timeout=5, read_timeout=30, archive=None):
+        """ A keep-alive opener that takes over the settings (headers, proxy) of the opener a Cinemagoer client was
+        built with, which is much cheaper than building another: each one loads the system's CA certificates. """
+        wrapped = cls.__new__(cls)
+        wrapped.__dict__.update(opener.__dict__)
+        wrapped._setup(connect_timeout, read_timeout, archive)
+        return wrapped
+
+    def _setup(self, connect_timeout, read_timeout, archive):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.archive = archive
+        self.connections = {}
+        self.requests = 0
+        self.connections_opened = 0
+        self.network_seconds = 0.0
+
+    def retrieve_unicode(self, url, size=-1):
+        start = perf_counter()
+        if self.get_proxy():
+            # proxies are left to Cinemagoer's own, connection-per-request, implementation
+            try:
+                return self._archived(url, super().retrieve_unicode(url, size), size)
+            finally:
+                self.network_seconds += perf_counter() - start
+
+        headers = dict(self.addheaders)
+        if size != -1:
+            headers['Range'] = f'bytes=0-{size}'
+
+        try:
+            for _ in range(MAX_REDIRECTS + 1):
+                response, content = self._request(url, headers)
+                location = response.getheader('Location')
+                if response.status in (301, 302, 303, 307, 308) and location:
+                    url = urljoin(url, location)
+                    continue
+                break
+        except (OSError, http.client.HTTPException) as e:
+            raise IMDbDataAccessError({'errcode': None, 'errmsg': str(e), 'url': url, 'proxy': '',
+                                       'exception type': 'IOError', 'original exception': e})
+        finally:
+            self.network_seconds += perf_counter() - start
+
+        if response.status >= 400:
+            raise IMDbDataAccessError({'errcode': response.status, 'errmsg': response.reason, 'url': url,
+                                       'proxy': '', 'exception type': 'HTTPError', 'original exception': None})
+
+        self._last_url = url
+        charset = response.msg.get_content_charset() or 'utf8'
+        return self._archived(url, content.decode(charset, 'replace'), size)
+
+    def _archived(self, url, text, size):
+        key = page_key(url) if self.archive is not None and size == -1 else None  # never archive a partial page
+        if key:
+            self.archive.put(*key, text)
+        return text
+
+    def _request(self, url, headers):
+        """ Send a GET over the persistent connection for the URL's host, reconnecting once if it has gone stale. """
+        parts = urlsplit(url)
+        path = parts.path + (f'?{parts.query}' if parts.query else '')
+        self.requests += 1
+
+        for attempt in range(2):
+            conn, reused = self._connection(parts.scheme, parts.netloc)
+            try:
+                conn.request('GET', path or '/', headers=headers)
+                response = conn.getresponse()
+                content = response.read()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                self._close(parts.scheme, parts.netloc)
+                if reused and attempt == 0:
+                    continue
+                raise
+            except (OSError, http.client.HTTPException):
+                self._close(parts.scheme, parts.netloc)
+                raise
+
+            if response.will_close:
+                self._close(parts.scheme, parts.netloc)
+            return response, content
+
+    def _connection(self, scheme, host):
+        """ Return the open connection to host, opening one if needed, and whether it is being reused. """
+        key = (scheme, host)
+        conn = self.connections.get(key)
+        if conn:
+            return conn, True
+
+        if scheme == 'https':
+            conn = http.client.HTTPSConnection(host, timeout=self.connect_timeout, context=_tls_context())
+        else:
+            conn = http.client.HTTPConnection(host, timeout=self.connect_timeout)
+        conn.connect()
+        conn.sock.settimeout(self.read_timeout)
+        self.connections[key] = conn
+        self.connections_opened += 1
+        return conn, False
+
+    def _close(self, scheme, host):
+        conn = self.connections.pop((scheme, host), None)
+        if conn:
+            conn.close()
+
+    def close(self):
+        for scheme, host in list(self.connections):
+            self._close(scheme, host)
+
+
+class ClientPool:
+    """ Hands each worker its own Cinemagoer client, so workers never contend for one shared client.
+
+    Clients are created on demand (at most size of them, if a size is given) and returned to the pool after each use;
+    the most recently used client is handed out first, so its connections are the ones kept warm.
+    """
+
+    def __init__(self, size=None, connect_timeout=5, read_timeout=30, archive=None, **cinemagoer_kwargs):
+        self.size = size
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.archive = archive
+        self.cinemagoer_kwargs = cinemagoer_kwargs
+        self.clients = []
+        self.idle = []
+        self._lock = Lock()
+        self._available = BoundedSemaphore(size) if size else None
+
+    @contextmanager
+    def client(self):
+        """ Borrow a client for the duration of a with block, waiting for one to come free if the pool is full. """
+        if self._available:
+            self._available.acquire()
+        try:
+            with self._lock:
+                imdb = self.idle.pop() if self.idle else None
+            if not imdb:
+                imdb = self._create()
+            try:
+                yield imdb
+            finally:
+                with self._lock:
+                    self.idle.append(imdb)
+        finally:
+            if self._available:
+                self._available.release()
+
+    def _create(self):
+        imdb = Cinemagoer(**self.cinemagoer_kwargs)
+        imdb.urlOpener = KeepAliveURLopener.wrap(imdb.urlOpener, self.connect_timeout, self.read_timeout, self.archive)
+        with self._lock:
+            self.clients.append(imdb)
+        return imdb
+
+    def stats(self):
+        """ Summarise how many requests were able to reuse an already open connection. """
+        requests = sum(imdb.urlOpener.requests for imdb in self.clients)
+        opened = sum(imdb.urlOpener.connections_opened for imdb in self.clients)
+        reused = max(requests - opened, 0)
+        return {'clients': len(self.clients), 'requests': requests, 'connections_opened': opened,
+                'reused': reused, 'reuse_rate': reused / requests if requests else 0.0}
+
+    def close(self):
+        with self._lock:
+            for imdb in self.clients:
+                imdb.urlOpener.close()
@@ -0,0 +1,241 @@
+""" An offline data source answering lookups from IMDb's bulk dataset dumps (https://datasets.imdbws.com/) rather than
+fetching title pages one by one.
+
+Build the index once from title.basics.tsv.gz and title.ratings.tsv.gz, then point the scraper at it:
+
+    python src/dump_data.py title.basics.tsv.gz title.ratings.tsv.gz -o imdb.idx
+    python src/cli.py ids.csv -o movies.csv --dump-index imdb.idx --fields "Title,Year,Genres,Runtime,IMDb rating"
+"""
+import argparse
+import gzip
+import mmap
+import os
+import shutil
+import struct
+import sys
+import tempfile
+from array import array
+from bisect import bisect_left
+from collections import namedtuple
+
+from movie_data import IMDbData, MovieData
+
+# Index file layout: a header, then (id, offset) entries sorted by id, then the records they point to, each one line
+# of tab-separated values.
+MAGIC = b'SCRPIDX1'
+HEADER = struct.Struct('<8sQ')  # magic, number of entries
+ENTRY = struct.Struct('<IQ')  # numeric part of the tt ID, offset of its record from the start of the records
+NULL = '\\N'  # how the dumps mark a missing value
+
+DumpRecord = namedtuple('DumpRecord', 'movieID title year genres runtime rating')
+
+
+def _open_tsv(path):
+    return gzip.open(path, 'rt', encoding='utf-8') if path.endswith('.gz') else open(path, encoding='utf-8')
+
+
+def _value(value):
+    return '' if value == NULL else value.replace('\t', ' ')
+
+
+def load_ratings(path):
+    """ Read title.ratings into parallel arrays of IDs and ratings, sorted by ID for bisecting. """
+    ids, ratings = array('I'), array('d')
+    with _open_tsv(path) as tsv:
+        next(tsv)  # header
+        for line in tsv:
+            tconst, rating, _ = line.rstrip('\n').split('\t')
+            ids.append(int(tconst[2:]))
+            ratings.append(float(rating))
+
+    if any(ids[i] > ids[i + 1] for i in range(len(ids) - 1)):
+        order = sorted(range(len(ids)), key=ids.__getitem__)
+        ids, ratings = array('I', (ids[i] for i in order)), array('d', (ratings[i] for i in order))
+    return ids, ratings
+
+
+def build_index(basics_path, ratings_path, index_path):
+    """ Build a lookup index from the title.basics and (optionally) title.ratings dumps, returning its entry count.
+
+    Only the fields the scraper can use are kept, so the index is a fraction of the size of the dumps. The dumps are
+    streamed, and the index is written to a temporary file and moved into place once complete.
+    """
+    rating_ids, ratings = load_ratings(ratings_path) if ratings_path else (array('I'), array('d'))
+    ids, offsets = array('I'), array('Q')
+
+    directory = os.path.dirname(os.path.abspath(index_path))
+    with tempfile.TemporaryFile(dir=directory) as records, _open_tsv(basics_path) as tsv:
+        next(tsv)  # header
+        offset = 0
+        for line in tsv:
+            # tconst, titleType, primaryTitle, originalTitle, isAdult, startYear, endYear, runtimeMinutes, genres
+            columns = line.rstrip('\n').split('\t')
+            identifier = int(columns[0][2:])
+            position = bisect_left(rating_ids, identifier)
+            rating = str(ratings[position]) if position < len(rating_ids) and rating_ids[position] == identifier else ''
+            record = '\t'.join((_value(columns[2]), _value(columns[5]), _value(columns[8]), _value(columns[7]),
+                                rating)).encode('utf-8') + b'\n'
+            records.write(record)
+            ids.append(identifier)
+            offsets.append(offset)
+            offset += len(record)
+
+        if any(ids[i] > ids[i + 1] for i in range(len(ids) - 1)):
+            order = sorted(range(len(ids)), key=ids.__getitem__)
+            ids, offsets = array('I', (ids[i] for i in order)), array('Q', (offsets[i] for i in order))
+
+        temp_path = index_path + '.part'
+        with open(temp_path, 'wb') as index:
+            index.write(HEADER.pack(MAGIC, len(ids)))
+            for entry in zip(ids, offsets):
+                index.write(ENTRY.pack(*entry))
+            records.seek(0)
+            shutil.copyfileobj(records, index)
+        os.replace(temp_path, index_path)
+    return len(ids)
+
+
+class DumpIndex:
+    """ A read-only, memory-mapped index built by build_index. Lookups are binary searches straight over the mapped
+    file, so opening it is instant, it costs no memory beyond the OS page cache, and it is safe to share between
+    threads. """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as index:
+            self.map = mmap.mmap(index.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC:
+            self.map.close()
+            raise ValueError(f"'{path}' is not a dump index. Build one with: python src/dump_data.py")
+        self.records_start = HEADER.size + self.count * ENTRY.size
+
+    def __len__(self):
+        return self.count
+
+    def lookup(self, identifier):
+        """ Return the DumpRecord for an ID (the digits of a tt ID), or None if it isn't in the dump. """
+        target = int(identifier)
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if ENTRY.unpack_from(self.map, HEADER.size + middle * ENTRY.size)[0] < target:
+                low = middle + 1
+            else:
+                high = middle
+        if low == self.count:
+            return None
+        found, offset = ENTRY.unpack_from(self.map, HEADER.size + low * ENTRY.size)
+        if found != target:
+            return None
+
+        start = self.records_start + offset
+        line = self.map[start:self.map.find(b'\n', start)].decode('utf-8')
+        title, year, genres, runtime, rating = line.split('\t')
+        return DumpRecord(f'{target:07d}', title, int(year) if year else None, genres.split(',') if genres else [],
+                          runtime, float(rating) if rating else None)
+
+    def close(self):
+        self.map.close()
+
+
+class DumpData(MovieData):
+    """ Specifies the Movie data available from the bulk dumps. The fields are named as in IMDbData, so the UI and
+    Scraper work unchanged; those the dumps don't cover (director, synopses, countries, cast, language) are 'n/a'. """
+    fields = {}  # not shared with IMDbData, whose extractors expect a Cinemagoer Movie
+    index = None
+    BASE_URL = IMDbData.BASE_URL
+    MAX_GENRES = IMDbData.MAX_GENRES
+
+    def __init__(self, index_path=None):
+        super().__init__()
+        if index_path:
+            self.set_index(DumpIndex(index_path))
+
+        imdb_data = IMDbData()
+        ttls = imdb_data.get_field_ttls()
+        for name, config in imdb_data.get_field_configs().items():
+            method = getattr(self, f'_get_{FIELD_METHODS.get(name, "missing")}')
+            self._register_field(method, name, config, ttl=ttls[name])
+        self.set_chosen_fields(self.get_field_names())
+
+    @classmethod
+    def set_index(cls, index):
+        cls.index = index
+
+    @classmethod
+    def set_chosen_fields(cls, choices):
+        cls.chosen_fields = {field: cls.fields[field] for field in choices if field in cls.fields}
+        cls.plan = cls._compile_plan(cls.chosen_fields)
+
+    @classmethod
+    def set_field_limits(cls, limits):
+        cls.MAX_GENRES = limits.get('Genres', cls.MAX_GENRES)
+
+    @classmethod
+    def get_field_configs(cls):
+        return {field: field_data['config'] for field, field_data in cls.fields.items()}
+
+    @classmethod
+    def get_movie_data(cls, identifier, fields=None, limits=None):
+        """ Return all the requested data (or the given fields, with the given limits) for a given movie if identifier
+        is in the dump, otherwise return None. """
+        record = cls.index.lookup(identifier)
+        if not record:
+            print(f'Invalid ID: {identifier}', file=sys.stderr)
+            return None
+        plan = cls.plan
+        if fields is not None or limits is not None:
+            plan, _ = cls._plan_for(cls.chosen_fields if fields is None else fields, limits)
+        movie_record, extractors = plan
+        return movie_record([extract(record) for extract in extractors])
+
+    @classmethod
+    def _get_title(cls, record):
+        return record.title or 'n/a'
+
+    @classmethod
+    def _get_genres(cls, record, limit=None):
+        return ', '.join(record.genres[:limit or cls.MAX_GENRES]) if record.genres else 'n/a'
+
+    @classmethod
+    def _get_year(cls, record):
+        return record.year or 'n/a'
+
+    @classmethod
+    def _get_runtime(cls, record):
+        return record.runtime or 'n/a'
+
+    @classmethod
+    def _get_rating(cls, record):
+        return record.rating or 'n/a'
+
+    @classmethod
+    def _get_imdb_id(cls, record):
+        return 'tt' + record.movieID
+
+    @classmethod
+    def _get_url(cls, record):
+        return cls.BASE_URL + cls._get_imdb_id(record)
+
+    @classmethod
+    def _get_missing(cls, record, limit=None):
+        return 'n/a'
+
+
+FIELD_METHODS = {'Title': 'title', 'Genres': 'genres', 'Year': 'year', 'Runtime': 'runtime', 'IMDb rating': 'rating',
+                 'IMDb ID': 'imdb_id', 'URL': 'url'}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('basics', help='title.basics.tsv(.gz)')
+    parser.add_argument('ratings', nargs='?', help='title.ratings.tsv(.gz)')
+    parser.add_argument('-o', '--output', default='imdb.idx', help='index file to write')
+    args = parser.parse_args(argv)
+    count = build_index(args.basics, args.ratings, args.output)
+    print(f'{count} titles indexed in {args.output}', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
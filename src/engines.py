@@ -0,0 +1,305 @@
+import os
+from abc import ABC, abstractmethod
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from itertools import count
+from queue import Queue
+from threading import Condition, Semaphore, Thread
+from time import perf_counter
+
+_EXHAUSTED = object()
+_ARRIVED = object()
+
+
+class Engine(ABC):
+    """ Runs the per-ID fetch function concurrently on behalf of the Scraper.
+
+    Only a bounded window of tasks is ever outstanding: new items are pulled from the input as earlier results are
+    consumed, so memory stays flat however long the input is. The input is pulled on a thread of its own (see Feed), so
+    an input that trickles in, such as a pipe that stays open, never holds back the results already in hand.
+    """
+    WINDOW_PER_WORKER = 2
+
+    def __init__(self, concurrency, window=None):
+        self.concurrency = concurrency
+        self.window = window or concurrency * self.WINDOW_PER_WORKER
+        self.pending = {}
+        self.submitted = 0
+        self.stopped = Future()
+
+    def map(self, fn, items):
+        """ Apply fn to every item concurrently, yielding the results in input order. """
+        # no item starts more than a window ahead of the earliest unfinished one, so the reordering stays bounded too
+        reorder_buffer = ReorderBuffer()
+        for position, result in self.map_unordered(fn, items, max_ahead=self.window):
+            yield from reorder_buffer.push(position, result)
+
+    def map_unordered(self, fn, items, max_ahead=None):
+        """ Apply fn to every item concurrently, yielding (position, result) pairs as soon as each one finishes.
+
+        If max_ahead is given, no item is started more than max_ahead positions beyond the earliest unfinished one,
+        which bounds how much a consumer has to buffer to restore input order.
+        """
+        events = Queue()  # the positions of finished items, _ARRIVED for new input, and None once stopped
+        feed = Feed(items, self.window, lambda: events.put(_ARRIVED))
+        self.stopped.add_done_callback(lambda f: (feed.close(), events.put(None)))
+
+        try:
+            while self.pending or not feed.done:
+                event = events.get()
+                if self.stopped.done():
+                    return
+                if event is _ARRIVED:
+                    self._fill(fn, feed, max_ahead, events)
+                    continue
+
+                future = self.pending.pop(event)
+                feed.room.release()
+                # top the window back up before handing the result over, so workers stay busy while it is processed
+                self._fill(fn, feed, max_ahead, events)
+                yield event, future.result()
+        finally:
+            feed.close()
+
+    def _fill(self, fn, feed, max_ahead, events):
+        """ Submit the items that have arrived, until they run out or the max_ahead bound is reached. The feed never
+        pulls more than the window has room for, so that bounds the items outstanding. """
+        while feed.ready:
+            if max_ahead and self.pending and self.submitted >= min(self.pending) + max_ahead:
+                return
+            item = feed.ready.popleft()
+            if item is _EXHAUSTED:
+                feed.done = True
+                if feed.error:
+                    raise feed.error
+                return
+
+            future = self._submit(fn, item)
+            future.add_done_callback(lambda f, position=self.submitted: events.put(position))
+            self.pending[self.submitted] = future
+            self.submitted += 1
+
+    @abstractmethod
+    def _submit(self, fn, item):
+        """ Schedule fn(item), returning a concurrent.futures.Future for its result. """
+        pass
+
+    def shutdown(self):
+        """ Stop the engine at once, abandoning any work that has not finished yet. Safe to call more than once. """
+        if not self.stopped.done():
+            self.stopped.set_result(None)
+        for future in self.pending.copy().values():
+            future.cancel()
+
+
+class Feed:
+    """ Pulls an engine's input on a thread of its own, calling arrived() as each item (or the end of the input) is
+    ready to take, and never holding more items, taken or not, than the room it has been given. The engine releases
+    room once an item's result has been handed over, and takes arrived items from ready without ever blocking. """
+
+    def __init__(self, items, room, arrived):
+        self.items = iter(items)
+        self.room = Semaphore(room)
+        self.arrived = arrived
+        self.ready = deque()  # ends with _EXHAUSTED once the input has run out (or failed, raising error)
+        self.error = None
+        self.done = False  # set by the engine once it has taken _EXHAUSTED
+        self.closed = False
+        Thread(target=self._pull, daemon=True).start()
+
+    def _pull(self):
+        while True:
+            self.room.acquire()
+            if self.closed:
+                return
+            try:
+                item = next(self.items, _EXHAUSTED)
+            except Exception as e:
+                self.error, item = e, _EXHAUSTED
+            self.ready.append(item)
+            self.arrived()
+            if item is _EXHAUSTED:
+                return
+
+    def close(self):
+        """ Stop pulling, once any item being read has arrived. """
+        self.closed = True
+        self.room.release()
+
+
+class ThreadEngine(Engine):
+    """ A single job's engine: a plain ThreadPoolExecutor, sized by Python's defaults unless told otherwise. """
+
+    def __init__(self, concurrency=None, window=None):
+        self.executor = ThreadPoolExecutor(max_workers=concurrency)
+        super().__init__(self.executor._max_workers, window)
+
+    def _submit(self, fn, item):
+        return self.executor.submit(fn, item)
+
+    def shutdown(self):
+        super().shutdown()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+class FairPool:
+    """ A fixed set of worker threads shared by any number of concurrent jobs, each submitting its fetches through its
+    own engine (see engine()).
+
+    Every job queues its fetches separately, and workers serve the jobs with queued work in turn, one fetch each, so a
+    job of a hundred IDs gets the same share of the workers as one of ten million instead of waiting behind it.
+    """
+
+    def __init__(self, concurrency=None):
+        # the same default as a ThreadPoolExecutor's
+        self.concurrency = concurrency or min(32, (os.cpu_count() or 1) + 4)
+        self._ready = deque()  # the engines with queued fetches, in the order they are next served
+        self._condition = Condition()
+        self._closed = False
+        for _ in range(self.concurrency):
+            Thread(target=self._work, daemon=True).start()
+
+    def engine(self, window=None):
+        """ A new engine for one job, running its fetches on this pool's workers. """
+        return PooledEngine(self, window)
+
+    def _put(self, engine, task):
+        with self._condition:
+            if self._closed:
+                raise RuntimeError('cannot schedule new fetches after shutdown')
+            engine.queued.append(task)
+            if len(engine.queued) == 1:
+                self._ready.append(engine)
+            self._condition.notify()
+
+    def _drop(self, engine):
+        """ Forget an engine's queued fetches. """
+        with self._condition:
+            engine.queued.clear()
+            if engine in self._ready:
+                self._ready.remove(engine)
+
+    def _work(self):
+        while True:
+            with self._condition:
+                while not self._ready and not self._closed:
+                    self._condition.wait()
+                if self._closed:
+                    return
+                engine = self._ready.popleft()
+                future, fn, item = engine.queued.popleft()
+                if engine.queued:
+                    self._ready.append(engine)  # to the back of the line, behind every other job with work
+
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(fn(item))
+            except BaseException as e:
+                future.set_exception(e)
+
+    def shutdown(self):
+        """ Stop the workers once they finish the fetch in hand, abandoning everything still queued. """
+        with self._condition:
+            self._closed = True
+            for engine in self._ready:
+                for future, _, _ in engine.queued:
+                    future.cancel()
+                engine.queued.clear()
+            self._ready.clear()
+            self._condition.notify_all()
+
+
+class PooledEngine(Engine):
+    """ One job's engine on a FairPool: the job keeps its own window of fetches, which the pool runs fairly alongside
+    every other job's. Shutting it down only abandons this job's fetches; the pool carries on. """
+
+    def __init__(self, pool, window=None):
+        super().__init__(pool.concurrency, window)
+        self.pool = pool
+        self.queued = deque()
+
+    def _submit(self, fn, item):
+        future = Future()
+        self.pool._put(self, (future, fn, item))
+        return future
+
+    def shutdown(self):
+        self.pool._drop(self)
+        super().shutdown()
+
+
+class ReorderBuffer:
+    """ Holds results that finished early until everything before them has arrived, releasing them in input order.
+
+    Also measures the head-of-line blocking it absorbs: the total time results spent waiting on an earlier, slower one.
+    """
+
+    def __init__(self):
+        self.next_position = 0
+        self.waiting = {}
+        self.blocked_seconds = 0.0
+        self.peak_size = 0
+
+    def __len__(self):
+        return len(self.waiting)
+
+    def push(self, position, value):
+        """ Add a finished result, returning the (possibly empty) list of results that are now ready, in order. """
+        now = perf_counter()
+        self.waiting[position] = (value, now)
+        self.peak_size = max(self.peak_size, len(self.waiting))
+
+        released = []
+        while self.next_position in self.waiting:
+            value, arrived = self.waiting.pop(self.next_position)
+            self.blocked_seconds += now - arrived
+            released.append(value)
+            self.next_position += 1
+        return released
+
+
+class HeadOfLine:
+    """ Releases every result at once, in completion order, while measuring the head-of-line blocking that avoided: what
+    a ReorderBuffer would have reported for the same results, had they been written in input order.
+
+    Rather than the results waiting behind an unfinished one, it only keeps the unfinished positions below the highest
+    finished one, which the engine's window bounds, so memory stays flat however far ahead of a stalled fetch the rest
+    get.
+    """
+
+    def __init__(self):
+        self.next_position = 0
+        self.highest = -1  # the highest finished position
+        self.unfinished = set()  # positions below highest that haven't finished
+        self.order = deque()  # the same, ascending, with finished ones dropped lazily from the front
+        self.ahead = 0  # results finished behind the earliest unfinished one: those a ReorderBuffer would be holding
+        self.blocked_seconds = 0.0
+        self.peak_size = 0
+        self.last = None
+
+    def __len__(self):
+        return self.ahead
+
+    def push(self, position, value):
+        """ Record a finished result, returning it at once. """
+        now = perf_counter()
+        if self.last is not None:
+            self.blocked_seconds += self.ahead * (now - self.last)  # every result held back waited this long too
+        self.last = now
+
+        if position > self.highest:
+            for skipped in range(self.highest + 1, position):
+                self.unfinished.add(skipped)
+                self.order.append(skipped)
+            self.highest = position
+        else:
+            self.unfinished.discard(position)
+        while self.order and self.order[0] not in self.unfinished:
+            self.order.popleft()
+
+        self.next_position = self.order[0] if self.order else self.highest + 1
+        # the finished positions after the earliest unfinished one, up to the highest
+        self.ahead = self.highest - self.next_position + 1 - len(self.unfinished) if self.order else 0
+        self.peak_size = max(self.peak_size, self.ahead)
+        return [value]
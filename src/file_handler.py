@@ -1,7 +1,22 @@
 import csv
+import gzip
+import io
+import json
+import mmap
+import os
 import re
+import sqlite3
+import sys
+import zlib
 from abc import ABC, abstractmethod
 
+STDOUT = '-'
+FORMATS = {'.csv': 'csv', '.jsonl': 'jsonl', '.ndjson': 'jsonl', '.sqlite': 'sqlite', '.db': 'sqlite'}
+COMPRESSIONS = ('.gz', '.zst')
+CHUNK_SIZE = 1 << 20  # bytes read at a time from inputs that can't be memory mapped, such as stdin
+MAX_ID_DIGITS = 8  # tt99999999 is the largest title ID there can be
+ID_BYTES = b'0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'  # the bytes an ID can be made of
+
 
 class FileHandler(ABC):
     @abstractmethod
@@ -16,32 +31,457 @@ class FileHandler(ABC):
     def extract_ids(self, text):
         pass
 
+    @abstractmethod
+    def open_writer(self, fields, path, append=False, on_flush=None, checkpoint=None):
+        pass
+
+
+class RowWriter(ABC):
+    """ Writes rows out to a file as they arrive, rather than all at once at the end.
+
+    Rows are written to a temporary '.part' file alongside the destination and flushed in batches, so a crash loses at
+    most one batch; close() moves the finished file into place atomically. In append mode, writing resumes from the
+    end of an earlier run's output (or its leftover '.part' file), first cut back to checkpoint if one is given.
+    on_flush(checkpoint) is called each time rows reach the disk, with a checkpoint of (rows, size): the rows in the
+    output so far, and its size in bytes.
+    A path of '-' writes straight to stdout instead, and a path ending in '.gz' or '.zst' is compressed (zstd needs the
+    optional zstandard package).
+
+    Rows are dicts, or MovieRecords (see movie_data.py); a record of the writer's fields, in order, is written as it is.
+    """
+    FLUSH_EVERY = 100
+
+    def __init__(self, path, fields, flush_every=FLUSH_EVERY, append=False, on_flush=None, checkpoint=None):
+        self.path = path
+        self.part_path = path + '.part'
+        self.fields = fields
+        self.columns = tuple(fields)
+        self.flush_every = flush_every
+        self.append = append
+        self.on_flush = on_flush
+        self.checkpoint = checkpoint if append else None
+        self.compression = next((suffix for suffix in COMPRESSIONS if path.endswith(suffix)), None)
+        self.unflushed = 0
+        # every row in the output, those kept from an earlier run included
+        self.rows_written = self.checkpoint[0] if self.checkpoint else 0
+        self.file = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @abstractmethod
+    def open(self):
+        pass
+
+    def _prepare_part(self):
+        """ In append mode, carry on from the finished output of an earlier run if it left no '.part' file. """
+        if self.append and not os.path.exists(self.part_path) and os.path.exists(self.path):
+            os.replace(self.path, self.part_path)
+
+    @abstractmethod
+    def _write(self, row):
+        pass
+
+    def _values(self, row):
+        """ The row's values for the writer's fields, in order. """
+        if getattr(row, 'fields', None) == self.columns:
+            return row
+        return tuple(row.get(field) for field in self.columns)
+
+    def write_row(self, row):
+        """ Add a row to the output, flushing to disk every flush_every rows. """
+        self._write(row)
+        self.rows_written += 1
+        self.unflushed += 1
+        if self.unflushed >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        self.file.flush()
+        size = None
+        if self.file is not sys.stdout:
+            os.fsync(self.file.fileno())
+            size = os.fstat(self.file.fileno()).st_size
+        self.unflushed = 0
+        if self.on_flush:
+            self.on_flush((self.rows_written, size))
+
+    def close(self):
+        """ Flush any remaining rows and atomically replace the destination with the finished file. """
+        if self.file is sys.stdout:
+            self.flush()
+            self.file = None
+        elif self.file:
+            self.flush()
+            self.file.close()
+            self.file = None
+            os.replace(self.part_path, self.path)
+
+
+class TextWriter(RowWriter):
+    """ Writes rows as lines of text to the '.part' file, which a resumed run cuts back to its checkpoint. """
+
+    def _open_part(self, **kwargs):
+        """ Open the '.part' file for writing, returning True if it is empty and so still needs any header. """
+        if self.path == STDOUT:
+            self.file = sys.stdout
+            return True
+
+        self._prepare_part()
+        kept = None
+        if self.checkpoint and os.path.exists(self.part_path):
+            kept = self._cut_back()
+        empty = not self.append or not os.path.exists(self.part_path) or os.path.getsize(self.part_path) == 0
+        # appending to a compressed file adds another gzip member or zstd frame, which decompressors read straight
+        # through; a file cut back is started afresh instead
+        mode = 'at' if self.append and kept is None else 'wt'
+        self.file = _open_text(self.part_path, mode, self.compression, **kwargs)
+        if kept is not None:
+            self.file.write(kept)
+            empty = not kept
+        return empty
+
+    def _cut_back(self):
+        """ Drop whatever an earlier run wrote to the '.part' file after its last checkpoint: rows that reached the file
+        before a crash without being journaled, which the resumed run writes again, and any line the crash tore.
+
+        A compressed file can't be cut in place, as a crash leaves its last gzip member or zstd frame unfinished: what
+        can be decompressed of it is read back instead, and the text of its rows up to the checkpoint returned, for the
+        file to be started afresh with. """
+        rows, size = self.checkpoint
+        if self.compression:
+            kept, found = self._rows_of(_readable_text(self.part_path, self.compression), rows)
+            if found < rows:
+                raise ValueError(f"Can't resume {self.path}: only {found} of the {rows} rows its journal lists could "
+                                 f"be recovered from {self.part_path}.")
+            return kept
+        if os.path.getsize(self.part_path) > size:
+            os.truncate(self.part_path, size)
+        return None
+
+    @abstractmethod
+    def _rows_of(self, text, rows):
+        """ The start of text holding its first rows rows (and any header), and how many rows it really holds. """
+        pass
+
+
+class CsvWriter(TextWriter):
+    def open(self):
+        empty = self._open_part(newline='')
+        self.writer = csv.writer(self.file)
+        if empty:
+            self.writer.writerow(self.columns)
+        return self
+
+    def _write(self, row):
+        self.writer.writerow(self._values(row))
+
+    def _rows_of(self, text, rows):
+        # follow the csv reader through the lines, as a quoted value can span several
+        lines, kept = io.StringIO(text, newline=''), []
+        end, found = 0, -1  # the header isn't a row
+
+        def read():
+            for line in lines:
+                kept.append(line)
+                yield line
+
+        try:
+            for _ in zip(range(rows + 1), csv.reader(read())):
+                if not kept[-1].endswith(('\r', '\n')):
+                    break  # torn by the crash
+                end, found = len(kept), found + 1
+        except csv.Error:
+            pass  # torn inside a quoted value
+        return ''.join(kept[:end]), max(found, 0)
+
+
+class JsonLinesWriter(TextWriter):
+    """ One JSON object per line, so a reader (or a resumed job) can stream it row by row. """
+
+    def open(self):
+        self._open_part()
+        return self
+
+    def _write(self, row):
+        self.file.write(json.dumps(dict(zip(self.columns, self._values(row))), ensure_ascii=False) + '\n')
+
+    def _rows_of(self, text, rows):
+        end = 0
+        for found in range(rows):
+            line_end = text.find('\n', end)
+            if line_end < 0:
+                return text[:end], found
+            end = line_end + 1
+        return text[:end], rows
+
+
+class SqliteWriter(RowWriter):
+    """ Writes rows into a 'movies' table of a SQLite database, one executemany() transaction per batch. """
+    TABLE = 'movies'
+    FLUSH_EVERY = 1000
+
+    def __init__(self, path, fields, flush_every=FLUSH_EVERY, append=False, on_flush=None, checkpoint=None):
+        super().__init__(path, fields, flush_every, append, on_flush, checkpoint)
+        self.batch = []
+        self.conn = None
+
+    def open(self):
+        if self.path == STDOUT:
+            raise ValueError('A SQLite database cannot be written to stdout.')
+        self._prepare_part()
+        if not self.append and os.path.exists(self.part_path):
+            os.remove(self.part_path)
+
+        self.conn = sqlite3.connect(self.part_path, isolation_level=None)
+        columns = ', '.join(_quote(field) for field in self.fields)
+        self.conn.execute(f'CREATE TABLE IF NOT EXISTS {self.TABLE} ({columns})')
+        if self.checkpoint:
+            # rows committed after the checkpoint weren't journaled, so the resumed run inserts them again; the table
+            # is only ever appended to, so its rowids count the rows
+            self.conn.execute(f'DELETE FROM {self.TABLE} WHERE rowid > ?', (self.checkpoint[0],))
+        self.insert = f"INSERT INTO {self.TABLE} ({columns}) VALUES ({', '.join('?' * len(self.fields))})"
+        return self
+
+    def _write(self, row):
+        self.batch.append(self._values(row))
+
+    def flush(self):
+        if self.batch:
+            self.conn.execute('BEGIN')
+            self.conn.executemany(self.insert, self.batch)
+            self.conn.execute('COMMIT')
+            self.batch.clear()
+        self.unflushed = 0
+        if self.on_flush:
+            self.on_flush((self.rows_written, None))
+
+    def close(self):
+        if self.conn:
+            self.flush()
+            self.conn.close()
+            self.conn = None
+            os.replace(self.part_path, self.path)
+
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _open_text(path, mode, compression=None, **kwargs):
+    """ Open a file in text mode, compressed with compression ('.gz', '.zst' or None). """
+    if compression == '.gz':
+        return gzip.open(path, mode, encoding='utf-8', **kwargs)
+    if compression == '.zst':
+        return _zstandard().open(path, mode, encoding='utf-8', **kwargs)
+    return open(path, mode, encoding='utf-8', **kwargs)
+
+
+def _readable_text(path, compression):
+    """ Decompress as much of a gzip or zstd file as can be read: everything before the end a crash tore off, or before
+    a member or frame that was appended after one left unfinished. """
+    if compression == '.gz':
+        start, errors = (lambda: zlib.decompressobj(zlib.MAX_WBITS | 16)), zlib.error
+    else:
+        zstandard = _zstandard()
+        start, errors = zstandard.ZstdDecompressor().decompressobj, zstandard.ZstdError
+    decompressed, decompressor = [], start()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(CHUNK_SIZE), b''):
+            while chunk:
+                saved = decompressor.copy() if hasattr(decompressor, 'copy') else None
+                try:
+                    decompressed.append(decompressor.decompress(chunk))
+                except errors:
+                    if saved is not None:
+                        # the chunk's output is lost with the error, so recover it up to the bad byte
+                        for byte in range(len(chunk)):
+                            try:
+                                decompressed.append(saved.decompress(chunk[byte:byte + 1]))
+                            except errors:
+                                break
+                    return b''.join(decompressed).decode('utf-8', 'replace')
+                chunk = b''
+                if getattr(decompressor, 'eof', False):
+                    chunk, decompressor = decompressor.unused_data, start()
+    return b''.join(decompressed).decode('utf-8', 'replace')
+
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise RuntimeError("Writing .zst files needs the zstandard package: pip install zstandard") from None
+    return zstandard
+
+
+WRITERS = {'csv': CsvWriter, 'jsonl': JsonLinesWriter, 'sqlite': SqliteWriter}
+
+
+def output_format(path):
+    """ Work out the output format from a path's extension (ignoring any compression suffix), defaulting to CSV. """
+    root, extension = os.path.splitext(path.lower())
+    if extension in COMPRESSIONS:
+        root, extension = os.path.splitext(root)
+    return FORMATS.get(extension, 'csv')
+
+
+def read_rows(path, file_format=None):
+    """ Yield each row of an earlier run's output as a dict, whichever writer (and compression) produced it. """
+    file_format = file_format or output_format(path)
+    if file_format == 'sqlite':
+        conn = sqlite3.connect(path)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield from (dict(row) for row in conn.execute(f'SELECT * FROM {SqliteWriter.TABLE}'))
+        finally:
+            conn.close()
+        return
+
+    if path.endswith('.gz'):
+        file = gzip.open(path, 'rt', encoding='utf-8', newline='')
+    elif path.endswith('.zst'):
+        file = _zstandard().open(path, 'rt', encoding='utf-8', newline='')
+    else:
+        file = open(path, encoding='utf-8', newline='')
+    with file:
+        if file_format == 'jsonl':
+            yield from (json.loads(line) for line in file if line.strip())
+        else:
+            yield from csv.DictReader(file)
+
+
+class IdSet:
+    """ A compact set of the IDs seen so far, for deduplicating huge inputs.
+
+    Numeric IDs are bits in a bitmap that grows to the largest ID seen, so IMDb's tens of millions of possible titles
+    take 12.5MB at most, however many times each appears. IDs beyond BITMAP_LIMIT, which can't be titles, or that aren't
+    numeric, fall back to an ordinary set. Numerically equal IDs ('0133093' and '133093') count as one.
+    """
+    BITMAP_LIMIT = 10 ** MAX_ID_DIGITS
+
+    def __init__(self):
+        self.bitmap = bytearray()
+        self.others = set()
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    @classmethod
+    def _number(cls, identifier):
+        """ The ID's bit in the bitmap, or None if it belongs in the fallback set. """
+        if identifier.isdigit() and len(identifier) < 20:
+            number = int(identifier)
+            if number < cls.BITMAP_LIMIT:
+                return number
+        return None
+
+    @staticmethod
+    def _key(identifier):
+        return identifier.encode('utf-8') if isinstance(identifier, str) else identifier
+
+    def __contains__(self, identifier):
+        number = self._number(identifier)
+        if number is None:
+            return self._key(identifier) in self.others
+        byte = number >> 3
+        return byte < len(self.bitmap) and bool(self.bitmap[byte] & (1 << (number & 7)))
+
+    def add(self, identifier):
+        """ Add an ID (str or bytes), returning True if it wasn't already in the set. """
+        number = self._number(identifier)
+        if number is None:
+            key = self._key(identifier)
+            if key in self.others:
+                return False
+            self.others.add(key)
+        else:
+            byte, bit = number >> 3, 1 << (number & 7)
+            if byte >= len(self.bitmap):
+                # grow geometrically, so a file of ascending IDs doesn't regrow the bitmap at every new maximum
+                self.bitmap.extend(bytes(max(byte + 1, 2 * len(self.bitmap)) - len(self.bitmap)))
+            elif self.bitmap[byte] & bit:
+                return False
+            self.bitmap[byte] |= bit
+        self.count += 1
+        return True
+
 
 class CsvHandler(FileHandler):
-    def __init__(self, pattern):
+    """ Reads IDs from CSV (or any text) input, and writes the results as CSV, JSON Lines or SQLite, chosen from the
+    save path's extension unless a format has been set. """
+
+    def __init__(self, pattern, output_format=None):
         self.pattern = pattern
+        # inputs are scanned as raw bytes, so they never need decoding as a whole
+        self.byte_pattern = re.compile(pattern.encode('ascii'))
+        self.output_format = output_format
+
+    def set_output_format(self, output_format):
+        """ Force an output format (one of WRITERS), or go back to choosing it from the save path with None. """
+        if output_format and output_format not in WRITERS:
+            raise ValueError(f"Unknown output format '{output_format}'. Choose from: {', '.join(WRITERS)}.")
+        self.output_format = output_format
 
     def open_file(self, path):
-        """ Identify all potential IDs from anywhere within a CSV, return them as a set. """
-        ids = set()
+        """ Identify all potential IDs from anywhere within a CSV, return them as a list in order of appearance. """
+        return list(self.iter_ids(path))
+
+    def iter_ids(self, source, seen=None, chunk_size=CHUNK_SIZE):
+        """ Yield each distinct ID in a file as soon as it is found, in order of first appearance, so fetching can start
+        while a huge input is still being read.
+
+        source is a path, which is memory mapped and scanned in place, or a binary file object such as stdin's buffer,
+        which is read in chunks as its data arrives. Pass the same IdSet as seen to carry the deduplication across
+        several inputs.
+        """
+        seen = IdSet() if seen is None else seen
+        if not isinstance(source, (str, bytes, os.PathLike)):
+            yield from self._iter_stream_ids(source, seen, chunk_size)
+            return
 
-        with open(path, newline='') as csv_input:
-            reader = csv.reader(csv_input)
+        with open(source, 'rb') as file:
+            if os.fstat(file.fileno()).st_size == 0:
+                return
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                yield from self._new_ids(buffer, seen)
 
-            for row in reader:
-                matches = self.extract_ids(''.join(row))
-                ids.update(matches)
+    def _iter_stream_ids(self, stream, seen, chunk_size):
+        # only scan up to the last byte read that can't be part of an ID, so that no ID is split between two chunks;
+        # any separator will do, so input all on one line (comma-separated, say) streams just as well. read1 hands
+        # over whatever has arrived rather than waiting for a whole chunk, so IDs piped in slowly are fetched at once
+        read = getattr(stream, 'read1', stream.read)
+        carry = b''
+        for chunk in iter(lambda: read(chunk_size), b''):
+            buffer = carry + chunk
+            end = len(buffer.rstrip(ID_BYTES))
+            yield from self._new_ids(memoryview(buffer)[:end], seen)
+            carry = buffer[end:]
+        yield from self._new_ids(carry, seen)
 
-        return ids
+    def _new_ids(self, buffer, seen):
+        for match in self.byte_pattern.finditer(buffer):
+            identifier = match.group(1)
+            if seen.add(identifier):
+                yield identifier.decode('ascii')
 
     def save_file(self, data, fields, path='output.csv'):
         """ Save the retrieved movie data as a CSV at the path specified. """
-        with open(path, 'w', newline='') as csv_output:
-            writer = csv.DictWriter(csv_output, fieldnames=fields)
-            writer.writeheader()
+        with self.open_writer(fields, path) as writer:
             for movie in data:
-                writer.writerow(movie)
+                writer.write_row(movie)
 
-    def extract_ids(self, text):
-        """ Identify all potential IDs from a block of text, return them as a set. """
-        return set(re.findall(self.pattern, text))
+    def open_writer(self, fields, path='output.csv', append=False, on_flush=None, checkpoint=None):
+        """ Return a RowWriter that streams movie data to the path specified as it arrives. """
+        writer = WRITERS[self.output_format or output_format(path)]
+        return writer(path, fields, append=append, on_flush=on_flush, checkpoint=checkpoint)
+
+    def extract_ids(self, text, seen=None):
+        """ Identify all potential IDs from a block of text, return the new ones (not already in seen, if given) as a
+        list, in order of first appearance. """
+        seen = IdSet() if seen is None else seen
+        return list(self._new_ids(text.encode('utf-8', 'replace'), seen))
@@ -0,0 +1,94 @@
+""" Scraping jobs: everything one job needs (its fields, limits, sink and cancel token) fixed in an immutable spec, so
+several jobs can run at once in one Scraper without touching each other's settings.
+
+    spec = JobSpec(['Title', 'Cast'], {'Cast': 5}, 'movies.csv')
+    job = scraper.submit(ids, spec)
+    job.wait()
+"""
+from collections import namedtuple
+from threading import Event, Lock
+from types import MappingProxyType
+
+from file_handler import STDOUT
+
+
+class CancelToken:
+    """ Cancels one job (or several sharing the token), from any thread. Callbacks added with on_cancel run once, on
+    cancellation, or straight away if the token is already cancelled. """
+
+    def __init__(self):
+        self._event = Event()
+        self._callbacks = []
+        self._lock = Lock()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def cancel(self):
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback()
+
+    def on_cancel(self, callback):
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+
+class JobSpec(namedtuple('JobSpec', 'fields limits sink cancel resume ordered progress')):
+    """ What a job scrapes and where it goes: the fields to extract, the limits of the configurable ones (any not given
+    take the field's default), the save path ('-' for stdout), its CancelToken, whether to resume an earlier run to the
+    same save path, whether to write rows in input order, and the progress reporter (by default, the Scraper's UI).
+
+    A spec can't be changed once made: its fields are a tuple and its limits a read-only mapping. """
+    __slots__ = ()
+
+    def __new__(cls, fields, limits=None, sink=STDOUT, cancel=None, resume=False, ordered=True, progress=None):
+        return super().__new__(cls, tuple(fields), MappingProxyType(dict(limits or {})), sink, cancel or CancelToken(),
+                               resume, ordered, progress)
+
+
+class Job:
+    """ A job submitted to a Scraper: its spec and how it went. stats is filled in once it is done. """
+
+    def __init__(self, spec):
+        self.spec = spec
+        self.skipped = 0
+        self.stats = {}
+        self.error = None
+        self._done = Event()
+        self._callbacks = []
+        self._lock = Lock()
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        """ Block until the job is done (or timeout seconds have passed), returning whether it is. """
+        return self._done.wait(timeout)
+
+    def cancel(self):
+        self.spec.cancel.cancel()
+
+    def on_done(self, callback):
+        """ Call callback(job) once the job is done, on the thread that ran it (or at once, if it is already done). """
+        with self._lock:
+            if not self._done.is_set():
+                self._callbacks.append(callback)
+                return
+        callback(self)
+
+    def finish(self):
+        with self._lock:
+            self._done.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback(self)
@@ -0,0 +1,81 @@
+import os
+
+VALID = 'ok'
+INVALID = 'invalid'
+CHECKPOINT = 'at'
+
+
+class Journal:
+    """ An append-only record of the IDs a job has finished with, kept alongside its output.
+
+    Entries are buffered and only written out by flush(), which the job calls once the matching rows are safely on
+    disk, so the journal never claims more than the output holds. Each flush ends with the writer's checkpoint: how
+    many rows, and how many bytes, the output held at that point. Rows written after the last checkpoint may still
+    have reached the output before a crash, so a resumed job cuts the output back to it, and only entries followed by
+    a checkpoint count as done.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.buffer = []
+        self.file = None
+        self.checkpoint = None
+        self.end = None  # where the last checkpoint ends, once loaded
+
+    @staticmethod
+    def path_for(output_path):
+        return output_path + '.journal'
+
+    def load(self):
+        """ Return the set of IDs (valid or invalid) already recorded by a previous run, and keep its last checkpoint
+        as (rows, size) in checkpoint (None if it never reached one). """
+        done, pending = set(), []
+        self.checkpoint, self.end = None, 0
+        if not os.path.exists(self.path):
+            return done
+
+        with open(self.path) as journal:
+            position = 0
+            for line in journal:
+                position += len(line)  # the journal is all ASCII, so this counts bytes
+                # ignore a line left half-written by a crash
+                if not line.endswith('\n'):
+                    continue
+                status, _, value = line.rstrip('\n').partition(' ')
+                if status in (VALID, INVALID):
+                    pending.append(value)
+                elif status == CHECKPOINT:
+                    rows, _, size = value.partition(' ')
+                    self.checkpoint = int(rows), int(size) if size != '-' else None
+                    done.update(pending)
+                    pending.clear()
+                    self.end = position
+        return done
+
+    def open(self, append=False):
+        """ Open the journal for writing. Appending after load() first drops everything past the last checkpoint,
+        which the output is cut back to as well. """
+        if append and self.end is not None and os.path.exists(self.path):
+            os.truncate(self.path, self.end)
+        self.file = open(self.path, 'a' if append else 'w')
+        return self
+
+    def record(self, identifier, valid=True):
+        self.buffer.append(f'{VALID if valid else INVALID} {identifier}\n')
+
+    def flush(self, checkpoint=None):
+        """ Write out the buffered entries, followed by checkpoint, the writer's (rows, size) once they are on disk. """
+        if checkpoint is not None:
+            rows, size = checkpoint
+            self.buffer.append(f"{CHECKPOINT} {rows} {'-' if size is None else size}\n")
+        if self.buffer:
+            self.file.writelines(self.buffer)
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.buffer.clear()
+
+    def close(self):
+        if self.file:
+            self.flush()
+            self.file.close()
+            self.file = None
@@ -0,0 +1,101 @@
+""" Limits on how hard IMDb is hit: an AIMD controller that finds how many fetches can usefully be in flight at once,
+and an optional hard ceiling on requests per second. """
+import time
+from collections import deque
+from threading import Condition, Lock
+
+INITIAL_LIMIT = 8
+MIN_LIMIT = 1
+MAX_LIMIT = 128
+
+
+class AdaptiveLimiter:
+    """ Gates fetches so that at most limit are in flight, tuning limit as it goes (additive increase, multiplicative
+    decrease, as TCP does).
+
+    Every fetch that succeeds at close to the best latency seen recently adds 1/limit, so the limit grows by about one
+    per round of requests. A throttled or failed fetch, or one that took over latency_tolerance times the best recent
+    latency (a sign of queueing at the other end), multiplies it by decrease_factor instead, at most once per typical
+    request time so that one burst of errors counts as a single signal.
+    """
+
+    def __init__(self, initial=INITIAL_LIMIT, min_limit=MIN_LIMIT, max_limit=MAX_LIMIT, decrease_factor=0.5,
+                 latency_tolerance=2.0, window=100, max_rps=None, metrics=None, clock=time.monotonic):
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.decrease_factor = decrease_factor
+        self.latency_tolerance = latency_tolerance
+        self.latencies = deque(maxlen=window)
+        self.average_latency = None
+        self.last_decrease = None
+        self.in_flight = 0
+        self.increases = 0
+        self.decreases = 0
+        self.rate_limiter = RateLimiter(max_rps, clock=clock) if max_rps else None
+        self.metrics = metrics
+        self.clock = clock
+        self._condition = Condition()
+
+    def acquire(self):
+        """ Wait for a free slot (and, with a requests per second ceiling, for the next request to be allowed). """
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+        if self.rate_limiter:
+            self.rate_limiter.acquire()
+
+    def release(self, latency, error_kind=None):
+        """ Free a slot, adjusting the limit from how the fetch went: error_kind is None for a successful fetch (or a
+        conclusive one, such as an invalid ID), else one of policy.TRANSIENT or policy.THROTTLED. """
+        with self._condition:
+            self.in_flight -= 1
+            if error_kind:
+                self._decrease()
+            else:
+                self.latencies.append(latency)
+                self.average_latency = latency if self.average_latency is None else \
+                    0.9 * self.average_latency + 0.1 * latency
+                if latency > min(self.latencies) * self.latency_tolerance and len(self.latencies) >= 10:
+                    self._decrease()
+                else:
+                    self.limit = min(self.limit + 1 / self.limit, self.max_limit)
+                    self.increases += 1
+            if self.metrics:
+                self.metrics.set('concurrency_limit', self.limit)
+            self._condition.notify_all()
+
+    def _decrease(self):
+        now = self.clock()
+        if self.last_decrease is not None and now - self.last_decrease < (self.average_latency or 0):
+            return
+        self.last_decrease = now
+        self.limit = max(self.limit * self.decrease_factor, self.min_limit)
+        self.decreases += 1
+
+    def stats(self):
+        return {'limit': self.limit, 'in_flight': self.in_flight, 'increases': self.increases,
+                'decreases': self.decreases}
+
+
+class RateLimiter:
+    """ A hard ceiling of rps requests per second, spaced evenly (a token bucket holding a single token). """
+
+    def __init__(self, rps, clock=time.monotonic, sleep=time.sleep):
+        self.interval = 1 / rps
+        self.clock = clock
+        self.sleep = sleep
+        self.next_allowed = clock()
+        self._lock = Lock()
+
+    def acquire(self):
+        with self._lock:
+            now = self.clock()
+            start = max(now, self.next_allowed)
+            self.next_allowed = start + self.interval
+        if start > now:
+            self.sleep(start - now)
+
+    def release(self, latency, error_kind=None):
+        """ Nothing to learn: the ceiling is fixed. (So a RateLimiter can also be used on its own as a limiter.) """
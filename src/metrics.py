@@ -0,0 +1,169 @@
+""" Lightweight timing and counting for the scraper's hot path, exportable as JSON or in Prometheus' text format.
+
+    metrics = Metrics()
+    with metrics.timer('stage_seconds', stage='write'):
+        ...
+    metrics.increment('titles_total', result='valid')
+    metrics.set('concurrency_limit', 12)
+    MetricsExporter(metrics, 'scraper.prom', interval=10).start()
+"""
+import json
+import os
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from threading import Event, Lock, Thread
+
+PREFIX = 'scraper_'
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)  # seconds
+EXPORT_INTERVAL = 10  # seconds
+
+
+class Histogram:
+    """ Counts observations into fixed buckets, keeping their total and maximum too. Not thread-safe on its own. """
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # the last one is everything above the largest bucket
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        """ Estimate a quantile as the upper bound of the bucket it falls in (the maximum, if above every bucket). """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def snapshot(self):
+        return {'count': self.count, 'sum': self.sum, 'max': self.max,
+                'mean': self.sum / self.count if self.count else 0.0,
+                'p50': self.quantile(0.5), 'p95': self.quantile(0.95), 'p99': self.quantile(0.99),
+                'buckets': dict(zip([str(bound) for bound in self.buckets] + ['+Inf'], self.counts))}
+
+
+class Metrics:
+    """ A thread-safe collection of counters, gauges and histograms, each identified by name and labels. """
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self.started = time.time()
+        self._lock = Lock()
+
+    def increment(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def set(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.gauges[key] = value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if not histogram:
+                histogram = self.histograms[key] = Histogram(self.buckets)
+            histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """ Observe how many seconds the with block took, whether or not it raised. """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def snapshot(self):
+        """ Everything recorded so far, as JSON-serialisable data. """
+        with self._lock:
+            return {'timestamp': time.time(), 'uptime': time.time() - self.started,
+                    'counters': [{'name': name, 'labels': dict(labels), 'value': value}
+                                 for (name, labels), value in sorted(self.counters.items())],
+                    'gauges': [{'name': name, 'labels': dict(labels), 'value': value}
+                               for (name, labels), value in sorted(self.gauges.items())],
+                    'histograms': [{'name': name, 'labels': dict(labels), **histogram.snapshot()}
+                                   for (name, labels), histogram in sorted(self.histograms.items())]}
+
+    def prometheus(self):
+        """ Everything recorded so far, in Prometheus' text exposition format. """
+        lines = []
+        with self._lock:
+            for kind, values in (('counter', self.counters), ('gauge', self.gauges)):
+                for name in sorted({name for name, _ in values}):
+                    lines.append(f'# TYPE {PREFIX}{name} {kind}')
+                    lines.extend(f'{PREFIX}{name}{_labels(labels)} {value}'
+                                 for (other, labels), value in sorted(values.items()) if other == name)
+
+            for name in sorted({name for name, _ in self.histograms}):
+                lines.append(f'# TYPE {PREFIX}{name} histogram')
+                for (histogram_name, labels), histogram in sorted(self.histograms.items()):
+                    if histogram_name != name:
+                        continue
+                    cumulative = 0
+                    for bound, count in zip([str(bound) for bound in histogram.buckets] + ['+Inf'], histogram.counts):
+                        cumulative += count
+                        lines.append(f'{PREFIX}{name}_bucket{_labels(labels + (("le", bound),))} {cumulative}')
+                    lines.append(f'{PREFIX}{name}_sum{_labels(labels)} {histogram.sum}')
+                    lines.append(f'{PREFIX}{name}_count{_labels(labels)} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path):
+        """ Write a snapshot to path, in Prometheus' format for a .prom file and as JSON otherwise.
+
+        The file is replaced atomically, so a collector reading it never sees half a snapshot."""
+        content = self.prometheus() if path.endswith('.prom') else json.dumps(self.snapshot(), indent=2)
+        temp_path = path + '.tmp'
+        with open(temp_path, 'w') as file:
+            file.write(content)
+        os.replace(temp_path, path)
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"') for _, value in labels)
+    return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + '}'
+
+
+class MetricsExporter:
+    """ Writes a metrics snapshot to a file every interval seconds from a background thread, and once more on stop. """
+
+    def __init__(self, metrics, path, interval=EXPORT_INTERVAL):
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+        self._stopped = Event()
+        self._thread = Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.metrics.write(self.path)
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        self.metrics.write(self.path)
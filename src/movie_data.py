@@ -1,32 +1,150 @@
+import sys
+from contextlib import contextmanager
+from copy import deepcopy
+from functools import lru_cache, partial
+from threading import Lock
+from time import perf_counter
+
 from imdb import Cinemagoer, IMDbError
 
+from policy import INVALID, FetchPolicy, classify
+
+DAY = 24 * 60 * 60  # seconds
+
+_client_lock = Lock()
+
+
+class MovieRecord(tuple):
+    """ The fields extracted for one title: a plain tuple of values, in the order of its type's fields, that can also
+    be read like a dict of them. Writers given the same fields in the same order write the tuple as it is.
+
+    Each field selection gets its own subclass (see record_type), so the field names are stored once per job rather
+    than once per title.
+    """
+    __slots__ = ()
+    fields = ()
+    positions = {}
+
+    def __getitem__(self, key):
+        return tuple.__getitem__(self, self.positions[key] if isinstance(key, str) else key)
+
+    def __reduce__(self):
+        return _make_record, (self.fields, tuple(self))
+
+    def __repr__(self):
+        return f'MovieRecord({dict(self.items())!r})'
+
+    def get(self, field, default=None):
+        position = self.positions.get(field)
+        return default if position is None else tuple.__getitem__(self, position)
+
+    def keys(self):
+        return self.positions.keys()
+
+    def items(self):
+        return zip(self.fields, self)
+
+
+@lru_cache(maxsize=None)
+def record_type(fields):
+    """ The MovieRecord subclass for a tuple of field names. """
+    return type('MovieRecord', (MovieRecord,), {'__slots__': (), 'fields': fields,
+                                                'positions': {field: i for i, field in enumerate(fields)}})
+
+
+def _make_record(fields, values):
+    return record_type(fields)(values)
+
+
+@lru_cache(maxsize=256)
+def _job_plan(source, fields, limits):
+    """ The compiled plan and info sets of source (a MovieData class) for a tuple of field names and a tuple of
+    (field, limit) pairs (None for the class-level limits). Cached, so a job compiles its plan on its first title and
+    reuses it for the rest. """
+    chosen = {field: source.fields[field] for field in fields if field in source.fields}
+    return source._compile_plan(chosen, None if limits is None else dict(limits)), source._info_for(chosen)
+
 
 class MovieData:
     fields = {}
     chosen_fields = fields
+    chosen_info = ()
+    plan = (record_type(()), ())  # the record type and extractors for the chosen fields, see _compile_plan
+    cache = None
+    negative_cache = None
+    inflight = None
+    metrics = None
 
     @classmethod
-    def _register_field(cls, method, name, config=None):
-        """Register an available field that can be used to query the data."""
+    def _register_field(cls, method, name, config=None, info=(), ttl=None):
+        """Register an available field that can be used to query the data, along with the info sets it is read from and
+        how many seconds a value stays fresh for (None if it never goes stale)."""
         # if a config is supplied, it must have min, max, default
         if config and not all(c in config for c in ("min", "max", "default")):
             raise RuntimeError(f"Configuration for '{name}' field is invalid. Must specify min, max and default.")
 
-        cls.fields[name] = {'method': method, 'config': config}
+        cls.fields[name] = {'method': method, 'config': config, 'info': info, 'ttl': ttl}
 
     @classmethod
     def _unregister_field(cls, name):
         """Remove a specified file from the list of available fields."""
         cls.fields.pop(name)
 
+    @classmethod
+    def set_cache(cls, cache):
+        """Put a persistent response cache in front of the data source, or remove it by passing None."""
+        cls.cache = cache
+
+    @classmethod
+    def set_negative_cache(cls, negative_cache):
+        """Remember the IDs found not to exist in a NegativeCache (see cache.py), or stop with None."""
+        cls.negative_cache = negative_cache
+
+    @classmethod
+    def set_inflight(cls, inflight):
+        """Have concurrent fetches of the same title (by any job) share one request through an InFlight (see
+        cache.py), or fetch each separately with None."""
+        cls.inflight = inflight
+
+    @classmethod
+    def set_metrics(cls, metrics):
+        """Record fetch, parse and per-field extraction timings into metrics, or stop recording by passing None."""
+        cls.metrics = metrics
+
     @classmethod
     def get_field_names(cls):
         return cls.fields.keys()
 
+    @staticmethod
+    def _compile_plan(chosen, limits=None):
+        """Fix the record type and extractors for chosen (a dict of field data) once per job, so that extracting a title
+        is a single pass over a tuple of methods instead of a walk through the field registry.
+
+        Given limits, each configurable field's extractor is bound to its limit (or the field's default), so the plan
+        no longer reads the class-level limits that set_field_limits changes."""
+        if limits is None:
+            return record_type(tuple(chosen)), tuple(field_data['method'] for field_data in chosen.values())
+        return record_type(tuple(chosen)), tuple(
+            partial(field_data['method'], limit=limits.get(field, field_data['config']['default']))
+            if field_data['config'] else field_data['method'] for field, field_data in chosen.items())
+
+    @classmethod
+    def _plan_for(cls, fields, limits=None):
+        """The plan and info sets for a job's own fields and limits, which need not be the chosen ones."""
+        return _job_plan(cls, tuple(fields), None if limits is None else tuple(sorted(limits.items())))
+
+    @classmethod
+    def _info_for(cls, fields):
+        return ()
+
     @classmethod
     def get_field_configs(cls):
         pass
 
+    @classmethod
+    def get_field_ttls(cls):
+        return {field: field_data['ttl'] for field, field_data in cls.fields.items()}
+
     @classmethod
     def set_chosen_fields(cls, choices):
         pass
@@ -36,15 +154,27 @@ class MovieData:
         pass
 
     @classmethod
-    def get_movie_data(cls, identifier):
+    def get_movie_data(cls, identifier, fields=None, limits=None):
         pass
 
 
 class IMDbData(MovieData):
     """ This is the client code that specifies what Movie data is available for extraction. """
-    imdb = Cinemagoer()
+    imdb = None  # the shared client, created on first use (see _shared_client)
+    client_pool = None
+    fetch_policy = FetchPolicy()
     BASE_URL = 'http://www.imdb.com/title/'
 
+    # Cinemagoer info sets: 'main' is the title's reference page, 'plot' its plot summary page (including the synopsis).
+    # If no chosen field needs a page, 'main' is still fetched to confirm the ID exists.
+    VALIDATION_INFO = ('main',)
+
+    # How long each kind of value stays fresh: ratings move daily, credits and synopses are occasionally corrected, and
+    # the rest practically never change.
+    VOLATILE_TTL = DAY
+    EDITED_TTL = 30 * DAY
+    STABLE_TTL = 365 * DAY
+
     # Field limits
     MAX_GENRES = 3
     MAX_COUNTRIES = 3
@@ -53,52 +183,197 @@ class IMDbData(MovieData):
 
     def __init__(self):
         super().__init__()
-        self._register_field(self._get_title, 'Title')
-        self._register_field(self._get_director, 'Director')
+        self._register_field(self._get_title, 'Title', info=('main',), ttl=self.STABLE_TTL)
+        self._register_field(self._get_director, 'Director', info=('main',), ttl=self.STABLE_TTL)
         self._register_field(self._get_genres, 'Genres',
-                             {'label': 'Max genres', 'default': self.MAX_GENRES, 'min': 1, 'max': 9})
-        self._register_field(self._get_short_synopsis, 'Synopsis (short)')
-        self._register_field(self._get_full_synopsis, 'Synopsis (long)')
-        self._register_field(self._get_year, 'Year')
+                             {'label': 'Max genres', 'default': self.MAX_GENRES, 'min': 1, 'max': 9}, ('main',),
+                             self.EDITED_TTL)
+        self._register_field(self._get_short_synopsis, 'Synopsis (short)', info=('main', 'plot'), ttl=self.EDITED_TTL)
+        self._register_field(self._get_full_synopsis, 'Synopsis (long)', info=('plot',), ttl=self.EDITED_TTL)
+        self._register_field(self._get_year, 'Year', info=('main',), ttl=self.STABLE_TTL)
         self._register_field(self._get_countries, 'Countries',
-                             {'label': 'Max countries', 'default': self.MAX_COUNTRIES, 'min': 1, 'max': 9})
+                             {'label': 'Max countries', 'default': self.MAX_COUNTRIES, 'min': 1, 'max': 9}, ('main',),
+                             self.STABLE_TTL)
         self._register_field(self._get_cast, 'Cast',
-                             {'label': 'Max cast', 'default': self.MAX_CAST, 'min': 1, 'max': 9})
-        self._register_field(self._get_runtime, 'Runtime')
+                             {'label': 'Max cast', 'default': self.MAX_CAST, 'min': 1, 'max': 9}, ('main',),
+                             self.EDITED_TTL)
+        self._register_field(self._get_runtime, 'Runtime', info=('main',), ttl=self.STABLE_TTL)
         self._register_field(self._get_language, 'Language',
-                             {'label': 'Max languages', 'default': self.MAX_LANGS, 'min': 1, 'max': 9})
-        self._register_field(self._get_rating, 'IMDb rating')
+                             {'label': 'Max languages', 'default': self.MAX_LANGS, 'min': 1, 'max': 9}, ('main',),
+                             self.STABLE_TTL)
+        self._register_field(self._get_rating, 'IMDb rating', info=('main',), ttl=self.VOLATILE_TTL)
         self._register_field(self._get_imdb_id, 'IMDb ID')
         self._register_field(self._get_url, 'URL')
+        self.set_chosen_fields(self.get_field_names())
+
+    @classmethod
+    def set_client_pool(cls, client_pool):
+        """Give each worker its own client from the pool instead of sharing the class-level one (None to go back)."""
+        cls.client_pool = client_pool
+
+    @classmethod
+    def set_fetch_policy(cls, fetch_policy):
+        """Choose how fetches are retried, hedged and throttled (see policy.py), or make single attempts with None."""
+        cls.fetch_policy = fetch_policy
 
     @classmethod
     def set_chosen_fields(cls, choices):
         cls.chosen_fields = {field: cls.fields[field] for field in choices if field in cls.fields}
+        cls.chosen_info = cls._info_for(cls.chosen_fields)
+        cls.plan = cls._compile_plan(cls.chosen_fields)
+
+    @classmethod
+    def _info_for(cls, fields):
+        """ The info sets to fetch for fields (a dict of field data): only the pages those fields are read from. """
+        info = []
+        for field_data in fields.values():
+            info.extend(i for i in field_data['info'] if i not in info)
+        return tuple(info) or cls.VALIDATION_INFO
 
     @classmethod
     def set_field_limits(cls, limits):
         cls.MAX_GENRES = limits.get('Genres', cls.MAX_GENRES)
         cls.MAX_COUNTRIES = limits.get('Countries', cls.MAX_COUNTRIES)
         cls.MAX_CAST = limits.get('Cast', cls.MAX_CAST)
-        cls.MAX_LANGS = limits.get('Languages', cls.MAX_LANGS)
+        cls.MAX_LANGS = limits.get('Language', cls.MAX_LANGS)
 
     @classmethod
     def get_field_configs(cls):
         return {field: field_data['config'] for field, field_data in cls.fields.items()}
 
     @classmethod
-    def get_movie_data(cls, identifier):
-        """ Return all the requested data for a given movie if identifier is valid, otherwise return None. """
+    def get_movie_data(cls, identifier, fields=None, limits=None):
+        """ Return all the requested data for a given movie if identifier is valid, otherwise return None.
+
+        Given fields and/or limits, those are used instead of the chosen fields and the class-level limits, so that
+        concurrent jobs never see each other's selection; only the info sets the fields need are fetched.
+
+        Raises FetchError if the fetch policy gave up on a fetch that failed for reasons unrelated to the ID. """
+        plan, info = cls.plan, cls.chosen_info
+        if fields is not None or limits is not None:
+            plan, info = cls._plan_for(cls.chosen_fields if fields is None else fields, limits)
         try:
-            movie = cls.imdb.get_movie(identifier)
-            return cls._get_metadata(movie)
-        except IMDbError:
-            print(f'Invalid ID: {identifier}')
+            movie = cls._fetch_movie(identifier, info)
+            return cls._get_metadata(movie, plan)
+        except IMDbError as e:
+            # only an ID that IMDb says doesn't exist is remembered, not one that merely failed to parse
+            if cls.negative_cache is not None and classify(e) == INVALID:
+                cls.negative_cache.add(identifier)
+            print(f'Invalid ID: {identifier}', file=sys.stderr)
+
+    @classmethod
+    def _fetch_movie(cls, identifier, info=None):
+        """ Retrieve the raw movie with the given (by default, the chosen) info sets from the cache if possible,
+        otherwise from IMDb (caching it for next time). A cached movie that lacks some info sets only has the missing
+        ones fetched. If the same title is already being fetched, that fetch's movie is shared, and only the info sets
+        it lacks (when another job wanted fewer) are fetched on top of it. """
+        info = info or cls.chosen_info
+        if cls.inflight is None:
+            return cls._load_movie(identifier, info)
+        movie = cls.inflight.call(identifier, lambda: cls._load_movie(identifier, info))
+        missing = [i for i in info if i not in movie.current_info]
+        if missing:
+            movie = cls._fetch(lambda imdb: cls._update(imdb, deepcopy(movie), missing))
+            if cls.cache is not None:
+                cls.cache.put(identifier, movie)
+        return movie
+
+    @classmethod
+    def _load_movie(cls, identifier, info):
+        movie = cls.cache.get(identifier) if cls.cache is not None else None
+        if movie:
+            missing = [i for i in info if i not in movie.current_info]
+            if not missing:
+                if cls.metrics:
+                    cls.metrics.increment('cache_total', result='hit')
+                return movie
+            movie = cls._fetch(lambda imdb: cls._update(imdb, deepcopy(movie), missing))
+        else:
+            movie = cls._fetch(lambda imdb: cls._timed(imdb, imdb.get_movie, identifier, info=info))
+
+        if cls.metrics and cls.cache is not None:
+            cls.metrics.increment('cache_total', result='miss')
+
+        if cls.cache is not None:
+            cls.cache.put(identifier, movie)
+        return movie
+
+    @classmethod
+    def _fetch(cls, attempt):
+        """ Run attempt(imdb) with a client, under the fetch policy. Each attempt borrows its own client, so that a
+        hedged duplicate can run alongside the original. """
+        def with_client():
+            with cls._client() as imdb:
+                return attempt(imdb)
+
+        return cls.fetch_policy.call(with_client) if cls.fetch_policy else with_client()
+
+    @classmethod
+    def _update(cls, imdb, movie, info):
+        # attempts update a copy of the cached movie, so that concurrent (hedged) attempts never share one
+        cls._timed(imdb, imdb.update, movie, info=info)
+        return movie
+
+    @classmethod
+    @contextmanager
+    def _client(cls):
+        """ Borrow a client from the pool if there is one, otherwise use the shared class-level client. """
+        if cls.client_pool:
+            with cls.client_pool.client() as imdb:
+                yield imdb
+        else:
+            yield cls._shared_client()
+
+    @classmethod
+    def _shared_client(cls):
+        """ The shared class-level client, created on first use rather than at import: building one loads all of
+        Cinemagoer's parsers, which a process that never fetches, or only fetches through a pool, shouldn't pay for. """
+        if cls.imdb is None:
+            with _client_lock:
+                if cls.imdb is None:
+                    cls.imdb = Cinemagoer()
+        return cls.imdb
+
+    @classmethod
+    def _timed(cls, imdb, fetch, *args, **kwargs):
+        """ Call one of the client's fetch methods, recording the time spent on the network and on Cinemagoer's parsing.
+
+        Only a client with a keep-alive opener (see clients.py) can tell the two apart; for any other, the whole call is
+        recorded as fetch time."""
+        if not cls.metrics:
+            return fetch(*args, **kwargs)
+
+        network = getattr(imdb.urlOpener, 'network_seconds', None)
+        start = perf_counter()
+        try:
+            return fetch(*args, **kwargs)
+        finally:
+            elapsed = perf_counter() - start
+            if network is None:
+                cls.metrics.observe('stage_seconds', elapsed, stage='fetch')
+            else:
+                network = imdb.urlOpener.network_seconds - network
+                cls.metrics.observe('stage_seconds', network, stage='fetch')
+                cls.metrics.observe('stage_seconds', elapsed - network, stage='parse')
+
+    @classmethod
+    def _get_metadata(cls, movie, plan=None):
+        """ Gather all the requested data for the specified movie, as a MovieRecord of the chosen fields (or of the
+        fields of another compiled plan). """
+        record, extractors = plan or cls.plan
+        if cls.metrics:
+            return cls._get_metadata_timed(movie, record, extractors)
+        return record([extract(movie) for extract in extractors])
 
     @classmethod
-    def _get_metadata(cls, movie):
-        """ Gather all the requested data for the specified movie. """
-        return {field: field_data.get('method')(movie) for field, field_data in cls.chosen_fields.items()}
+    def _get_metadata_timed(cls, movie, record, extractors):
+        """ As _get_metadata, but timing each field's extractor. """
+        values = []
+        for field, extract in zip(record.fields, extractors):
+            start = perf_counter()
+            values.append(extract(movie))
+            cls.metrics.observe('extract_seconds', perf_counter() - start, field=field)
+        return record(values)
 
     @classmethod
     def _get_title(cls, movie):
@@ -108,15 +383,15 @@ class IMDbData(MovieData):
     def _get_director(cls, movie):
         directors = movie.get('directors')
         if directors:
-            return ', '.join([d['name'] for d in directors])
+            return ', '.join([director['name'] for director in directors])
         else:
             return 'n/a'
 
     @classmethod
-    def _get_genres(cls, movie):
+    def _get_genres(cls, movie, limit=None):
         genres = movie.get('genres')
         if genres:
-            return ', '.join([g for g in genres][:cls.MAX_GENRES])
+            return ', '.join(genres[:limit or cls.MAX_GENRES])
         else:
             return 'n/a'
 
@@ -145,18 +420,19 @@ class IMDbData(MovieData):
         return movie.get('year', 'n/a')
 
     @classmethod
-    def _get_countries(cls, movie):
+    def _get_countries(cls, movie, limit=None):
         countries = movie.get('countries')
         if countries:
-            return ', '.join([c for c in countries][:cls.MAX_COUNTRIES])
+            return ', '.join(countries[:limit or cls.MAX_COUNTRIES])
         else:
             return 'n/a'
 
     @classmethod
-    def _get_cast(cls, movie):
+    def _get_cast(cls, movie, limit=None):
         cast = movie.get('cast')
         if cast:
-            return ', '.join([c['name'] for c in cast][:cls.MAX_CAST])
+            # slice first: a cast list can run to hundreds of names, only a few of which are wanted
+            return ', '.join([person['name'] for person in cast[:limit or cls.MAX_CAST]])
         else:
             return 'n/a'
 
@@ -169,10 +445,10 @@ class IMDbData(MovieData):
             return 'n/a'
 
     @classmethod
-    def _get_language(cls, movie):
+    def _get_language(cls, movie, limit=None):
         languages = movie.get('languages')
         if languages:
-            return ', '.join([lang for lang in languages][:cls.MAX_LANGS])
+            return ', '.join(languages[:limit or cls.MAX_LANGS])
         else:
             return 'n/a'
 
@@ -182,7 +458,7 @@ class IMDbData(MovieData):
 
     @classmethod
     def _get_imdb_id(cls, movie):
-        return 'tt' + movie.get('imdbID')
+        return 'tt' + movie.movieID
 
     @classmethod
     def _get_url(cls, movie):
@@ -0,0 +1,280 @@
+""" How each fetch from IMDb is attempted: which errors are worth retrying, how long to back off between attempts,
+when to hedge a slow request with a duplicate, and when to stop hammering a site that is clearly struggling. """
+import random
+import socket
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from threading import Condition, Lock
+
+from imdb import IMDbError
+from imdb._exceptions import IMDbDataAccessError
+
+# Error classes
+INVALID = 'invalid'  # the ID doesn't exist; retrying won't help
+PERMANENT = 'permanent'  # any other error that retrying won't help
+TRANSIENT = 'transient'  # timeouts, dropped connections, server errors
+THROTTLED = 'throttled'  # the site is asking us to slow down
+
+RETRIES = 3
+BACKOFF = 0.5  # seconds before the first retry, doubling with each one after
+MAX_BACKOFF = 30  # seconds
+THROTTLE_FACTOR = 4  # throttling backs off this many times longer than other transient errors
+CONCURRENCY = 256  # attempts assumed to be made at once when hedging, if not told: more than any engine runs by default
+
+
+class FetchError(Exception):
+    """ A fetch that still failed after every retry, so nothing is known about whether the ID is valid. """
+
+    def __init__(self, kind, cause):
+        super().__init__(f'{kind}: {cause}')
+        self.kind = kind
+        self.cause = cause
+
+
+def status_of(error):
+    """ The HTTP status behind a Cinemagoer error, if there was one. """
+    details = error.args[0] if error.args and isinstance(error.args[0], dict) else {}
+    # the keep-alive opener reports it directly, Cinemagoer's own opener wraps urllib's HTTPError
+    return details.get('errcode') or getattr(details.get('original exception'), 'code', None)
+
+
+def classify(error):
+    """ Sort an error raised while fetching a title into one of INVALID, PERMANENT, TRANSIENT or THROTTLED. """
+    if isinstance(error, (socket.timeout, ConnectionError)):
+        return TRANSIENT
+    if not isinstance(error, IMDbError):
+        return PERMANENT
+
+    status = status_of(error)
+    if status in (404, 410):
+        return INVALID
+    if status in (403, 429, 503):
+        return THROTTLED
+    if status == 408 or (status and status >= 500):
+        return TRANSIENT
+    if isinstance(error, IMDbDataAccessError) and not status:
+        return TRANSIENT  # the request never got a response: a timeout or a dropped connection
+    return PERMANENT
+
+
+class CircuitBreaker:
+    """ Pauses every fetch for a while once too many recent attempts have failed, instead of letting each worker keep
+    hammering (and getting throttled by) a site that is down or rate limiting us.
+
+    After the pause a single probe is let through: if it succeeds fetching resumes, otherwise the pause starts again,
+    twice as long (up to max_cooldown).
+    """
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half-open'
+
+    def __init__(self, threshold=0.5, window=50, min_attempts=20, cooldown=5, max_cooldown=120, clock=time.monotonic):
+        self.threshold = threshold
+        self.min_attempts = min_attempts
+        self.base_cooldown = self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.clock = clock
+        self.outcomes = deque(maxlen=window)
+        self.state = self.CLOSED
+        self.opened_at = None
+        self.probing = False
+        self.trips = 0
+        self._condition = Condition()
+
+    def before_attempt(self):
+        """ Block while the breaker is open, or while another worker's probe is deciding whether to close it. """
+        with self._condition:
+            while True:
+                if self.state == self.CLOSED:
+                    return
+                if self.state == self.OPEN:
+                    remaining = self.opened_at + self.cooldown - self.clock()
+                    if remaining > 0:
+                        self._condition.wait(remaining)
+                        continue
+                    self.state = self.HALF_OPEN
+                if not self.probing:
+                    self.probing = True
+                    return
+                self._condition.wait(1)
+
+    def record(self, success):
+        with self._condition:
+            if self.state == self.HALF_OPEN and self.probing:
+                self.probing = False
+                if success:
+                    self.state = self.CLOSED
+                    self.cooldown = self.base_cooldown
+                    self.outcomes.clear()
+                else:
+                    self.cooldown = min(self.cooldown * 2, self.max_cooldown)
+                    self._open()
+                self._condition.notify_all()
+                return
+
+            self.outcomes.append(success)
+            failures = self.outcomes.count(False)
+            if (self.state == self.CLOSED and len(self.outcomes) >= self.min_attempts
+                    and failures / len(self.outcomes) >= self.threshold):
+                self._open()
+
+    def _open(self):
+        self.state = self.OPEN
+        self.opened_at = self.clock()
+        self.trips += 1
+
+
+class LatencyTracker:
+    """ Keeps the latencies of recent successful attempts, to estimate a percentile of them cheaply. """
+
+    def __init__(self, size=1000, refresh_every=50):
+        self.samples = deque(maxlen=size)
+        self.refresh_every = refresh_every
+        self.since_refresh = 0
+        self.cached = {}
+        self._lock = Lock()
+
+    def add(self, seconds):
+        with self._lock:
+            self.samples.append(seconds)
+            self.since_refresh += 1
+            if self.since_refresh >= self.refresh_every:
+                self.since_refresh = 0
+                self.cached.clear()
+
+    def percentile(self, q):
+        """ The q-th (0-1) quantile of the recent samples, or None until there are enough of them to mean anything. """
+        with self._lock:
+            if len(self.samples) < self.refresh_every:
+                return None
+            if q not in self.cached:
+                ordered = sorted(self.samples)
+                self.cached[q] = ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+            return self.cached[q]
+
+
+class FetchPolicy:
+    """ Runs each fetch with retries, optional hedging, a circuit breaker and a concurrency limiter.
+
+    Only TRANSIENT and THROTTLED errors are retried, after a jittered exponential backoff; anything else is raised
+    straight away. Once every retry is used up, a FetchError is raised so the caller can tell "this ID doesn't exist"
+    apart from "we couldn't find out".
+
+    With hedging on, an attempt still running after the recent p95 latency (hedge_quantile) gets a duplicate, and
+    whichever finishes first wins. hedge_budget caps duplicates at that share of all attempts, so a slow site isn't
+    also sent twice the traffic. Hedged attempts run on a pool of their own, with room for a duplicate beside each of
+    the concurrency attempts callers make at once (by default the limiter's maximum), so it never holds them back.
+
+    A limiter (see limiter.py) caps how many attempts are in flight at once, and learns from each one's outcome.
+    """
+
+    def __init__(self, retries=RETRIES, backoff=BACKOFF, max_backoff=MAX_BACKOFF, breaker=None, hedge=False,
+                 hedge_quantile=0.95, hedge_budget=0.1, limiter=None, metrics=None, sleep=time.sleep, concurrency=None):
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.breaker = breaker
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.hedge_budget = hedge_budget
+        self.limiter = limiter
+        self.metrics = metrics
+        self.sleep = sleep
+        self.latencies = LatencyTracker()
+        self.attempts = 0
+        self.hedges = 0
+        self.retried = 0
+        self._lock = Lock()
+        self._executor = None
+        if hedge:
+            # threads are only started as attempts need them, so this is a bound, not a cost
+            concurrency = concurrency or getattr(limiter, 'max_limit', None) or CONCURRENCY
+            self._executor = ThreadPoolExecutor(max_workers=2 * concurrency, thread_name_prefix='hedge')
+
+    def call(self, attempt):
+        """ Return attempt()'s result, retrying it as the policy allows. attempt must be safe to run twice at once. """
+        for retry in range(self.retries + 1):
+            if self.breaker:
+                self.breaker.before_attempt()
+            try:
+                result = self._hedged(attempt) if self.hedge else self._timed(attempt)
+            except Exception as e:
+                kind = classify(e)
+                if kind not in (TRANSIENT, THROTTLED):
+                    self._record(True)  # the site answered, so it is healthy even if the ID isn't
+                    raise
+                self._record(False, kind)
+                if retry == self.retries:
+                    raise FetchError(kind, e) from e
+                self.sleep(self.delay(retry, kind))
+                with self._lock:
+                    self.retried += 1
+            else:
+                self._record(True)
+                return result
+
+    def delay(self, retry, kind=TRANSIENT):
+        """ Full jitter: a random wait of up to backoff * 2^retry seconds, longer when the site is throttling us. """
+        cap = self.backoff * 2 ** retry * (THROTTLE_FACTOR if kind == THROTTLED else 1)
+        return random.uniform(0, min(cap, self.max_backoff))
+
+    def _record(self, success, kind=None):
+        if self.breaker:
+            self.breaker.record(success)
+        if self.metrics and kind:
+            self.metrics.increment('fetch_errors_total', kind=kind)
+
+    def _timed(self, attempt):
+        with self._lock:
+            self.attempts += 1
+        if self.limiter:
+            self.limiter.acquire()
+        start = time.perf_counter()
+        kind = None
+        try:
+            result = attempt()
+        except Exception as e:
+            kind = classify(e)
+            raise
+        finally:
+            latency = time.perf_counter() - start
+            if self.limiter:
+                self.limiter.release(latency, kind if kind in (TRANSIENT, THROTTLED) else None)
+        self.latencies.add(latency)
+        return result
+
+    def _hedged(self, attempt):
+        """ Run attempt, starting a duplicate if it is slower than usual; return the first result to succeed. """
+        delay = self.latencies.percentile(self.hedge_quantile)
+        if delay is None:
+            return self._timed(attempt)  # too few samples yet to tell slower than usual
+        primary = self._executor.submit(self._timed, attempt)
+        if wait([primary], timeout=delay).done or not self._hedge_allowed():
+            return primary.result()
+
+        if self.metrics:
+            self.metrics.increment('hedged_requests_total')
+        pending = {primary, self._executor.submit(self._timed, attempt)}
+        while True:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if not future.exception():
+                    return future.result()
+            if not pending:
+                # both failed, report the primary's error
+                return primary.result()
+
+    def _hedge_allowed(self):
+        with self._lock:
+            if self.hedges >= self.hedge_budget * self.attempts:
+                return False
+            self.hedges += 1
+            return True
+
+    def stats(self):
+        return {'attempts': self.attempts, 'retries': self.retried, 'hedges': self.hedges,
+                'breaker_trips': self.breaker.trips if self.breaker else 0,
+                'concurrency_limit': getattr(self.limiter, 'limit', None)}
+
+    def close(self):
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,155 @@
+""" Incremental refreshes: remember when each field of each title was last fetched, and on the next run fetch only the
+fields whose TTL (see MovieData._register_field) has run out, merging the rest from what is already known.
+
+    python src/cli.py movies.csv -o movies.csv --fields "Title,IMDb rating" \
+        --refresh fields.sqlite --previous movies.csv
+
+A nightly run like this one only fetches each title's 'main' info set for its rating, and serves the title from the
+store until it is a year old. The store is seeded from the previous output the first time (its values count as
+fetched when the file was last modified), so an existing catalogue needs no rescrape to start refreshing.
+
+Stored values are reused until their TTL runs out even if a field's limit has changed since; start a new store after
+changing limits.
+"""
+import json
+import os
+import re
+import sqlite3
+import time
+from threading import Lock
+
+from file_handler import read_rows
+
+ID_FIELDS = ('IMDb ID', 'URL')  # the columns of an earlier output the title's ID can be read from
+
+
+class FieldStore:
+    """ The latest value of every field fetched for every title, with when it was fetched, in a single SQLite file.
+    Safe to share between the threads of a scraping job. """
+
+    def __init__(self, path='fields.sqlite'):
+        self.path = path
+        self._lock = Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS fields '
+                           '(id TEXT, field TEXT, value TEXT, fetched REAL, PRIMARY KEY (id, field)) WITHOUT ROWID')
+
+    def load(self, identifier):
+        """ Return {field: (value, fetched)} for everything known about a title. """
+        with self._lock:
+            rows = self._conn.execute('SELECT field, value, fetched FROM fields WHERE id = ?', (identifier,)).fetchall()
+        return {field: (json.loads(value), fetched) for field, value, fetched in rows}
+
+    def update(self, identifier, data, fetched):
+        """ Record freshly fetched values for some of a title's fields. """
+        rows = [(identifier, field, json.dumps(value), fetched) for field, value in data.items()]
+        with self._lock:
+            self._conn.executemany('INSERT OR REPLACE INTO fields VALUES (?, ?, ?, ?)', rows)
+
+    def seed(self, rows, pattern, fetched, batch_size=10_000):
+        """ Add the rows of an earlier output, as if fetched at fetched, without overwriting anything already known.
+        Each row's ID is read with pattern from its 'IMDb ID' or 'URL' column; rows with neither are skipped. Returns
+        the number of titles seeded. """
+        pattern = re.compile(pattern)
+        seeded = 0
+        batch = []
+        for row in rows:
+            match = next((pattern.search(str(row[field])) for field in ID_FIELDS if row.get(field)), None)
+            if not match:
+                continue
+            batch.extend((match.group(1), field, json.dumps(value), fetched) for field, value in row.items())
+            seeded += 1
+            if len(batch) >= batch_size:
+                self._insert(batch)
+                batch = []
+        self._insert(batch)
+        return seeded
+
+    def _insert(self, batch):
+        with self._lock:
+            self._conn.execute('BEGIN')
+            self._conn.executemany('INSERT OR IGNORE INTO fields VALUES (?, ?, ?, ?)', batch)
+            self._conn.execute('COMMIT')
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def seed_from_output(store, path, pattern, file_format=None):
+    """ Seed store from an earlier output file, taking its modification time as when its values were fetched. """
+    return store.seed(read_rows(path, file_format), pattern, os.path.getmtime(path))
+
+
+class RefreshData:
+    """ Wraps a MovieData source so that only stale fields are fetched, and the rest are served from a FieldStore.
+
+    A field is stale once its TTL has passed since it was fetched, or if it was never fetched for the title. If none of
+    the chosen fields are stale, the title is not fetched at all; otherwise only the stale fields are asked for, so the
+    source fetches just the info sets they need. A title that has since become invalid is reported as invalid, rather
+    than served from the store.
+    """
+
+    def __init__(self, source, store, clock=time.time):
+        self.source = source
+        self.store = store
+        self.clock = clock
+        self.chosen = []
+        self.fetched = 0
+        self.skipped = 0
+        self._lock = Lock()
+
+    def get_field_names(self):
+        return self.source.get_field_names()
+
+    def get_field_configs(self):
+        return self.source.get_field_configs()
+
+    def get_field_ttls(self):
+        return self.source.get_field_ttls()
+
+    def set_chosen_fields(self, choices):
+        self.chosen = list(choices)
+        self.source.set_chosen_fields(choices)
+
+    def set_field_limits(self, limits):
+        self.source.set_field_limits(limits)
+
+    def set_metrics(self, metrics):
+        self.source.set_metrics(metrics)
+
+    def set_negative_cache(self, cache):
+        self.source.set_negative_cache(cache)
+
+    def set_inflight(self, inflight):
+        self.source.set_inflight(inflight)
+
+    def stale_fields(self, known, now, fields=None):
+        """ The fields (by default, the chosen ones) that need fetching, given {field: (value, fetched)} for the
+        title. """
+        ttls = self.source.get_field_ttls()
+        return [field for field in (self.chosen if fields is None else fields)
+                if field not in known or (ttls.get(field) is not None and now - known[field][1] >= ttls[field])]
+
+    def get_movie_data(self, identifier, fields=None, limits=None):
+        now = self.clock()
+        known = self.store.load(identifier)
+        wanted = self.chosen if fields is None else list(fields)
+        stale = self.stale_fields(known, now, wanted)
+        if stale:
+            data = self.source.get_movie_data(identifier, stale, limits)
+            if data is None:
+                return None
+            self.store.update(identifier, data, now)
+            known.update((field, (value, now)) for field, value in data.items())
+        with self._lock:
+            if stale:
+                self.fetched += 1
+            else:
+                self.skipped += 1
+        return {field: known[field][0] for field in wanted if field in known}
+
+    def stats(self):
+        return {'fetched': self.fetched, 'skipped': self.skipped}
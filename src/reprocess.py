@@ -0,0 +1,106 @@
+""" Offline re-extraction: run any field selection and limits over the pages archived by an earlier scrape (see
+archive.py), in parallel worker processes, instead of fetching every title again.
+
+    python src/cli.py ids.csv -o movies.csv --archive pages.sqlite --no-cache
+    python src/reprocess.py pages.sqlite -o movies.csv --fields "Title,Countries,Cast" --limit Cast=10
+
+With no ID files given, every title in the archive is reprocessed, in ID order.
+"""
+import argparse
+import os
+import sys
+import time
+from multiprocessing import Pool
+
+from imdb import IMDbError
+
+from archive import PageArchive, archive_client
+from cli import parse_limits, quiet_cinemagoer, stream_ids
+from file_handler import STDOUT, WRITERS, CsvHandler
+from movie_data import IMDbData
+from scraper import ID_PATTERN
+
+CHUNK_SIZE = 64  # titles handed to a worker at a time, so the pool isn't dominated by messaging overhead
+
+
+def _init_worker(archive_path, fields, limits):
+    """ Point this worker process's IMDbData at the archive, with nothing between the two. """
+    quiet_cinemagoer()
+    IMDbData()
+    IMDbData.imdb = archive_client(PageArchive(archive_path))
+    IMDbData.set_client_pool(None)
+    IMDbData.set_fetch_policy(None)
+    IMDbData.set_cache(None)
+    IMDbData.set_metrics(None)
+    IMDbData.set_chosen_fields(fields)
+    IMDbData.set_field_limits(limits)
+
+
+def _extract(identifier):
+    """ The chosen fields for one title, or None if the pages they need aren't in the archive. """
+    try:
+        return IMDbData._get_metadata(IMDbData._fetch_movie(identifier))
+    except IMDbError:
+        return None
+
+
+def reprocess(archive_path, fields, limits, output, ids=None, processes=None, output_format=None,
+              chunk_size=CHUNK_SIZE):
+    """ Extract fields (with limits) for ids, or every archived title, from the archive at archive_path and write them
+    to output in order. Parsing is CPU-bound, so it is spread over processes worker processes (default: one per CPU).
+
+    Returns counts of the titles written and of those skipped because the pages they need weren't archived. """
+    if ids is None:
+        archive = PageArchive(archive_path)
+        ids = archive.ids()
+        archive.close()
+
+    start = time.perf_counter()
+    written = missing = 0
+    file_handler = CsvHandler(ID_PATTERN, output_format)
+    with Pool(processes, _init_worker, (archive_path, fields, limits)) as pool, \
+            file_handler.open_writer(fields, output) as writer:
+        for data in pool.imap(_extract, ids, chunk_size):
+            if data:
+                writer.write_row(data)
+                written += 1
+            else:
+                missing += 1
+    return {'written': written, 'missing': missing, 'seconds': time.perf_counter() - start}
+
+
+def main(argv=None):
+    field_names = list(IMDbData().get_field_names())
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('archive', help='page archive written by cli.py --archive')
+    parser.add_argument('inputs', nargs='*', help="files to read IMDb IDs from ('-' for stdin; default: every "
+                                                  "archived title)")
+    parser.add_argument('-o', '--output', default=STDOUT, help="file to write ('-' for stdout, the default)")
+    parser.add_argument('--format', choices=tuple(WRITERS), help='output format (default: from the output extension)')
+    parser.add_argument('-f', '--fields', default=','.join(field_names),
+                        help=f"comma-separated fields to extract (default: all of {', '.join(field_names)})")
+    parser.add_argument('-l', '--limit', action='append', default=[], metavar='FIELD=N',
+                        help='cap a multi-valued field, e.g. Cast=5 (repeatable)')
+    parser.add_argument('--processes', type=int, default=os.cpu_count(), help='worker processes')
+    args = parser.parse_args(argv)
+
+    fields = [field.strip() for field in args.fields.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in field_names]
+    if unknown or not fields:
+        parser.error(f"Unknown or missing fields: {', '.join(unknown)}. Choose from: {', '.join(field_names)}.")
+    if not os.path.exists(args.archive):
+        parser.error(f"No archive at '{args.archive}'.")
+    try:
+        limits = parse_limits(args.limit)
+    except argparse.ArgumentTypeError as e:
+        parser.error(str(e))
+
+    ids = stream_ids(args.inputs, CsvHandler(ID_PATTERN)) if args.inputs else None
+    stats = reprocess(args.archive, fields, limits, args.output, ids, args.processes, args.format)
+    rate = (stats['written'] + stats['missing']) / stats['seconds'] if stats['seconds'] else 0.0
+    print(f"{stats['written']} titles written in {stats['seconds']:.1f}s ({rate:.0f} titles/s), "
+          f"{stats['missing']} without the archived pages they need", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
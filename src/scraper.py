@@ -1,21 +1,59 @@
-from concurrent.futures import ThreadPoolExecutor
-from threading import Thread
+from functools import partial
+from threading import Lock, Thread
+from time import perf_counter
 
-from file_handler import CsvHandler
-from movie_data import IMDbData
-from ui import ScraperUI
+from engines import FairPool, HeadOfLine, ReorderBuffer, ThreadEngine
+from file_handler import MAX_ID_DIGITS, STDOUT, CsvHandler
+from jobs import Job, JobSpec
+from journal import Journal
+from policy import FetchError
+
+CACHE_PATH = 'imdb_cache.sqlite'
+INVALID_CACHE_PATH = 'imdb_invalid.sqlite'
+ID_PATTERN = r'tt(\d+)'
+REORDER_LIMIT = 1000
+
+
+def plausible_id(identifier):
+    """ Whether identifier could be a title ID at all: all digits, and one to eight of them after any leading zeros. """
+    return identifier.isascii() and identifier.isdigit() and 0 < len(identifier.lstrip('0')) <= MAX_ID_DIGITS
 
 
 class Scraper:
-    def __init__(self, file_handler, data_source):
+    def __init__(self, file_handler, data_source, concurrency=None):
         self.file_handler = file_handler
         self.data_source = data_source
+        self.concurrency = concurrency
+        self.pool = None  # the FairPool shared by submitted jobs, started with the first of them
+        self.jobs = []  # the jobs running now
+        self.ordered = True
+        self.reorder_limit = REORDER_LIMIT
+        self.stats = {}
+        self.metrics = None
+        self.negative_cache = None
         self.ui = None
-        self.cancelled = False
+        self._lock = Lock()
 
     def set_ui(self, ui):
         self.ui = ui
 
+    def set_ordering(self, ordered, reorder_limit=REORDER_LIMIT):
+        """Choose whether results are written in input order (buffering at most reorder_limit early finishers) or
+        in the order they complete."""
+        self.ordered = ordered
+        self.reorder_limit = reorder_limit
+
+    def set_metrics(self, metrics):
+        """Record per-title, per-stage and per-field timings into metrics (see metrics.py), or stop with None."""
+        self.metrics = metrics
+        self.data_source.set_metrics(metrics)
+
+    def set_negative_cache(self, negative_cache):
+        """Skip IDs known not to exist, reporting them as invalid without fetching them, and remember any more that are
+        found (see cache.NegativeCache); None to fetch every ID."""
+        self.negative_cache = negative_cache
+        self.data_source.set_negative_cache(negative_cache)
+
     def get_field_names(self):
         return self.data_source.get_field_names()
 
@@ -29,11 +67,17 @@ class Scraper:
         self.data_source.set_field_limits(limits)
 
     def cancel(self):
-        """Interrupt the current scraping process."""
-        self.cancelled = True
+        """Interrupt every job running now."""
+        with self._lock:
+            jobs = list(self.jobs)
+        for job in jobs:
+            job.cancel()
+
+    def process(self, movies_data, fields, scales, open_path=None, resume=False):
+        """ Check the validity of the user-submitted data and begin the processing if valid, else warn the user.
 
-    def process(self, movies_data, fields, scales, open_path=None):
-        """ Check the validity of the user-submitted data and begin the processing if valid, else warn the user."""
+        If resume is set, IDs recorded in the journal of an earlier run to the same save path are skipped and the
+        new results are appended to its output."""
         if not fields:
             self.ui.alert_user('No fields', 'No fields have been selected.')
             return
@@ -53,43 +97,191 @@ class Scraper:
         save_path = self.ui.ask_to_save()
 
         if save_path:
-            # If we've got this far, let's get processing!
-            self.set_chosen_fields(fields)
-            self.set_field_configs(scales)
+            if resume:
+                done = Journal(Journal.path_for(save_path)).load()
+                ids = [identifier for identifier in ids if identifier not in done]
+                if not ids:
+                    self.ui.alert_user('Nothing to resume', 'Every IMDb ID has already been processed.')
+                    return
+
+            # If we've got this far, let's get processing! Isolate the processing from the UI.
             self.ui.set_progress_bar_max(len(ids))
-            self.cancelled = False
-
-            # set up the thread pool and isolate the processing from the UI
-            executor = ThreadPoolExecutor()
-            movies_data = executor.map(self._get_movie, ids)
-            Thread(target=self._export, args=(movies_data, fields, save_path, executor)).start()
-
-    def _get_movie(self, identifier):
-        """Returns movie data for given identifier or None if identifier was invalid."""
-        return self.data_source.get_movie_data(identifier), identifier
-
-    def _export(self, movies, fields, path, executor):
-        """Collects the movie data and writes it out to specified file path, notifying the UI as it goes."""
-        results = []
-        for movie in movies:
-            if self.cancelled:
-                break
-            elif movie[0]:
-                results.append(movie[0])
-                self.ui.update_progress(movie[0]['Title'])  # todo this is tightly coupled to data representation
+            Thread(target=self.run, args=(ids, fields, scales, save_path, resume)).start()
+
+    def run(self, ids, fields, scales, save_path, resume=False):
+        """ Scrape every ID (any iterable, consumed lazily) into save_path, blocking until the job is done.
+
+        A save_path of '-' streams the rows to stdout instead, without a journal. The job gets a ThreadEngine of its
+        own, with concurrency workers; to run several jobs at once, submit them instead."""
+        job = Job(JobSpec(fields, scales, save_path, resume=resume, ordered=self.ordered))
+        self._run_job(job, ids, ThreadEngine(self.concurrency))
+        self.stats = job.stats
+
+    def submit(self, ids, spec):
+        """ Start a job (see jobs.JobSpec) on its own thread and return its Job at once.
+
+        Every submitted job fetches on one FairPool of the Scraper's concurrency, which serves the jobs in turn, so a
+        small job isn't held up behind a huge one. ids is consumed lazily, on the job's thread. """
+        with self._lock:
+            if self.pool is None:
+                self.pool = FairPool(self.concurrency)
+        job = Job(spec)
+        Thread(target=self._run_submitted, args=(job, ids, self.pool.engine()), daemon=True).start()
+        return job
+
+    def run_jobs(self, jobs):
+        """ Run (ids, spec) pairs concurrently on the shared pool, blocking until all are done. Returns their Jobs. """
+        submitted = [self.submit(ids, spec) for ids, spec in jobs]
+        for job in submitted:
+            job.wait()
+        return submitted
+
+    def close(self):
+        """ Cancel any running jobs and stop the shared pool's workers. """
+        self.cancel()
+        if self.pool:
+            self.pool.shutdown()
+
+    def _run_submitted(self, job, ids, engine):
+        try:
+            self._run_job(job, ids, engine)
+        except Exception:
+            pass  # kept as job.error, for whoever is waiting on the job
+
+    def _run_job(self, job, ids, engine):
+        spec = job.spec
+        with self._lock:
+            self.jobs.append(job)
+        try:
+            spec.cancel.on_cancel(engine.shutdown)
+            journal = Journal(Journal.path_for(spec.sink)) if spec.sink != STDOUT else None
+            if spec.resume and journal:
+                done = journal.load()
+                ids = (identifier for identifier in ids if identifier not in done)
+
+            max_ahead = self.reorder_limit if spec.ordered else None
+            movies_data = engine.map_unordered(partial(self._get_movie, spec=spec), self._screen(ids, job), max_ahead)
+            self._export(movies_data, job, engine, journal)
+        except Exception as e:
+            job.error = e
+            raise
+        finally:
+            with self._lock:
+                self.jobs.remove(job)
+            job.finish()
+
+    def _progress(self, spec):
+        return spec.progress or self.ui
+
+    def _screen(self, ids, job):
+        """ Yield only the IDs worth fetching, reporting the rest as invalid at once: those that can't be title IDs, and
+        those the negative cache knows don't exist. The engine pulls IDs on a thread of its own, so this reports from
+        there, alongside the job's own thread; progress reporters are safe to call from any thread. """
+        progress = self._progress(job.spec)
+        for identifier in ids:
+            if not plausible_id(identifier):
+                reason = 'implausible'
+            elif self.negative_cache is not None and identifier in self.negative_cache:
+                reason = 'known_invalid'
             else:
-                self.ui.update_progress(movie[1])
+                yield identifier
+                continue
+
+            job.skipped += 1
+            progress.update_progress(identifier, valid=False)
+            if self.metrics:
+                self.metrics.increment('titles_total', result='invalid')
+                self.metrics.increment('skipped_total', reason=reason)
 
-        executor.shutdown(cancel_futures=True)
-        self.file_handler.save_file(results, fields, path)
+    def _get_movie(self, identifier, spec=None):
+        """Returns (data, identifier, error): the movie data (the fields of spec, if given) for given identifier or None
+        if identifier was invalid, and the FetchError if it couldn't be fetched at all."""
+        start = perf_counter()
+        try:
+            if spec:
+                data, error = self.data_source.get_movie_data(identifier, spec.fields, spec.limits), None
+            else:
+                data, error = self.data_source.get_movie_data(identifier), None
+        except FetchError as e:
+            data, error = None, e
+
+        if self.metrics:
+            self.metrics.observe('title_seconds', perf_counter() - start)
+            self.metrics.increment('titles_total', result='failed' if error else 'valid' if data else 'invalid')
+        return data, identifier, error
+
+    def _export(self, movies, job, engine, journal):
+        """Writes the movie data out to the job's sink as it completes, notifying the UI as it goes.
+
+        The UI hears about every movie the moment it finishes. If ordered output is wanted, a reorder buffer holds back
+        early finishers until everything before them has arrived; otherwise a HeadOfLine passes them straight on. Either
+        way, it measures the head-of-line blocking that reporting in completion order avoided. If the job is cancelled,
+        whatever was written so far is kept, and the journal records exactly which IDs made it into the file so the job
+        can be resumed. IDs that couldn't be fetched are left out of the journal too, so resuming retries them."""
+        spec = job.spec
+        progress = self._progress(spec)
+        # in completion order, nothing needs holding back, so only the blocking that avoided is measured
+        order = ReorderBuffer() if spec.ordered else HeadOfLine()
+        failed = []
+        if journal:
+            journal.open(append=spec.resume)
+        # a resumed job cuts the output back to the journal's last checkpoint: anything after it isn't journaled, so
+        # is written again (with no checkpoint at all, that is everything)
+        checkpoint = (journal.checkpoint or (0, 0)) if journal and spec.resume else None
+        writer = self.file_handler.open_writer(spec.fields, spec.sink, append=spec.resume,
+                                               on_flush=journal and journal.flush, checkpoint=checkpoint)
+        try:
+            with writer:
+                for position, movie in movies:
+                    data, identifier, error = movie
+                    if spec.cancel.cancelled:
+                        break
+                    elif data:
+                        progress.update_progress(data.get('Title', identifier))
+                    else:
+                        if error:
+                            failed.append(identifier)
+                        progress.update_progress(identifier, valid=False, error=error)
+
+                    for data, identifier, error in order.push(position, movie):
+                        # journal first: the entry is only written out once the writer has flushed this row to disk
+                        if journal and not error:
+                            journal.record(identifier, valid=bool(data))
+                        if data and self.metrics:
+                            with self.metrics.timer('stage_seconds', stage='write'):
+                                writer.write_row(data)
+                        elif data:
+                            writer.write_row(data)
+        finally:
+            engine.shutdown()
+            if journal:
+                journal.close()
+
+        job.stats = {'failed': failed, 'skipped_invalid': job.skipped,
+                     'head_of_line_blocking': order.blocked_seconds,
+                     'peak_order': order.peak_size}
 
 
 def main():
+    # only the GUI needs tkinter, so headless entry points (see cli.py) never import it; nor do they need the rest of
+    # what the GUI sets up, which the Scraper itself doesn't depend on
+    from cache import NegativeCache, ResponseCache
+    from clients import ClientPool
+    from limiter import AdaptiveLimiter
+    from movie_data import IMDbData
+    from policy import CircuitBreaker, FetchPolicy
+    from ui import ScraperUI
+
     # set up all the objects we need
-    regex = 'tt(\d+)'
-    file_handler = CsvHandler(regex)
+    file_handler = CsvHandler(ID_PATTERN)
     data_source = IMDbData()
-    scraper = Scraper(file_handler, data_source)
+    data_source.set_cache(ResponseCache(CACHE_PATH))
+    data_source.set_client_pool(ClientPool())
+    # rather than guess a worker count, let the limiter find how many fetches IMDb will take at once
+    limiter = AdaptiveLimiter()
+    data_source.set_fetch_policy(FetchPolicy(breaker=CircuitBreaker(), limiter=limiter))
+    scraper = Scraper(file_handler, data_source, concurrency=limiter.max_limit)
+    scraper.set_negative_cache(NegativeCache(INVALID_CACHE_PATH))
     ui = ScraperUI(scraper)
     scraper.set_ui(ui)
 
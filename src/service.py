@@ -0,0 +1,374 @@
+""" A long-running local scraping service: jobs are submitted over HTTP, queued by priority and run on one shared
+Scraper, so that overlapping ID lists from several teams are fetched once rather than once per team.
+
+    python src/service.py --port 8642 --max-jobs 4
+    curl -X POST localhost:8642/jobs -d '{"ids": ["tt0133093"], "fields": ["Title"], "output": "/data/a.csv"}'
+    curl localhost:8642/jobs/1
+    curl -X DELETE localhost:8642/jobs/1
+
+The API speaks JSON:
+
+    POST   /jobs       submit a job: {"ids": [IMDb IDs or URLs] or "input": path of a file of them, "output": path,
+                       "fields": [...] (default: all), "limits": {"Cast": 5}, "priority": 0 (higher runs first),
+                       "ordered": true, "resume": false}; answers 202 with the job's status
+    GET    /jobs       every job's status
+    GET    /jobs/<id>  one job's status: its state (queued, running, done, cancelled or failed) and title counts
+    DELETE /jobs/<id>  cancel a queued or running job
+    GET    /stats      how many jobs are in each state, and how many fetches were shared between jobs
+
+A job whose output is already being written by a queued or running job is refused with 409.
+
+Paths are on the service's machine: it reads inputs and writes outputs itself.
+"""
+import argparse
+import heapq
+import json
+import os
+import re
+import sys
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import count
+from threading import Lock, Thread
+
+from cache import InFlight, NegativeCache, ResponseCache
+from cli import quiet_cinemagoer
+from file_handler import STDOUT, CsvHandler, IdSet
+from jobs import JobSpec
+from limiter import MAX_LIMIT, AdaptiveLimiter
+from movie_data import IMDbData
+from policy import CircuitBreaker, FetchPolicy
+from scraper import CACHE_PATH, ID_PATTERN, INVALID_CACHE_PATH, Scraper
+
+DEFAULT_PORT = 8642
+MAX_JOBS = 4  # jobs running at once; the rest wait their turn by priority
+JOB_PATH = re.compile(r'/jobs/(\d+)$')
+
+# Job states
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+CANCELLED = 'cancelled'
+FAILED = 'failed'
+
+
+class OutputInUse(Exception):
+    """ A job was submitted with the output of a job that is still queued or running. """
+
+
+class JobProgress:
+    """ Counts one job's titles, standing in for the UI the Scraper would otherwise report to. Safe to call from any
+    thread. """
+
+    def __init__(self):
+        self.total = None
+        self.valid = 0
+        self.invalid = 0
+        self.failed = 0
+        self._lock = Lock()
+
+    def alert_user(self, heading, txt):
+        pass
+
+    def set_progress_bar_max(self, count):
+        self.total = count
+
+    def update_progress(self, title, valid=True, error=None):
+        with self._lock:
+            if valid:
+                self.valid += 1
+            elif error:
+                self.failed += 1
+            else:
+                self.invalid += 1
+
+
+class ServiceJob:
+    """ A job as the service sees it: queued until a slot is free, then running as a Job of the shared Scraper. """
+
+    def __init__(self, job_id, ids, spec, priority):
+        self.id = job_id
+        self.ids = ids
+        self.spec = spec
+        self.priority = priority
+        self.state = QUEUED
+        self.job = None
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+
+    def status(self):
+        progress, job = self.spec.progress, self.job
+        return {'id': self.id, 'state': self.state, 'priority': self.priority, 'fields': list(self.spec.fields),
+                'output': self.spec.sink, 'valid': progress.valid, 'invalid': progress.invalid,
+                'failed': progress.failed, 'submitted': self.submitted, 'started': self.started,
+                'finished': self.finished, 'error': str(job.error) if job and job.error else None}
+
+
+class JobService:
+    """ Queues jobs by priority (highest first, then in order of submission) and runs up to max_jobs of them at once on
+    one Scraper, whose pool shares the fetch workers fairly between them.
+
+    The service puts an InFlight in front of the Scraper's data source, so a title wanted by several running jobs at
+    once is fetched once and handed to all of them; titles wanted again later come from the response cache, if the
+    data source has one. Safe to call from any thread.
+    """
+
+    def __init__(self, scraper, max_jobs=MAX_JOBS):
+        self.scraper = scraper
+        self.max_jobs = max_jobs
+        self.jobs = {}
+        self.inflight = InFlight()
+        scraper.data_source.set_inflight(self.inflight)
+        self._queue = []  # a heap of (-priority, job ID)
+        self._running = 0
+        self._ids = count(1)
+        self._lock = Lock()
+
+    def submit(self, ids, spec, priority=0):
+        """ Queue a job, starting it at once if there is a free slot. Returns its ServiceJob.
+
+        Raises OutputInUse if a queued or running job is writing to the same output, since both would write to (and
+        one would replace) the same file. """
+        spec = spec._replace(progress=spec.progress or JobProgress())
+        output = os.path.abspath(spec.sink)
+        with self._lock:
+            for other in self.jobs.values():
+                if other.state in (QUEUED, RUNNING) and os.path.abspath(other.spec.sink) == output:
+                    raise OutputInUse(f'Job {other.id} is already writing to {spec.sink}.')
+            job = ServiceJob(next(self._ids), ids, spec, priority)
+            self.jobs[job.id] = job
+            heapq.heappush(self._queue, (-priority, job.id))
+        self._dispatch()
+        return job
+
+    def cancel(self, job_id):
+        """ Cancel a queued or running job. Returns False if there is no such job. """
+        job = self.jobs.get(job_id)
+        if job is None:
+            return False
+        with self._lock:
+            if job.state == QUEUED:
+                # left on the heap, and passed over when it comes up
+                job.state, job.finished, job.ids = CANCELLED, time.time(), None
+        job.spec.cancel.cancel()
+        return True
+
+    def status(self, job_id):
+        job = self.jobs.get(job_id)
+        return job.status() if job else None
+
+    def statuses(self):
+        with self._lock:
+            jobs = list(self.jobs.values())
+        return [job.status() for job in jobs]
+
+    def stats(self):
+        with self._lock:
+            states = Counter(job.state for job in self.jobs.values())
+        return {'jobs': {state: states[state] for state in (QUEUED, RUNNING, DONE, CANCELLED, FAILED)},
+                **self.inflight.stats()}
+
+    def _dispatch(self):
+        """ Start queued jobs, best first, while there are free slots. """
+        while True:
+            with self._lock:
+                if self._running >= self.max_jobs or not self._queue:
+                    return
+                _, job_id = heapq.heappop(self._queue)
+                job = self.jobs[job_id]
+                if job.state != QUEUED:
+                    continue
+                job.state, job.started = RUNNING, time.time()
+                self._running += 1
+                ids, job.ids = job.ids, None
+
+            job.job = self.scraper.submit(ids, job.spec)
+            job.job.on_done(lambda done, job=job: self._finished(job))
+
+    def _finished(self, job):
+        with self._lock:
+            job.finished = time.time()
+            job.state = FAILED if job.job.error else CANCELLED if job.spec.cancel.cancelled else DONE
+            self._running -= 1
+        self._dispatch()
+
+    def close(self):
+        """ Cancel every job, queued or running, and stop the Scraper's workers. """
+        for job_id in list(self.jobs):
+            self.cancel(job_id)
+        self.scraper.close()
+
+
+def _is_strings(value):
+    return isinstance(value, list) and all(isinstance(item, str) for item in value)
+
+
+def parse_job(request, field_names, file_handler):
+    """ Turn a job request (see the API above) into (ids, spec, priority). Raises ValueError if it isn't valid. """
+    if not isinstance(request, dict):
+        raise ValueError('A job must be a JSON object.')
+
+    fields = request.get('fields') or list(field_names)
+    if not _is_strings(fields):
+        raise ValueError('fields must be a list of field names.')
+    unknown = [field for field in fields if field not in field_names]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}. Choose from: {', '.join(field_names)}.")
+
+    limits = request.get('limits') or {}
+    if not isinstance(limits, dict) or not all(isinstance(value, int) and value > 0 for value in limits.values()):
+        raise ValueError('limits must map fields to positive whole numbers.')
+    unknown = [field for field in limits if field not in field_names]
+    if unknown:
+        raise ValueError(f"Unknown fields in limits: {', '.join(unknown)}.")
+
+    output = request.get('output')
+    if not isinstance(output, str) or not output or output == STDOUT:
+        raise ValueError('An output path is required.')
+
+    priority = request.get('priority', 0)
+    if not isinstance(priority, int):
+        raise ValueError('priority must be a whole number.')
+
+    if request.get('input'):
+        if not os.path.isfile(request['input']):
+            raise ValueError(f"No such input file: {request['input']}")
+        ids = file_handler.iter_ids(request['input'], IdSet())
+    else:
+        ids = request.get('ids') or []
+        if not _is_strings(ids):
+            raise ValueError('ids must be a list of IMDb IDs or URLs.')
+        ids = file_handler.extract_ids(' '.join(ids))
+        if not ids:
+            raise ValueError('The job contains no potential IMDb IDs.')
+
+    spec = JobSpec(fields, limits, output, resume=bool(request.get('resume')),
+                   ordered=bool(request.get('ordered', True)))
+    return ids, spec, priority
+
+
+class JobServer:
+    """ Serves a JobService's HTTP API from a background thread when used as a context manager, or from the calling
+    thread with serve_forever. """
+
+    def __init__(self, service, host='127.0.0.1', port=DEFAULT_PORT):
+        self.service = service
+        self.field_names = list(service.scraper.get_field_names())
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self.url = f'http://{host}:{self.server.server_port}/'
+
+    def __enter__(self):
+        Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.close()
+
+    def serve_forever(self):
+        self.server.serve_forever()
+
+    def close(self):
+        self.server.server_close()
+
+    def _handler(self):
+        server, service = self, self.service
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                match = JOB_PATH.match(self.path)
+                if self.path == '/jobs':
+                    self.reply(200, service.statuses())
+                elif self.path == '/stats':
+                    self.reply(200, service.stats())
+                elif match and service.status(int(match.group(1))):
+                    self.reply(200, service.status(int(match.group(1))))
+                else:
+                    self.reply(404, {'error': 'Not found'})
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                if self.path != '/jobs':
+                    self.reply(404, {'error': 'Not found'})
+                    return
+                try:
+                    ids, spec, priority = parse_job(json.loads(body or b'{}'), server.field_names,
+                                                    service.scraper.file_handler)
+                except ValueError as e:
+                    self.reply(400, {'error': str(e)})
+                    return
+                try:
+                    job = service.submit(ids, spec, priority)
+                except OutputInUse as e:
+                    self.reply(409, {'error': str(e)})
+                    return
+                self.reply(202, job.status())
+
+            def do_DELETE(self):
+                match = JOB_PATH.match(self.path)
+                if match and service.cancel(int(match.group(1))):
+                    self.reply(200, service.status(int(match.group(1))))
+                else:
+                    self.reply(404, {'error': 'Not found'})
+
+            def reply(self, status, data):
+                body = json.dumps(data).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1', help='address to listen on')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help='port to listen on')
+    parser.add_argument('--max-jobs', type=int, default=MAX_JOBS, help='jobs to run at once; the rest are queued')
+    parser.add_argument('--concurrency', type=int, default=MAX_LIMIT,
+                        help='fetch workers shared by all jobs; the fetches in flight are tuned to what IMDb can take')
+    parser.add_argument('--cache', default=CACHE_PATH, help='response cache file')
+    parser.add_argument('--invalid-cache', default=INVALID_CACHE_PATH, help="IDs IMDb has reported don't exist")
+    parser.add_argument('--no-cache', action='store_true', help='always fetch from IMDb')
+    parser.add_argument('-v', '--verbose', action='store_true', help="show Cinemagoer's own error logging")
+    args = parser.parse_args(argv)
+
+    if not args.verbose:
+        quiet_cinemagoer()
+    # imported here, like the CLI does, so that importing the service (to embed it, say) doesn't load every parser
+    from clients import ClientPool
+
+    data_source = IMDbData()
+    if not args.no_cache:
+        data_source.set_cache(ResponseCache(args.cache))
+    data_source.set_client_pool(ClientPool())
+    limiter = AdaptiveLimiter(max_limit=args.concurrency)
+    data_source.set_fetch_policy(FetchPolicy(breaker=CircuitBreaker(), limiter=limiter))
+    scraper = Scraper(CsvHandler(ID_PATTERN), data_source, concurrency=args.concurrency)
+    if not args.no_cache:
+        scraper.set_negative_cache(NegativeCache(args.invalid_cache))
+
+    service = JobService(scraper, args.max_jobs)
+    server = JobServer(service, args.host, args.port)
+    print(f'Listening on {server.url}', file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+        server.close()
+
+
+if __name__ == '__main__':
+    main()
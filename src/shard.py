@@ -0,0 +1,290 @@
+""" Sharded scraping: spread one ID list over several worker processes, or several machines, then merge the results.
+
+The IDs go into a shared SQLite work queue. Each worker claims batches from it, writes its own shard of output (with
+its own journal, so a worker can be restarted) and a merge step stitches the shards back together in input order.
+
+    python src/shard.py run ids.csv -o movies.csv --processes 8 --fields "Title,Year"
+
+Across machines, enqueue once, point a worker on each machine at the same queue file and output directory on shared
+storage, then merge:
+
+    python src/shard.py enqueue ids.csv --queue jobs/queue.sqlite
+    python src/shard.py worker --queue jobs/queue.sqlite --output-dir jobs/shards --fields "Title,Year"
+    python src/shard.py merge --queue jobs/queue.sqlite --output-dir jobs/shards -o movies.csv --fields "Title,Year"
+"""
+import argparse
+import csv
+import json
+import os
+import socket
+import sqlite3
+import sys
+import time
+from multiprocessing import Process
+
+from cli import ConsoleProgress, parse_limits, quiet_cinemagoer, stream_ids
+from clients import ClientPool
+from file_handler import CsvHandler
+from movie_data import IMDbData
+from policy import CircuitBreaker, FetchPolicy
+from scraper import ID_PATTERN, Scraper
+
+BATCH_SIZE = 500
+ROUNDS = 3  # times the workers are started over while failed IDs are still pending
+PENDING, CLAIMED, DONE = 'pending', 'claimed', 'done'
+SHARD_KEY = 'IMDb ID'  # always written to the shards, so the merge knows which title every row belongs to
+
+
+class WorkQueue:
+    """ A work queue of IDs in a single SQLite file, safe to share between processes and (on shared storage) hosts. """
+
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS ids (id TEXT PRIMARY KEY, position INTEGER, status TEXT, '
+                          'worker TEXT, claimed_at REAL)')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS ids_status ON ids (status, position)')
+
+    def enqueue(self, ids, batch_size=10_000):
+        """ Add IDs to the queue in input order, ignoring any that are already queued (in any spelling: 'tt133093' and
+        'tt0133093' are the same title). Returns the number added. """
+        start = self.conn.execute('SELECT COALESCE(MAX(position) + 1, 0) FROM ids').fetchone()[0]
+        added = 0
+        batch = []
+        for position, identifier in enumerate(ids, start):
+            batch.append((normalise_id(identifier), position))
+            if len(batch) >= batch_size:
+                added += self._insert(batch)
+                batch = []
+        return added + self._insert(batch)
+
+    def _insert(self, batch):
+        with self._transaction():
+            before = self.conn.total_changes
+            self.conn.executemany(f"INSERT OR IGNORE INTO ids VALUES (?, ?, '{PENDING}', NULL, NULL)", batch)
+            return self.conn.total_changes - before
+
+    def claim(self, worker, size=BATCH_SIZE):
+        """ Atomically take up to size pending IDs, lowest position first. """
+        with self._transaction():
+            ids = [row[0] for row in self.conn.execute(
+                'SELECT id FROM ids WHERE status = ? ORDER BY position LIMIT ?', (PENDING, size))]
+            self.conn.executemany('UPDATE ids SET status = ?, worker = ?, claimed_at = ? WHERE id = ?',
+                                  [(CLAIMED, worker, time.time(), identifier) for identifier in ids])
+        return ids
+
+    def complete(self, worker, failed=()):
+        """ Mark everything the worker claimed as done, except the failed IDs, which go back in the queue. """
+        with self._transaction():
+            self.conn.executemany('UPDATE ids SET status = ?, worker = NULL WHERE id = ?',
+                                  [(PENDING, identifier) for identifier in failed])
+            self.conn.execute('UPDATE ids SET status = ? WHERE status = ? AND worker = ?', (DONE, CLAIMED, worker))
+
+    def requeue(self, worker=None):
+        """ Put IDs claimed by a worker that died (or by any worker, if none is given) back in the queue. """
+        query = 'UPDATE ids SET status = ?, worker = NULL WHERE status = ?'
+        params = (PENDING, CLAIMED)
+        if worker:
+            query, params = query + ' AND worker = ?', params + (worker,)
+        with self._transaction():
+            return self.conn.execute(query, params).rowcount
+
+    def counts(self):
+        return dict(self.conn.execute('SELECT status, COUNT(*) FROM ids GROUP BY status').fetchall())
+
+    def unfinished(self):
+        """ The IDs not done yet, pending or claimed, in input order. """
+        return [row[0] for row in self.conn.execute('SELECT id FROM ids WHERE status != ? ORDER BY position', (DONE,))]
+
+    def _transaction(self):
+        return _Transaction(self.conn)
+
+    def close(self):
+        self.conn.close()
+
+
+class _Transaction:
+    """ BEGIN IMMEDIATE ... COMMIT, so that concurrent claims from other processes wait their turn. """
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute('BEGIN IMMEDIATE')
+
+    def __exit__(self, exc_type, *exc):
+        self.conn.execute('ROLLBACK' if exc_type else 'COMMIT')
+
+
+def normalise_id(identifier):
+    """ The ID as IMDb writes it, zero-padded to at least seven digits, so that the queue and the shards agree. """
+    return f'{int(identifier):07d}'
+
+
+def claimed_ids(queue, worker, batch_size=BATCH_SIZE):
+    """ Yield IDs from the queue, claiming another batch only once the previous one has been handed out. """
+    while True:
+        batch = queue.claim(worker, batch_size)
+        if not batch:
+            return
+        yield from batch
+
+
+def shard_path(output_dir, worker):
+    return os.path.join(output_dir, f'shard-{worker}.csv')
+
+
+def run_worker(queue_path, output_dir, worker, fields, limits, concurrency=None, imdb_url=None):
+    """ Claim and scrape batches until the queue is empty, appending to this worker's own shard of output. """
+    quiet_cinemagoer()
+    data_source = IMDbData()
+    data_source.set_client_pool(ClientPool(**({'imdbURL_base': imdb_url} if imdb_url else {})))
+    data_source.set_fetch_policy(FetchPolicy(breaker=CircuitBreaker()))
+    scraper = Scraper(CsvHandler(ID_PATTERN), data_source, concurrency)
+    scraper.set_ordering(False)
+    scraper.set_ui(ConsoleProgress())
+
+    queue = WorkQueue(queue_path)
+    try:
+        shard_fields = fields if SHARD_KEY in fields else fields + [SHARD_KEY]
+        scraper.run(claimed_ids(queue, worker), shard_fields, limits, shard_path(output_dir, worker), resume=True)
+        queue.complete(worker, scraper.stats['failed'])
+    finally:
+        queue.close()
+
+
+def run_sharded(ids, fields, limits, output_path, processes=None, rounds=ROUNDS, **worker_options):
+    """ Scrape ids with a pool of worker processes sharing one queue, then merge their shards into output_path.
+
+    IDs that couldn't be fetched go back in the queue, so the workers are started over until none are left, for at
+    most rounds rounds. Returns the IDs still not done, which the merged output leaves out. """
+    processes = processes or os.cpu_count()
+    queue_path = output_path + '.queue.sqlite'
+    output_dir = output_path + '.shards'
+    os.makedirs(output_dir, exist_ok=True)
+
+    queue = WorkQueue(queue_path)
+    queue.enqueue(ids)
+
+    for _ in range(rounds):
+        queue.requeue()  # anything still claimed belongs to a worker that died, this run or an interrupted one
+        if not queue.counts().get(PENDING):
+            break
+        workers = [Process(target=run_worker, args=(queue_path, output_dir, f'p{n}', fields, limits),
+                           kwargs=worker_options) for n in range(processes)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+    merge_shards(queue, output_dir, fields, output_path)
+    unfinished = queue.unfinished()
+    queue.close()
+    return unfinished
+
+
+def shard_rows(path, fields):
+    """ Yield (id, row) for every complete row of a shard, keeping only the requested fields. """
+    with open(path, newline='') as shard:
+        for row in csv.DictReader(shard):
+            # a worker killed mid-write can leave a truncated last row behind
+            if None in row.values():
+                continue
+            yield normalise_id(row[SHARD_KEY][2:]), {field: row[field] for field in fields}
+
+
+def merge_shards(queue, output_dir, fields, output_path, file_handler=None):
+    """ Combine every shard in output_dir into one output, in input order and without duplicates.
+
+    The rows are staged in the queue's own database, so SQLite does the sorting and memory use stays flat.
+    """
+    file_handler = file_handler or CsvHandler(ID_PATTERN)
+    conn = queue.conn
+    conn.execute('DROP TABLE IF EXISTS results')
+    conn.execute('CREATE TABLE results (id TEXT PRIMARY KEY, row TEXT)')
+
+    for name in sorted(os.listdir(output_dir)):
+        # include the '.part' output of a worker that died, the merge drops any duplicates
+        if name.startswith('shard-') and name.endswith(('.csv', '.csv.part')):
+            rows = shard_rows(os.path.join(output_dir, name), fields)
+            with queue._transaction():
+                conn.executemany('INSERT OR IGNORE INTO results VALUES (?, ?)',
+                                 ((identifier, json.dumps(row)) for identifier, row in rows))
+
+    merged = conn.execute('SELECT row FROM results JOIN ids USING (id) ORDER BY ids.position')
+    with file_handler.open_writer(fields, output_path) as writer:
+        for (row,) in merged:
+            writer.write_row(json.loads(row))
+    conn.execute('DROP TABLE results')
+
+
+def report_unfinished(unfinished, shown=20):
+    """ Say which IDs the merged output is missing, and exit non-zero if there are any. """
+    if unfinished:
+        more = f' and {len(unfinished) - shown} more' if len(unfinished) > shown else ''
+        sys.exit(f"{len(unfinished)} IDs are still not done, and are missing from the output: "
+                 f"{', '.join(unfinished[:shown])}{more}. Run again to retry them.")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run = commands.add_parser('run', help='scrape with a pool of local worker processes, then merge')
+    run.add_argument('inputs', nargs='*', default=['-'])
+    run.add_argument('-o', '--output', required=True)
+    run.add_argument('--processes', type=int, help='worker processes (default: one per core)')
+
+    enqueue = commands.add_parser('enqueue', help='add IDs to a shared queue')
+    enqueue.add_argument('inputs', nargs='*', default=['-'])
+
+    worker = commands.add_parser('worker', help='work through a shared queue until it is empty')
+    worker.add_argument('--worker', default=f'{socket.gethostname()}-{os.getpid()}', help='unique worker name')
+
+    merge = commands.add_parser('merge', help='merge the shards of a shared queue into one output')
+    merge.add_argument('-o', '--output', required=True)
+
+    requeue = commands.add_parser('requeue', help='return IDs claimed by dead workers to the queue')
+    requeue.add_argument('--worker', help='only requeue this worker\'s IDs')
+
+    for command in (enqueue, worker, merge, requeue):
+        command.add_argument('--queue', required=True, help='shared queue file')
+    for command in (worker, merge):
+        command.add_argument('--output-dir', required=True, help='shared directory for the shards')
+    for command in (run, worker, merge):
+        command.add_argument('-f', '--fields', required=True, help='comma-separated fields to extract')
+    for command in (run, worker):
+        command.add_argument('-l', '--limit', action='append', default=[], metavar='FIELD=N')
+        command.add_argument('--concurrency', type=int)
+        command.add_argument('--imdb-url', help='fetch from a mirror or stand-in instead of www.imdb.com')
+
+    args = parser.parse_args(argv)
+    fields = [field.strip() for field in getattr(args, 'fields', '').split(',') if field.strip()]
+    limits = parse_limits(getattr(args, 'limit', []))
+    file_handler = CsvHandler(ID_PATTERN)
+
+    if args.command == 'run':
+        unfinished = run_sharded(stream_ids(args.inputs, file_handler), fields, limits, args.output, args.processes,
+                                 concurrency=args.concurrency, imdb_url=args.imdb_url)
+        report_unfinished(unfinished)
+    elif args.command == 'worker':
+        os.makedirs(args.output_dir, exist_ok=True)
+        run_worker(args.queue, args.output_dir, args.worker, fields, limits, args.concurrency, args.imdb_url)
+    else:
+        queue = WorkQueue(args.queue)
+        if args.command == 'enqueue':
+            print(f'{queue.enqueue(stream_ids(args.inputs, file_handler))} IDs queued', file=sys.stderr)
+        elif args.command == 'requeue':
+            print(f'{queue.requeue(args.worker)} IDs requeued', file=sys.stderr)
+        else:
+            merge_shards(queue, args.output_dir, fields, args.output)
+            unfinished = queue.unfinished()
+            queue.close()
+            report_unfinished(unfinished)
+            return
+        queue.close()
+
+
+if __name__ == '__main__':
+    main()
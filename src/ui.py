@@ -1,7 +1,10 @@
 import os
 import platform
+import queue
 import subprocess
+import time
 import tkinter as tk
+from collections import deque
 from pathlib import PurePath
 from tkinter import filedialog as fd, ttk, scrolledtext, END, messagebox
 
@@ -11,6 +14,12 @@ TITLE = 'ScraperApp'
 CBS_PER_ROW = 3
 SCALES_PER_ROW = 4
 
+# Progress reporting
+FRAME_MS = 100  # how often queued progress events are drawn
+MAX_EVENTS_PER_FRAME = 5000  # so a backlog of events can never freeze the window
+LOG_LINES = 500  # the progress log only keeps this many of the most recent lines
+RATE_WINDOW = 10  # seconds of history used to estimate titles/s
+
 
 class ScraperUI(tk.Tk):
     def __init__(self, scraper):
@@ -20,6 +29,11 @@ class ScraperUI(tk.Tk):
         self.scraper = scraper
         self.save_path = None
 
+        # Progress is reported from the scraper's thread, but tkinter may only be touched from this one: the scraper
+        # queues its events and the window drains them in batches, FRAME_MS apart.
+        self.events = queue.SimpleQueue()
+        self.tracker = ProgressTracker()
+
         # Configure the main window
         tk.Tk.wm_title(self, TITLE)
         self.minsize(350, 525)
@@ -40,6 +54,7 @@ class ScraperUI(tk.Tk):
             frame.grid(row=0, column=0, sticky='nsew')
 
         self.show_frame(InputPage)
+        self.after(FRAME_MS, self.poll_progress)
 
     def show_frame(self, controller):
         """ Switches a new page of the GUI into view. """
@@ -56,7 +71,9 @@ class ScraperUI(tk.Tk):
 
     def ask_to_save(self):
         """ Prompt the user to choose a save location for the results. """
-        save_path = fd.asksaveasfilename(defaultextension='.csv')
+        filetypes = [('CSV files', '*.csv'), ('JSON Lines', '*.jsonl'), ('SQLite databases', '*.sqlite'),
+                     ('Compressed CSV', '*.csv.gz'), ('Compressed JSON Lines', '*.jsonl.gz')]
+        save_path = fd.asksaveasfilename(defaultextension='.csv', filetypes=filetypes)
         if save_path:
             self.show_frame(ProgressPage)
             self.save_path = save_path
@@ -64,23 +81,43 @@ class ScraperUI(tk.Tk):
 
     def set_progress_bar_max(self, count):
         """ Set the maximum value of the progress bar using the count of IDs that are being fetched. """
+        self.clear_progress()
         self.frames[ProgressPage].progress_bar['maximum'] = count
+        self.tracker = ProgressTracker(count)
+
+    def update_progress(self, title, valid=True, error=None):
+        """ Communicate the progress being made to the User. Safe to call from any thread. """
+        self.events.put((title, valid, error))
+
+    def clear_progress(self):
+        """ Discard any progress events still waiting to be drawn. """
+        while not self.events.empty():
+            self.events.get_nowait()
+
+    def poll_progress(self):
+        """ Draw every progress event queued since the last frame at once, then schedule the next frame. """
+        lines = []
+        while len(lines) < MAX_EVENTS_PER_FRAME and not self.events.empty():
+            title, valid, error = self.events.get_nowait()
+            if valid:
+                lines.append(f'Retrieved... {title}')
+            elif error:
+                lines.append(f'Could not fetch {title} ({error.kind}), resume the job to retry it')
+            else:
+                lines.append(f'Invalid IMDb ID: {title}')
 
-    def update_progress(self, title, valid=True):
-        """ Communicate the progress being made to the User."""
-        progress_bar = self.frames[ProgressPage].progress_bar
-        progress_bar['value'] += 1
-
-        if valid:
-            response = f'Retrieved... {title}\n'
-        else:
-            response = f'Invalid IMDb ID: {title}\n'
-
-        if progress_bar['value'] == progress_bar['maximum']:
-            response += '\n...DONE!'
-            self.frames[ProgressPage].open_button.pack(side='right')
+        if lines:
+            page = self.frames[ProgressPage]
+            self.tracker.advance(len(lines))
+            page.progress_bar['value'] = self.tracker.done
+            if self.tracker.finished():
+                lines.append('\n...DONE!')
+                page.open_button.pack(side='right')
+            page.log(lines)
 
-        self.frames[ProgressPage].txt.insert(END, response)
+        if self.tracker.total:
+            self.frames[ProgressPage].stats_label.config(text=self.tracker.summary())
+        self.after(FRAME_MS, self.poll_progress)
 
 
 class InputPage(tk.Frame):
@@ -160,6 +197,9 @@ class InputPage(tk.Frame):
                   command=lambda: self.validate_and_continue(text_box, cb_vals, scale_vals)
                   ).pack(side='right')
 
+        self.resume_var = tk.IntVar()
+        tk.Checkbutton(buttons_frame, text='Resume previous job', variable=self.resume_var).pack(side='right')
+
     def select_file(self):
         """ Prompt user to select a CSV file to open. """
         filetypes = [('CSV files', '*.csv')]
@@ -181,12 +221,14 @@ class InputPage(tk.Frame):
         # get current settings of the scales
         scales = {scale: val.get() for scale, val in scale_vals.items()}
 
+        resume = bool(self.resume_var.get())
+
         if self.radio_var.get():
             data = text_box.get('1.0', 'end-1c')
-            self.controller.scraper.process(data, selected_fields, scales)
+            self.controller.scraper.process(data, selected_fields, scales, resume=resume)
         else:
             if self.open_path:
-                self.controller.scraper.process(data, selected_fields, scales, self.open_path)
+                self.controller.scraper.process(data, selected_fields, scales, self.open_path, resume)
             else:
                 self.controller.alert_user('No CSV specified.', 'No CSV specified.')
 
@@ -197,6 +239,8 @@ class InputPage(tk.Frame):
         self.open_path = None
         textbox.delete(1.0, END)
 
+        self.resume_var.set(value=0)
+
         # Tick all the checkboxes
         for cb in cb_vals:
             cb[1].set(value=1)
@@ -219,6 +263,10 @@ class ProgressPage(tk.Frame):
         self.progress_bar = ttk.Progressbar(lf_progress, orient='horizontal', mode='determinate')
         self.progress_bar.pack(padx=15, pady=15, fill='x', expand=False, side='top')
 
+        # Live throughput and time remaining
+        self.stats_label = tk.Label(lf_progress, anchor='w')
+        self.stats_label.pack(padx=15, fill='x', expand=False, side='top')
+
         # Textbox that visibly logs the progress
         self.txt = scrolledtext.ScrolledText(lf_progress, width=50, height=6, wrap='word', borderwidth='2',
                                              relief='groove')
@@ -231,10 +279,21 @@ class ProgressPage(tk.Frame):
         tk.Button(buttons_frame, text='Back', command=self.back).pack(side='left')
         self.open_button = tk.Button(buttons_frame, text='Open Result...', command=self.open)
 
+    def log(self, lines):
+        """Append lines to the progress log, dropping the oldest so that it never holds more than LOG_LINES."""
+        self.txt.insert(END, '\n'.join(lines) + '\n')
+        excess = int(self.txt.index('end-1c').split('.')[0]) - 1 - LOG_LINES
+        if excess > 0:
+            self.txt.delete('1.0', f'{excess + 1}.0')
+        self.txt.see(END)
+
     def back(self):
         """Take user back to the main page, reset the progress so far, and interrupt the scraper if it is running."""
         self.controller.scraper.cancel()
+        self.controller.clear_progress()
+        self.controller.tracker = ProgressTracker()
         self.progress_bar['value'] = 0
+        self.stats_label.config(text='')
         self.txt.delete(1.0, END)
         self.controller.show_frame(InputPage)
         self.open_button.pack_forget()
@@ -251,6 +310,53 @@ class ProgressPage(tk.Frame):
             subprocess.call(('xdg-open', path))
 
 
+class ProgressTracker:
+    """ Counts finished titles against the job's total and estimates the current rate and time remaining. """
+
+    def __init__(self, total=0, window=RATE_WINDOW, clock=time.monotonic):
+        self.total = total
+        self.done = 0
+        self.window = window
+        self.clock = clock
+        self.samples = deque([(clock(), 0)])
+
+    def advance(self, count):
+        self.done += count
+        now = self.clock()
+        self.samples.append((now, self.done))
+        # keep the newest sample older than the window, so the rate always spans the whole window
+        while len(self.samples) > 2 and self.samples[1][0] <= now - self.window:
+            self.samples.popleft()
+
+    def finished(self):
+        return bool(self.total) and self.done >= self.total
+
+    def rate(self):
+        """ Titles per second over (roughly) the last window seconds. """
+        start, start_done = self.samples[0]
+        end = self.samples[-1][0] if self.finished() else self.clock()
+        end_done = self.done
+        return (end_done - start_done) / (end - start) if end > start else 0.0
+
+    def eta(self):
+        """ Estimated seconds until the job finishes, or None if it can't be estimated yet. """
+        rate = self.rate()
+        return (self.total - self.done) / rate if rate and self.total else None
+
+    def summary(self):
+        text = f'{self.done}/{self.total} processed, {self.rate():.1f} titles/s'
+        if self.finished():
+            return text
+        eta = self.eta()
+        return text + (f', about {format_duration(eta)} left' if eta is not None else '')
+
+
+def format_duration(seconds):
+    minutes, seconds = divmod(round(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f'{hours}h {minutes:02d}m' if hours else f'{minutes}m {seconds:02d}s'
+
+
 # TEMPLATE FOR FURTHER PAGES
 
 class PageTwo(tk.Frame):
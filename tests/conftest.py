@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the application modules import each other as top-level modules (see src/scraper.py), so make them importable as such
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'src'))
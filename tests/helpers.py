@@ -0,0 +1,31 @@
+""" What several test modules share: a clock to drive by hand, and a FakeIMDbServer standing in for the real site. """
+from imdb import Cinemagoer
+
+from benchmarks.fake_imdb import FakeIMDbServer
+from cli import quiet_cinemagoer
+from movie_data import IMDbData
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def serve_imdb(test, **kwargs):
+    """ Start a FakeIMDbServer (see there for kwargs) for the length of test, and quieten Cinemagoer's error logging
+    about the invalid IDs it serves. """
+    quiet_cinemagoer()
+    server = FakeIMDbServer(**kwargs).__enter__()
+    test.addCleanup(server.__exit__)
+    return server
+
+
+def use_imdb_client(test, server):
+    """ Point IMDbData's shared client at server for the length of test. """
+    real_imdb = IMDbData.imdb
+    IMDbData.imdb = Cinemagoer(imdbURL_base=server.url)
+    test.addCleanup(setattr, IMDbData, 'imdb', real_imdb)
+    return IMDbData.imdb
@@ -0,0 +1,80 @@
+import csv
+import os
+import tempfile
+from unittest import TestCase
+
+from benchmarks.fake_imdb import FakeIMDbServer
+from archive import PageArchive, archive_client, page_key
+from clients import ClientPool
+from cli import quiet_cinemagoer
+from reprocess import reprocess
+
+
+class TestPageArchive(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'pages.sqlite')
+        self.archive = PageArchive(self.path)
+
+    def tearDown(self):
+        self.archive.close()
+        self.tmp.cleanup()
+
+    def test_page_key(self):
+        self.assertEqual(('0133093', 'reference'), page_key('https://www.imdb.com/title/tt0133093/reference'))
+        self.assertEqual(('0133093', ''), page_key('https://www.imdb.com/title/tt0133093/'))
+        self.assertIsNone(page_key('https://www.imdb.com/name/nm0000206/'))
+
+    def test_put_and_get(self):
+        page = '<html>' + 'The Matrix ' * 1000 + '</html>'
+        self.archive.put('0133093', 'reference', page)
+        self.archive.put('0133093', 'plotsummary', 'plot')
+        self.archive.put('0000001', 'reference', 'short')
+
+        self.assertEqual(page, self.archive.get('0133093', 'reference'))
+        self.assertIsNone(self.archive.get('0133093', 'fullcredits'))
+        self.assertEqual(2, len(self.archive))
+        self.assertListEqual(['0000001', '0133093'], self.archive.ids())
+        self.assertLess(os.path.getsize(self.path), len(page))  # stored compressed
+
+    def test_archive_while_fetching(self):
+        quiet_cinemagoer()
+        with FakeIMDbServer(invalid={'0000404'}) as server:
+            pool = ClientPool(archive=self.archive, imdbURL_base=server.url)
+            with pool.client() as imdb:
+                imdb.get_movie('0133093', info=('main', 'plot'))
+                with self.assertRaises(Exception):
+                    imdb.get_movie('0000404', info=('main',))
+            pool.close()
+
+        self.assertListEqual(['0133093'], self.archive.ids())
+        # the archived pages are enough to parse the title again offline
+        movie = archive_client(self.archive).get_movie('0133093', info=('main', 'plot'))
+        self.assertEqual('The Matrix', movie['title'])
+
+
+class TestReprocess(TestCase):
+    def test_reprocess(self):
+        quiet_cinemagoer()
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'pages.sqlite')
+            archive = PageArchive(path)
+            with FakeIMDbServer() as server:
+                pool = ClientPool(archive=archive, imdbURL_base=server.url)
+                with pool.client() as imdb:
+                    for identifier in ('0133093', '0000001'):
+                        imdb.get_movie(identifier, info=('main',))
+                pool.close()
+            archive.close()
+
+            # a different selection and limit from anything fetched, and a title that was never archived
+            output = os.path.join(tmp, 'movies.csv')
+            stats = reprocess(path, ['IMDb ID', 'Title', 'Cast'], {'Cast': 2}, output,
+                              ids=['0133093', '0000001', '0000002'], processes=2)
+            with open(output, newline='') as movies:
+                rows = list(csv.DictReader(movies))
+
+        self.assertEqual({'written': 2, 'missing': 1}, {key: stats[key] for key in ('written', 'missing')})
+        self.assertListEqual(['tt0133093', 'tt0000001'], [row['IMDb ID'] for row in rows])
+        self.assertEqual('The Matrix', rows[0]['Title'])
+        self.assertEqual('Keanu Reeves, Laurence Fishburne', rows[0]['Cast'])
@@ -0,0 +1,137 @@
+import os
+import tempfile
+import time
+from threading import Event, Thread
+from unittest import TestCase
+
+from cache import BloomFilter, InFlight, NegativeCache, ResponseCache
+
+
+class TestResponseCache(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = ResponseCache(os.path.join(self.tmp.name, 'cache.sqlite'), max_entries=10)
+
+    def tearDown(self):
+        self.cache.close()
+        self.tmp.cleanup()
+
+    def test_get_missing(self):
+        self.assertIsNone(self.cache.get('0133093'))
+        self.assertEqual(1, self.cache.misses)
+
+    def test_put_and_get(self):
+        self.cache.put('0133093', {'title': 'The Matrix'})
+        self.assertDictEqual({'title': 'The Matrix'}, self.cache.get('0133093'))
+        self.assertEqual(1, self.cache.hits)
+
+    def test_expired_entry(self):
+        self.cache.put('0133093', {'title': 'The Matrix'}, ttl=0.01)
+        time.sleep(0.02)
+        self.assertIsNone(self.cache.get('0133093'))
+        self.assertEqual(0, len(self.cache))
+
+    def test_persists_between_instances(self):
+        self.cache.put('0133093', {'title': 'The Matrix'})
+        reopened = ResponseCache(self.cache.path)
+        self.assertDictEqual({'title': 'The Matrix'}, reopened.get('0133093'))
+        reopened.close()
+
+    def test_evicts_least_recently_used(self):
+        for i in range(10):
+            self.cache.put(str(i), i)
+            time.sleep(0.001)
+        self.cache.get('0')  # make '0' the most recently used
+        self.cache.put('10', 10)
+
+        self.assertLessEqual(len(self.cache), 10)
+        self.assertEqual(0, self.cache.get('0'))
+        self.assertIsNone(self.cache.get('1'))
+        self.assertGreater(self.cache.stats()['evictions'], 0)
+
+
+class TestNegativeCache(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'invalid.sqlite')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_add_and_contains(self):
+        cache = NegativeCache(self.path)
+        cache.add('0000404')
+        self.assertIn('0000404', cache)
+        self.assertNotIn('0133093', cache)
+        self.assertEqual((1, 1), (cache.hits, cache.misses))
+        cache.close()
+
+    def test_expired_entry(self):
+        cache = NegativeCache(self.path)
+        cache.add('0000404', ttl=0.01)
+        time.sleep(0.02)
+        self.assertNotIn('0000404', cache)
+        cache.close()
+
+    def test_bloom_filters_misses(self):
+        cache = NegativeCache(self.path)
+        cache.add('0000404')
+        cache.close()
+
+        cache = NegativeCache(self.path, bloom=True)
+        self.assertIn('0000404', cache)
+        self.assertNotIn('0133093', cache)
+        self.assertEqual(1, cache.filtered)
+        cache.close()
+
+    def test_bloom_grows(self):
+        cache = NegativeCache(self.path, bloom=True)
+        cache.bloom = BloomFilter(10, cache.error_rate)
+        for i in range(25):
+            cache.add(str(i))
+        self.assertGreaterEqual(cache.bloom.capacity, 25)
+        self.assertTrue(all(str(i) in cache for i in range(25)))
+        cache.close()
+
+
+class TestBloomFilter(TestCase):
+    def test_false_positive_rate(self):
+        bloom = BloomFilter(10_000, error_rate=0.01)
+        for i in range(10_000):
+            bloom.add(f'{i:07d}')
+        self.assertTrue(all(f'{i:07d}' in bloom for i in range(10_000)))
+        false_positives = sum(f'{i:07d}' in bloom for i in range(10_000, 20_000))
+        self.assertLess(false_positives, 200)
+
+
+class TestInFlight(TestCase):
+    def test_coalesces_concurrent_calls(self):
+        inflight = InFlight()
+        started, release = Event(), Event()
+        results = []
+
+        def fetch():
+            started.set()
+            release.wait()
+            return 'The Matrix'
+
+        leader = Thread(target=lambda: results.append(inflight.call('0133093', fetch)))
+        leader.start()
+        started.wait()
+        follower = Thread(target=lambda: results.append(inflight.call('0133093', lambda: 'refetched')))
+        follower.start()
+        while not inflight.coalesced:
+            time.sleep(0.001)
+        release.set()
+        leader.join()
+        follower.join()
+
+        self.assertListEqual(['The Matrix', 'The Matrix'], results)
+        self.assertDictEqual({'fetched': 1, 'coalesced': 1}, inflight.stats())
+        self.assertEqual('refetched', inflight.call('0133093', lambda: 'refetched'))
+
+    def test_shares_errors(self):
+        inflight = InFlight()
+        with self.assertRaises(KeyError):
+            inflight.call('0000404', lambda: {}['title'])
+        self.assertEqual('ok', inflight.call('0000404', lambda: 'ok'))
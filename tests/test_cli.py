@@ -0,0 +1,35 @@
+import argparse
+import io
+import os
+import tempfile
+from unittest import TestCase
+
+from cli import ConsoleProgress, parse_limits, stream_ids
+from file_handler import CsvHandler
+
+
+class TestCli(TestCase):
+    def test_parse_limits(self):
+        self.assertDictEqual({'Cast': 5, 'Genres': 2}, parse_limits(['Cast=5', 'Genres=2']))
+        with self.assertRaises(argparse.ArgumentTypeError):
+            parse_limits(['Cast'])
+
+    def test_stream_ids(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'ids.csv')
+            with open(path, 'w') as ids:
+                ids.write('tt0133093,tt0234215\nhttps://www.imdb.com/title/tt0133093/\ntt0242653\n')
+
+            actual = list(stream_ids([path], CsvHandler(r'tt(\d+)')))
+        self.assertListEqual(['0133093', '0234215', '0242653'], actual)
+
+    def test_console_progress(self):
+        stream = io.StringIO()
+        progress = ConsoleProgress(interval=3600, stream=stream)
+        progress.set_progress_bar_max(3)
+        progress.update_progress('The Matrix')
+        progress.update_progress('999', valid=False)
+        self.assertEqual('', stream.getvalue())
+
+        progress.report()
+        self.assertIn('2/3 processed (1 invalid)', stream.getvalue())
@@ -0,0 +1,43 @@
+from unittest import TestCase
+
+from imdb import IMDbError
+
+from clients import ClientPool, KeepAliveURLopener
+from helpers import serve_imdb
+
+
+class TestClientPool(TestCase):
+    def setUp(self):
+        self.server = serve_imdb(self, invalid={'0000404'})
+        self.pool = ClientPool(size=2, imdbURL_base=self.server.url)
+
+    def tearDown(self):
+        self.pool.close()
+
+    def test_connections_are_reused(self):
+        for i in range(5):
+            with self.pool.client() as imdb:
+                self.assertEqual(f'Movie {i:07d}', imdb.get_movie(f'{i:07d}', info=('main',)).get('title'))
+
+        stats = self.pool.stats()
+        self.assertEqual(1, stats['clients'])
+        self.assertEqual(1, stats['connections_opened'])
+        self.assertEqual(4, stats['reused'])
+
+    def test_invalid_id(self):
+        with self.pool.client() as imdb:
+            with self.assertRaises(IMDbError):
+                imdb.get_movie('0000404', info=('main',))
+            # the connection is still usable afterwards
+            self.assertEqual('Movie 0000001', imdb.get_movie('0000001', info=('main',)).get('title'))
+
+    def test_each_worker_gets_its_own_client(self):
+        with self.pool.client() as first, self.pool.client() as second:
+            self.assertIsNot(first, second)
+        self.assertEqual(2, self.pool.stats()['clients'])
+
+    def test_client_keeps_cinemagoer_settings(self):
+        with self.pool.client() as imdb:
+            self.assertIsInstance(imdb.urlOpener, KeepAliveURLopener)
+            self.assertIsNotNone(imdb.urlOpener.get_header('User-Agent'))
+            self.assertEqual(0, imdb.urlOpener.requests)
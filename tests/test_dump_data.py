@@ -0,0 +1,93 @@
+import csv
+import gzip
+import io
+import os
+import tempfile
+from unittest import TestCase
+
+from cli import ConsoleProgress
+from dump_data import DumpData, DumpIndex, build_index
+from file_handler import CsvHandler
+from jobs import JobSpec
+from movie_data import IMDbData
+from scraper import ID_PATTERN, Scraper
+
+BASICS = '''tconst\ttitleType\tprimaryTitle\toriginalTitle\tisAdult\tstartYear\tendYear\truntimeMinutes\tgenres
+tt0000001\tshort\tCarmencita\tCarmencita\t0\t1894\t\\N\t1\tDocumentary,Short
+tt0133093\tmovie\tThe Matrix\tThe Matrix\t0\t1999\t\\N\t136\tAction,Sci-Fi
+tt0234215\tmovie\tThe Matrix Reloaded\tThe Matrix Reloaded\t0\t2003\t\\N\t138\tAction,Sci-Fi
+tt9999999\tmovie\tUntitled\tUntitled\t0\t\\N\t\\N\t\\N\t\\N
+tt0120338\tmovie\tTitanic\tTitanic\t0\t1997\t\\N\t194\tDrama,Romance
+'''
+
+RATINGS = '''tconst\taverageRating\tnumVotes
+tt0000001\t5.7\t2000
+tt0133093\t8.7\t2000000
+tt0120338\t7.9\t1200000
+'''
+
+
+class TestDumpData(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        basics, ratings = os.path.join(self.tmp.name, 'basics.tsv.gz'), os.path.join(self.tmp.name, 'ratings.tsv')
+        with gzip.open(basics, 'wt', encoding='utf-8') as dump:
+            dump.write(BASICS)
+        with open(ratings, 'w', encoding='utf-8') as dump:
+            dump.write(RATINGS)
+
+        self.index_path = os.path.join(self.tmp.name, 'imdb.idx')
+        self.count = build_index(basics, ratings, self.index_path)
+        self.data = DumpData(self.index_path)
+
+    def tearDown(self):
+        self.data.index.close()
+        self.tmp.cleanup()
+
+    def test_build_index(self):
+        self.assertEqual(5, self.count)
+        self.assertListEqual(['basics.tsv.gz', 'imdb.idx', 'ratings.tsv'], sorted(os.listdir(self.tmp.name)))
+
+    def test_lookup(self):
+        index = self.data.index
+        self.assertEqual(5, len(index))
+        record = index.lookup('0133093')
+        self.assertEqual(('0133093', 'The Matrix', 1999, ['Action', 'Sci-Fi'], '136', 8.7), tuple(record))
+        self.assertIsNone(index.lookup('0133094'))
+        self.assertIsNone(index.lookup('0000000'))
+        self.assertIsNone(index.lookup('99999999'))
+
+    def test_same_fields_as_imdb_data(self):
+        self.assertListEqual(list(IMDbData().get_field_names()), list(self.data.get_field_names()))
+        self.assertDictEqual(IMDbData.get_field_configs(), self.data.get_field_configs())
+
+    def test_get_movie_data(self):
+        self.data.set_chosen_fields(['Title', 'Year', 'Genres', 'Runtime', 'IMDb rating', 'Director', 'URL'])
+        self.data.set_field_limits({'Genres': 1})
+        expected = {'Title': 'The Matrix', 'Year': 1999, 'Genres': 'Action', 'Runtime': '136', 'IMDb rating': 8.7,
+                    'Director': 'n/a', 'URL': 'http://www.imdb.com/title/tt0133093'}
+        self.assertDictEqual(expected, dict(self.data.get_movie_data('0133093')))
+        self.data.set_field_limits({'Genres': 3})
+
+        self.data.set_chosen_fields(['Year', 'IMDb rating'])
+        self.assertDictEqual({'Year': 'n/a', 'IMDb rating': 'n/a'}, dict(self.data.get_movie_data('9999999')))
+        self.assertIsNone(self.data.get_movie_data('0000002'))
+
+    def test_scrape_default_fields(self):
+        # every field, with every configurable one given its limit by the job's plan, as the CLI runs it
+        output = os.path.join(self.tmp.name, 'movies.csv')
+        scraper = Scraper(CsvHandler(ID_PATTERN), self.data, concurrency=2)
+        spec = JobSpec(self.data.get_field_names(), {'Cast': 2}, output,
+                       progress=ConsoleProgress(interval=3600, stream=io.StringIO()))
+        job, = scraper.run_jobs([(['0133093', '0120338'], spec)])
+        scraper.close()
+
+        self.assertIsNone(job.error)
+        with open(output, newline='') as movies:
+            rows = list(csv.DictReader(movies))
+        self.assertListEqual(['The Matrix', 'Titanic'], [row['Title'] for row in rows])
+        self.assertEqual(('n/a', 'Drama, Romance'), (rows[1]['Cast'], rows[1]['Genres']))
+
+    def test_not_an_index(self):
+        with self.assertRaises(ValueError):
+            DumpIndex(os.path.join(self.tmp.name, 'ratings.tsv'))
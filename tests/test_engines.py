@@ -0,0 +1,153 @@
+import time
+from threading import Event, Thread
+from unittest import TestCase
+
+from engines import FairPool, HeadOfLine, ReorderBuffer, ThreadEngine
+
+
+def slow_square(x):
+    time.sleep(0.01 * (x % 3))
+    return x * x
+
+
+class TestEngines(TestCase):
+    def test_thread_engine_map(self):
+        engine = ThreadEngine(4)
+        self.assertListEqual([x * x for x in range(20)], list(engine.map(slow_square, range(20))))
+        engine.shutdown()
+
+    def test_thread_engine_concurrency(self):
+        engine = ThreadEngine(100)
+        start = time.perf_counter()
+        list(engine.map(lambda x: time.sleep(0.1), range(100)))
+        engine.shutdown()
+        self.assertLess(time.perf_counter() - start, 1)
+
+    def test_map_is_lazy(self):
+        engine = ThreadEngine(2, window=4)
+        pulled = []
+
+        def ids():
+            for i in range(1000):
+                pulled.append(i)
+                yield i
+
+        results = engine.map(slow_square, ids())
+        self.assertEqual(0, next(results))
+        self.assertLessEqual(len(pulled), 5)
+        engine.shutdown()
+
+    def test_shutdown_is_prompt(self):
+        engine = ThreadEngine(2)
+        results = engine.map(lambda x: time.sleep(1), range(100))
+        Thread(target=lambda: (time.sleep(0.05), engine.shutdown())).start()
+        start = time.perf_counter()
+        self.assertListEqual([], list(results))
+        self.assertLess(time.perf_counter() - start, 0.5)
+
+    def test_map_unordered(self):
+        engine = ThreadEngine(4)
+        results = list(engine.map_unordered(lambda x: time.sleep(0.2 if x == 0 else 0) or x, range(10)))
+        engine.shutdown()
+        self.assertEqual((0, 0), results[-1])
+        self.assertSetEqual({(x, x) for x in range(10)}, set(results))
+
+    def test_map_unordered_max_ahead(self):
+        engine = ThreadEngine(4)
+        started = []
+        results = engine.map_unordered(lambda x: started.append(x) or time.sleep(0.1 if x == 0 else 0), range(100),
+                                       max_ahead=3)
+        self.assertNotEqual(0, next(results)[0])
+        self.assertLessEqual(max(started), 3)
+        engine.shutdown()
+
+    def test_results_are_not_held_back_by_input(self):
+        engine = ThreadEngine(4)
+        more = Event()
+
+        def ids():
+            yield from range(3)
+            more.wait()  # like a pipe that stays open with nothing more to read yet
+            yield 3
+
+        results = engine.map_unordered(lambda x: x, ids())
+        self.assertSetEqual({0, 1, 2}, {next(results)[0] for _ in range(3)})
+        more.set()
+        self.assertListEqual([(3, 3)], list(results))
+        engine.shutdown()
+
+
+class TestFairPool(TestCase):
+    def test_map(self):
+        pool = FairPool(4)
+        self.assertListEqual([x * x for x in range(20)], list(pool.engine().map(slow_square, range(20))))
+        pool.shutdown()
+
+    def test_jobs_take_turns(self):
+        pool = FairPool(1)
+        started, release = Event(), Event()
+        order = []
+
+        def fetch(item):
+            started.set()
+            release.wait()
+            order.append(item)
+
+        big, small = pool.engine(), pool.engine()
+        futures = [big._submit(fetch, 'big')]
+        started.wait()
+        futures += [big._submit(fetch, 'big') for _ in range(10)] + [small._submit(fetch, 'small') for _ in range(2)]
+        release.set()
+        for future in futures:
+            future.result()
+        pool.shutdown()
+        self.assertListEqual(['big', 'big', 'small', 'big', 'small'], order[:5])
+
+    def test_shutdown_engine_keeps_pool(self):
+        pool = FairPool(2)
+        cancelled = pool.engine()
+        cancelled.shutdown()
+        self.assertListEqual([1, 4, 9], list(pool.engine().map(lambda x: x * x, [1, 2, 3])))
+        pool.shutdown()
+
+
+class TestReorderBuffer(TestCase):
+    def test_push_releases_in_order(self):
+        buffer = ReorderBuffer()
+        self.assertListEqual([], buffer.push(1, 'b'))
+        self.assertListEqual([], buffer.push(2, 'c'))
+        self.assertEqual(2, len(buffer))
+        self.assertListEqual(['a', 'b', 'c'], buffer.push(0, 'a'))
+        self.assertEqual(3, buffer.peak_size)
+
+    def test_measures_blocking(self):
+        buffer = ReorderBuffer()
+        buffer.push(1, 'b')
+        time.sleep(0.05)
+        buffer.push(0, 'a')
+        self.assertGreaterEqual(buffer.blocked_seconds, 0.05)
+
+
+class TestHeadOfLine(TestCase):
+    def test_push_releases_at_once(self):
+        head = HeadOfLine()
+        self.assertListEqual(['b'], head.push(1, 'b'))
+        self.assertListEqual(['c'], head.push(2, 'c'))
+        self.assertEqual(2, len(head))
+        self.assertListEqual(['a'], head.push(0, 'a'))
+        self.assertEqual((0, 2, 3), (len(head), head.peak_size, head.next_position))
+
+    def test_measures_blocking_like_reorder_buffer(self):
+        head, buffer = HeadOfLine(), ReorderBuffer()
+        for position in (1, 3, 2, 0, 5, 4):
+            head.push(position, None)
+            buffer.push(position, None)
+            time.sleep(0.02)
+        self.assertAlmostEqual(buffer.blocked_seconds, head.blocked_seconds, delta=0.01)
+
+    def test_memory_stays_flat_behind_a_stall(self):
+        head = HeadOfLine()
+        for position in range(1, 100_001):
+            head.push(position, None)
+        # one stalled title, a hundred thousand finished after it: only the stalled one is kept
+        self.assertEqual((100_000, 1, 1), (len(head), len(head.unfinished), len(head.order)))
@@ -0,0 +1,245 @@
+import csv
+import gzip
+import importlib.util
+import io
+import json
+import os
+import sqlite3
+import tempfile
+from unittest import TestCase, skipUnless
+
+from file_handler import CsvHandler, IdSet, output_format, read_rows
+from movie_data import record_type
+
+
+class TestCsvHandler(TestCase):
+    def setUp(self):
+        self.handler = CsvHandler(r'tt(\d+)')
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'output.csv')
+        self.fields = ['Title', 'Year']
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def read_output(self):
+        with open(self.path, newline='') as csv_input:
+            return list(csv.DictReader(csv_input))
+
+    def test_save_file(self):
+        self.handler.save_file([{'Title': 'The Matrix', 'Year': '1999'}], self.fields, self.path)
+        self.assertListEqual([{'Title': 'The Matrix', 'Year': '1999'}], self.read_output())
+
+    def test_writer_is_finalised_on_close(self):
+        writer = self.handler.open_writer(self.fields, self.path).open()
+        writer.write_row({'Title': 'The Matrix', 'Year': '1999'})
+        self.assertFalse(os.path.exists(self.path))
+
+        writer.close()
+        self.assertFalse(os.path.exists(self.path + '.part'))
+        self.assertEqual(1, len(self.read_output()))
+
+    def test_writer_flushes_in_batches(self):
+        writer = self.handler.open_writer(self.fields, self.path).open()
+        writer.flush_every = 2
+        for year in range(3):
+            writer.write_row({'Title': 'The Matrix', 'Year': year})
+
+        with open(writer.part_path, newline='') as partial:
+            self.assertEqual(3, len(partial.readlines()))  # header plus the first batch of two
+        writer.close()
+        self.assertEqual(3, len(self.read_output()))
+
+    def test_writer_append(self):
+        self.handler.save_file([{'Title': 'The Matrix', 'Year': '1999'}], self.fields, self.path)
+        with self.handler.open_writer(self.fields, self.path, append=True) as writer:
+            writer.write_row({'Title': 'The Matrix Reloaded', 'Year': '2003'})
+        self.assertListEqual(['1999', '2003'], [row['Year'] for row in self.read_output()])
+
+
+class TestIdExtraction(TestCase):
+    def setUp(self):
+        self.handler = CsvHandler(r'tt(\d+)')
+
+    def test_open_file_keeps_input_order(self):
+        path = os.path.join(os.path.dirname(__file__), 'test.csv')
+        ids = self.handler.open_file(path)
+        self.assertListEqual(['3011960', '2463288', '1615147', '4440644'], ids[:4])
+        self.assertEqual(len(set(ids)), len(ids))
+
+    def test_extract_ids(self):
+        seen = IdSet()
+        self.assertListEqual(['0133093', '0234215'], self.handler.extract_ids('tt0133093 tt0234215,tt133093', seen))
+        self.assertListEqual(['0242653'], self.handler.extract_ids('tt0234215\ntt0242653', seen))
+
+    def test_iter_ids_streams(self):
+        reads = []
+
+        class Stream(io.BytesIO):
+            def read1(self, size=-1):
+                reads.append(size)
+                return super().read1(size)
+
+        stream = Stream(b'tt0133093\ntt0234215,tt0133093\ntt0242653\n' * 1000)
+        ids = self.handler.iter_ids(stream, chunk_size=8)
+        self.assertEqual('0133093', next(ids))
+        self.assertLess(len(reads), 10)  # the first ID arrives long before the input has all been read
+        # no ID is lost or mangled where it straddles two chunks
+        self.assertListEqual(['0234215', '0242653'], list(ids))
+
+    def test_iter_ids_streams_one_line(self):
+        reads = []
+
+        class Stream(io.BytesIO):
+            def read1(self, size=-1):
+                reads.append(size)
+                return super().read1(size)
+
+        stream = Stream(b','.join(b'tt%07d' % i for i in range(1, 10001)))
+        ids = self.handler.iter_ids(stream, chunk_size=64)
+        self.assertEqual('0000001', next(ids))
+        self.assertLess(len(reads), 3)
+        self.assertListEqual([f'{i:07d}' for i in range(2, 10001)], list(ids))
+
+    def test_iter_ids_streams_as_input_arrives(self):
+        read, write = os.pipe()
+        with open(read, 'rb') as stream, open(write, 'wb', buffering=0) as pipe:
+            pipe.write(b'tt0133093\n')
+            ids = self.handler.iter_ids(stream)
+            # the pipe is still open, and far short of a chunk, but the ID it holds is handed over at once
+            self.assertEqual('0133093', next(ids))
+            pipe.write(b'tt0234215\n')
+            self.assertEqual('0234215', next(ids))
+            pipe.close()
+            self.assertListEqual([], list(ids))
+
+    def test_iter_ids_empty_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'empty.csv')
+            open(path, 'w').close()
+            self.assertListEqual([], list(self.handler.iter_ids(path)))
+
+    def test_id_set(self):
+        ids = IdSet()
+        self.assertTrue(ids.add('0133093'))
+        self.assertFalse(ids.add(b'133093'))
+        self.assertTrue(ids.add('9' * 30))  # too big for the bitmap
+        self.assertFalse(ids.add('9' * 30))
+        self.assertIn('133093', ids)
+        self.assertNotIn('133094', ids)
+        self.assertEqual(2, len(ids))
+        self.assertLess(len(ids.bitmap), 40_000)
+
+        self.assertTrue(ids.add('4294967295'))  # junk, beyond any title: it mustn't grow the bitmap
+        self.assertIn('4294967295', ids)
+        self.assertLess(len(ids.bitmap), 40_000)
+
+
+class TestOutputFormats(TestCase):
+    def setUp(self):
+        self.handler = CsvHandler(r'tt(\d+)')
+        self.tmp = tempfile.TemporaryDirectory()
+        self.fields = ['Title', 'Year']
+        self.rows = [{'Title': 'The Matrix', 'Year': '1999'}, {'Title': 'Amélie', 'Year': '2001'}]
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def path(self, name):
+        return os.path.join(self.tmp.name, name)
+
+    def test_output_format(self):
+        self.assertEqual('csv', output_format('movies.csv'))
+        self.assertEqual('csv', output_format('movies.csv.gz'))
+        self.assertEqual('jsonl', output_format('movies.JSONL.zst'))
+        self.assertEqual('sqlite', output_format('movies.db'))
+        self.assertEqual('csv', output_format('movies'))
+
+    def test_json_lines(self):
+        path = self.path('movies.jsonl')
+        self.handler.save_file(self.rows, self.fields, path)
+        with open(path, encoding='utf-8') as output:
+            self.assertListEqual(self.rows, [json.loads(line) for line in output])
+
+    def test_gzip_append(self):
+        path = self.path('movies.csv.gz')
+        self.handler.save_file(self.rows[:1], self.fields, path)
+        with self.handler.open_writer(self.fields, path, append=True) as writer:
+            writer.write_row(self.rows[1])
+
+        with gzip.open(path, 'rt', encoding='utf-8', newline='') as output:
+            self.assertListEqual(self.rows, list(csv.DictReader(output)))
+
+    @skipUnless(importlib.util.find_spec('zstandard'), 'zstandard is not installed')
+    def test_zstd(self):
+        import zstandard
+        path = self.path('movies.jsonl.zst')
+        self.handler.save_file(self.rows, self.fields, path)
+        with zstandard.open(path, 'rt', encoding='utf-8') as output:
+            self.assertListEqual(self.rows, [json.loads(line) for line in output])
+
+    def test_sqlite(self):
+        path = self.path('movies.sqlite')
+        with self.handler.open_writer(self.fields, path) as writer:
+            writer.flush_every = 1
+            writer.write_row(self.rows[0])
+            with sqlite3.connect(writer.part_path) as conn:
+                self.assertEqual(1, conn.execute('SELECT COUNT(*) FROM movies').fetchone()[0])
+        with self.handler.open_writer(self.fields, path, append=True) as writer:
+            writer.write_row(self.rows[1])
+
+        conn = sqlite3.connect(path)
+        self.assertListEqual([('The Matrix', '1999'), ('Amélie', '2001')],
+                             conn.execute('SELECT Title, Year FROM movies ORDER BY rowid').fetchall())
+        conn.close()
+        self.assertListEqual(['movies.sqlite'], os.listdir(self.tmp.name))
+
+    def test_resume_cuts_back_to_checkpoint(self):
+        checkpoints = []
+        for name in ('movies.csv.gz', 'movies.jsonl.gz', 'movies.sqlite'):
+            path = self.path(name)
+            writer = self.handler.open_writer(self.fields, path, on_flush=checkpoints.append).open()
+            writer.write_row(self.rows[0])
+            writer.flush()
+            writer.write_row({'Title': 'Unjournaled', 'Year': '1900'})
+            writer.flush()  # reached the file, but the crash came before the journal had it
+            if name.endswith('.gz'):
+                writer.file.close()
+                with open(writer.part_path, 'ab') as part:
+                    part.write(b'torn')
+            else:
+                writer.conn.close()
+                writer.conn = None
+
+            with self.handler.open_writer(self.fields, path, append=True, checkpoint=checkpoints[0]) as writer:
+                writer.write_row(self.rows[1])
+            self.assertListEqual(self.rows, list(read_rows(path)), name)
+            checkpoints.clear()
+
+    def test_read_rows(self):
+        for name in ('movies.csv', 'movies.csv.gz', 'movies.jsonl', 'movies.sqlite'):
+            path = self.path(name)
+            self.handler.save_file(self.rows, self.fields, path)
+            self.assertListEqual(self.rows, list(read_rows(path)), name)
+
+    def test_movie_records(self):
+        records = [record_type(tuple(self.fields))(row.values()) for row in self.rows]
+        for name in ('movies.csv', 'movies.jsonl', 'movies.sqlite'):
+            path = self.path(name)
+            self.handler.save_file(records, self.fields, path)
+            self.assertListEqual(self.rows, list(read_rows(path)), name)
+
+        # a record of other fields, or in another order, is written by name
+        path = self.path('reordered.csv')
+        self.handler.save_file(records, ['Year', 'Title'], path)
+        self.assertListEqual(self.rows, list(read_rows(path)))
+
+    def test_set_output_format(self):
+        path = self.path('movies.out')
+        self.handler.set_output_format('jsonl')
+        self.handler.save_file(self.rows, self.fields, path)
+        with open(path, encoding='utf-8') as output:
+            self.assertEqual(self.rows[0], json.loads(output.readline()))
+
+        with self.assertRaises(ValueError):
+            self.handler.set_output_format('xlsx')
@@ -0,0 +1,67 @@
+import os
+import tempfile
+from unittest import TestCase
+
+from journal import Journal
+
+
+class TestJournal(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.journal = Journal(Journal.path_for(os.path.join(self.tmp.name, 'output.csv')))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_load_missing(self):
+        self.assertSetEqual(set(), self.journal.load())
+
+    def test_record_and_load(self):
+        self.journal.open()
+        self.journal.record('0133093')
+        self.journal.record('999', valid=False)
+        self.journal.flush((1, 60))
+        self.journal.close()
+        self.assertSetEqual({'0133093', '999'}, self.journal.load())
+        self.assertTupleEqual((1, 60), self.journal.checkpoint)
+
+    def test_only_flushed_entries_are_kept(self):
+        self.journal.open()
+        self.journal.record('0133093')
+        self.journal.flush((1, 60))
+        self.journal.record('0234215')
+        self.assertSetEqual({'0133093'}, self.journal.load())
+        self.journal.close()
+
+    def test_only_checkpointed_entries_are_kept(self):
+        self.journal.open()
+        self.journal.record('0133093')
+        self.journal.flush((1, 60))
+        self.journal.record('0234215')
+        self.journal.flush()
+        self.journal.close()
+        self.assertSetEqual({'0133093'}, self.journal.load())
+
+        # appending drops the entries past the checkpoint, so a later one can't vouch for them
+        self.journal.open(append=True)
+        self.journal.record('0120737')
+        self.journal.flush((2, 110))
+        self.journal.close()
+        self.assertSetEqual({'0133093', '0120737'}, self.journal.load())
+        self.assertTupleEqual((2, 110), self.journal.checkpoint)
+
+    def test_ignores_truncated_line(self):
+        with open(self.journal.path, 'w') as journal:
+            journal.write('ok 0133093\nat 1 60\nok 02342')
+        self.assertSetEqual({'0133093'}, self.journal.load())
+
+    def test_append(self):
+        self.journal.open()
+        self.journal.record('0133093')
+        self.journal.flush((1, 60))
+        self.journal.close()
+        self.journal.open(append=True)
+        self.journal.record('0234215')
+        self.journal.flush((2, 110))
+        self.journal.close()
+        self.assertSetEqual({'0133093', '0234215'}, self.journal.load())
@@ -0,0 +1,95 @@
+import io
+import os
+import tempfile
+from unittest import TestCase
+
+from benchmarks.fake_imdb import FakeIMDbServer
+from cli import ConsoleProgress, quiet_cinemagoer
+from clients import ClientPool
+from file_handler import CsvHandler
+from helpers import FakeClock
+from limiter import AdaptiveLimiter, RateLimiter
+from movie_data import IMDbData
+from policy import THROTTLED, FetchPolicy
+from scraper import ID_PATTERN, Scraper
+
+
+class TestAdaptiveLimiter(TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.limiter = AdaptiveLimiter(initial=4, max_limit=10, clock=self.clock)
+
+    def fetch(self, latency=0.1, error_kind=None):
+        self.limiter.acquire()
+        self.clock.now += latency
+        self.limiter.release(latency, error_kind)
+
+    def test_additive_increase(self):
+        for _ in range(4):
+            self.fetch()
+        self.assertAlmostEqual(5, self.limiter.limit, delta=0.1)
+
+        for _ in range(1000):
+            self.fetch()
+        self.assertEqual(10, self.limiter.limit)
+
+    def test_multiplicative_decrease(self):
+        self.fetch()
+        self.fetch(error_kind=THROTTLED)
+        self.assertAlmostEqual(2.1, self.limiter.limit, delta=0.1)
+
+        # errors within one typical request time of the last decrease count as the same signal
+        self.limiter.acquire()
+        self.limiter.release(0.01, THROTTLED)
+        self.assertAlmostEqual(2.1, self.limiter.limit, delta=0.1)
+
+        for _ in range(10):
+            self.fetch(error_kind=THROTTLED)
+        self.assertEqual(1, self.limiter.limit)
+
+    def test_decrease_on_slow_fetches(self):
+        for _ in range(20):
+            self.fetch(0.1)
+        limit = self.limiter.limit
+        self.fetch(0.5)
+        self.assertLess(self.limiter.limit, limit)
+
+
+class TestRateLimiter(TestCase):
+    def test_spacing(self):
+        clock = FakeClock()
+        sleeps = []
+        limiter = RateLimiter(10, clock=clock, sleep=sleeps.append)
+        for _ in range(3):
+            limiter.acquire()
+        self.assertEqual(2, len(sleeps))
+        self.assertAlmostEqual(0.2, sleeps[-1])
+
+        clock.now = 10
+        limiter.acquire()
+        self.assertEqual(2, len(sleeps))
+
+
+class TestAdaptiveScraping(TestCase):
+    def test_finds_rate_limit(self):
+        """ Against a site that throttles anything beyond 6 concurrent requests, the limit settles close to 6. """
+        quiet_cinemagoer()
+        limiter = AdaptiveLimiter(initial=2, max_limit=48)
+        data_source = IMDbData()
+        with FakeIMDbServer(latency=0.02, max_in_flight=6) as server, tempfile.TemporaryDirectory() as tmp:
+            pool = ClientPool(imdbURL_base=server.url)
+            data_source.set_client_pool(pool)
+            data_source.set_fetch_policy(FetchPolicy(retries=20, backoff=0.01, limiter=limiter))
+            scraper = Scraper(CsvHandler(ID_PATTERN), data_source, concurrency=48)
+            scraper.set_ui(ConsoleProgress(interval=3600, stream=io.StringIO()))
+            try:
+                scraper.run([f'{i:07d}' for i in range(1, 301)], ['IMDb ID'], {}, os.path.join(tmp, 'output.csv'))
+            finally:
+                data_source.set_client_pool(None)
+                data_source.set_fetch_policy(FetchPolicy())
+                pool.close()
+
+        self.assertListEqual([], scraper.stats['failed'])
+        self.assertGreater(limiter.decreases, 0)
+        self.assertLessEqual(limiter.limit, 12)
+        self.assertLess(server.throttled, 100)
@@ -0,0 +1,83 @@
+import json
+import os
+import tempfile
+from unittest import TestCase
+
+from metrics import Histogram, Metrics, MetricsExporter
+
+
+class TestHistogram(TestCase):
+    def test_observe(self):
+        histogram = Histogram(buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 0.5, 2.0):
+            histogram.observe(value)
+
+        self.assertListEqual([1, 2, 1], histogram.counts)
+        self.assertEqual(4, histogram.count)
+        self.assertAlmostEqual(3.05, histogram.sum)
+        self.assertEqual(2.0, histogram.max)
+
+    def test_quantile(self):
+        histogram = Histogram(buckets=(0.1, 1.0))
+        self.assertEqual(0.0, histogram.quantile(0.5))
+        for _ in range(98):
+            histogram.observe(0.05)
+        histogram.observe(0.5)
+        histogram.observe(3.0)
+
+        self.assertEqual(0.1, histogram.quantile(0.5))
+        self.assertEqual(1.0, histogram.quantile(0.99))
+        self.assertEqual(3.0, histogram.quantile(1.0))
+
+
+class TestMetrics(TestCase):
+    def setUp(self):
+        self.metrics = Metrics(buckets=(0.1, 1.0))
+        self.metrics.increment('titles_total', result='valid')
+        self.metrics.increment('titles_total', 2, result='valid')
+        self.metrics.increment('titles_total', result='invalid')
+        self.metrics.set('concurrency_limit', 8)
+        self.metrics.set('concurrency_limit', 12)
+        self.metrics.observe('stage_seconds', 0.05, stage='fetch')
+        self.metrics.observe('stage_seconds', 0.5, stage='fetch')
+
+    def test_snapshot(self):
+        snapshot = self.metrics.snapshot()
+        counters = {counter['labels']['result']: counter['value'] for counter in snapshot['counters']}
+        self.assertDictEqual({'valid': 3, 'invalid': 1}, counters)
+
+        self.assertListEqual([{'name': 'concurrency_limit', 'labels': {}, 'value': 12}], snapshot['gauges'])
+
+        histogram, = snapshot['histograms']
+        self.assertEqual(('stage_seconds', {'stage': 'fetch'}), (histogram['name'], histogram['labels']))
+        self.assertEqual(2, histogram['count'])
+        self.assertDictEqual({'0.1': 1, '1.0': 1, '+Inf': 0}, histogram['buckets'])
+
+    def test_timer(self):
+        with self.assertRaises(ValueError):
+            with self.metrics.timer('stage_seconds', stage='write'):
+                raise ValueError
+        self.assertEqual(1, self.metrics.histograms[('stage_seconds', (('stage', 'write'),))].count)
+
+    def test_prometheus(self):
+        text = self.metrics.prometheus()
+        self.assertIn('# TYPE scraper_titles_total counter\n', text)
+        self.assertIn('scraper_titles_total{result="valid"} 3\n', text)
+        self.assertIn('# TYPE scraper_concurrency_limit gauge\nscraper_concurrency_limit 12\n', text)
+        self.assertIn('# TYPE scraper_stage_seconds histogram\n', text)
+        # buckets are cumulative
+        self.assertIn('scraper_stage_seconds_bucket{stage="fetch",le="1.0"} 2\n', text)
+        self.assertIn('scraper_stage_seconds_bucket{stage="fetch",le="+Inf"} 2\n', text)
+        self.assertIn('scraper_stage_seconds_count{stage="fetch"} 2\n', text)
+
+    def test_exporter(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            json_path, prom_path = os.path.join(tmp, 'metrics.json'), os.path.join(tmp, 'metrics.prom')
+            for path in (json_path, prom_path):
+                MetricsExporter(self.metrics, path, interval=3600).start().stop()
+
+            with open(json_path) as snapshot:
+                self.assertEqual(2, len(json.load(snapshot)['counters']))
+            with open(prom_path) as text:
+                self.assertIn('scraper_titles_total', text.read())
+            self.assertListEqual(['metrics.json', 'metrics.prom'], sorted(os.listdir(tmp)))
@@ -1,17 +1,36 @@
+import pickle
+import time
+from threading import Event, Thread
 from unittest import TestCase
+from unittest.mock import ANY, patch
 
-from src.movie_data import IMDbData
+from imdb.Movie import Movie
+
+from cache import InFlight, ResponseCache
+from helpers import serve_imdb, use_imdb_client
+from movie_data import IMDbData, record_type
 
 
 class TestIMDbData(TestCase):
     def setUp(self):
+        # the recorded pages for tt0133093 stand in for the real site, so these tests run offline
+        self.server = serve_imdb(self, invalid={'0000999'})
+        use_imdb_client(self, self.server)
         self.imdb = IMDbData()
 
+    def test_shared_client_is_created_on_first_use(self):
+        IMDbData.imdb = None
+        with patch('movie_data.Cinemagoer') as cinemagoer:
+            first = self.imdb._shared_client()
+            second = self.imdb._shared_client()
+        cinemagoer.assert_called_once_with()
+        self.assertIs(first, second)
+
     def test_set_chosen_fields(self):
         choices = ['Title', 'URL']
         self.imdb.set_chosen_fields(choices)
-        expected = {'Title': self.imdb._get_title, 'URL': self.imdb.get_url}
-        actual = self.imdb.chosen_fields
+        expected = {'Title': self.imdb._get_title, 'URL': self.imdb._get_url}
+        actual = {field: chosen['method'] for field, chosen in self.imdb.chosen_fields.items()}
         self.assertDictEqual(expected, actual)
 
     def test_get_movie_data(self):
@@ -20,8 +39,118 @@ class TestIMDbData(TestCase):
         expected = {'Title': 'The Matrix', 'Cast': 'Keanu Reeves, Laurence Fishburne, Carrie-Anne Moss',
                     'Director': 'Lana Wachowski, Lilly Wachowski', 'URL': 'http://www.imdb.com/title/tt0133093'}
         actual = self.imdb.get_movie_data('0133093')
-        self.assertDictEqual(expected, actual)
+        self.assertDictEqual(expected, dict(actual))
+
+    def test_movie_record(self):
+        record = record_type(('Title', 'Year'))(['The Matrix', 1999])
+        self.assertEqual(('The Matrix', 1999), record)
+        self.assertEqual('The Matrix', record['Title'])
+        self.assertEqual(1999, record[1])
+        self.assertEqual(1999, record.get('Year'))
+        self.assertIsNone(record.get('Cast'))
+        self.assertDictEqual({'Title': 'The Matrix', 'Year': 1999}, dict(record))
+        self.assertIs(type(record), record_type(('Title', 'Year')))
+        self.assertFalse(hasattr(record, '__dict__'))
+
+        copy = pickle.loads(pickle.dumps(record))
+        self.assertEqual(record, copy)
+        self.assertIs(type(record), type(copy))
 
     def test_get_movie_data_invalid(self):
         actual = self.imdb.get_movie_data('999')
         self.assertIs(None, actual)
+
+    def test_get_movie_data_cached(self):
+        cache = ResponseCache(':memory:')
+        movie = Movie(movieID='0133093', data={'title': 'The Matrix'})
+        movie.add_to_current_info('main')
+        cache.put('0133093', movie)
+        self.imdb.set_cache(cache)
+        self.imdb.set_chosen_fields(['Title', 'URL'])
+
+        expected = {'Title': 'The Matrix', 'URL': 'http://www.imdb.com/title/tt0133093'}
+        actual = self.imdb.get_movie_data('0133093')
+        self.imdb.set_cache(None)
+        self.assertDictEqual(expected, dict(actual))
+        self.assertEqual(1, cache.hits)
+
+    def test_get_movie_data_fills_empty_cache(self):
+        cache = ResponseCache(':memory:')
+        self.imdb.set_cache(cache)
+        self.imdb.set_chosen_fields(['Title'])
+        self.imdb.get_movie_data('0133093')
+        self.imdb.get_movie_data('0133093')
+        self.imdb.set_cache(None)
+        self.assertEqual(1, len(cache))
+        self.assertEqual(1, cache.hits)
+
+    def test_chosen_info(self):
+        self.imdb.set_chosen_fields(['Title', 'Year'])
+        self.assertTupleEqual(('main',), self.imdb.chosen_info)
+
+        self.imdb.set_chosen_fields(['Synopsis (long)', 'IMDb ID'])
+        self.assertTupleEqual(('plot',), self.imdb.chosen_info)
+
+        self.imdb.set_chosen_fields(['URL'])
+        self.assertTupleEqual(self.imdb.VALIDATION_INFO, self.imdb.chosen_info)
+
+    def test_get_movie_data_fields(self):
+        self.imdb.set_chosen_fields(['Title', 'Synopsis (long)', 'IMDb ID'])
+        with patch.object(self.imdb.imdb, 'get_movie', wraps=self.imdb.imdb.get_movie) as get_movie:
+            actual = self.imdb.get_movie_data('0133093', ['Synopsis (long)', 'IMDb ID'])
+        get_movie.assert_called_once_with('0133093', info=('plot',))
+        self.assertTupleEqual(('Synopsis (long)', 'IMDb ID'), actual.fields)
+
+    def test_get_movie_data_limits(self):
+        self.imdb.set_chosen_fields(['Title'])
+        actual = self.imdb.get_movie_data('0133093', ['Cast', 'Genres'], {'Cast': 1})
+        self.assertDictEqual({'Cast': 'Keanu Reeves', 'Genres': 'Action, Sci-Fi'}, dict(actual))
+        self.assertEqual(3, self.imdb.MAX_CAST)
+        self.assertTupleEqual(('Title',), self.imdb.plan[0].fields)
+
+    def test_get_movie_data_cached_missing_info(self):
+        cache = ResponseCache(':memory:')
+        movie = Movie(movieID='0133093', data={'title': 'The Matrix'})
+        movie.add_to_current_info('main')
+        cache.put('0133093', movie)
+        self.imdb.set_cache(cache)
+        self.imdb.set_chosen_fields(['Title', 'Synopsis (long)'])
+
+        with patch.object(self.imdb.imdb, 'update') as update:
+            self.imdb.get_movie_data('0133093')
+        self.imdb.set_cache(None)
+        update.assert_called_once_with(ANY, info=['plot'])
+
+    def test_inflight_shares_a_title_between_info_sets(self):
+        started, release = Event(), Event()
+        get_movie = self.imdb.imdb.get_movie
+
+        def slow_get_movie(*args, **kwargs):
+            started.set()
+            release.wait()
+            return get_movie(*args, **kwargs)
+
+        inflight = InFlight()
+        self.imdb.set_inflight(inflight)
+        results = {}
+        with patch.object(self.imdb.imdb, 'get_movie', side_effect=slow_get_movie) as fetched, \
+                patch.object(self.imdb.imdb, 'update', wraps=self.imdb.imdb.update) as update:
+            title = Thread(target=lambda: results.update(title=self.imdb.get_movie_data('0133093', ['Title'])))
+            title.start()
+            started.wait()
+            both = Thread(target=lambda: results.update(
+                both=self.imdb.get_movie_data('0133093', ['Title', 'Synopsis (long)'])))
+            both.start()
+            deadline = time.monotonic() + 5
+            while not inflight.coalesced and time.monotonic() < deadline:
+                time.sleep(0.001)
+            release.set()
+            title.join()
+            both.join()
+        self.imdb.set_inflight(None)
+
+        # the title is fetched once, and the job that wanted more only fetches the plot on top of it
+        fetched.assert_called_once_with('0133093', info=('main',))
+        update.assert_called_with(ANY, info=['plot'])
+        self.assertEqual('The Matrix', results['title'][0])
+        self.assertEqual(('The Matrix', True), (results['both'][0], bool(results['both'][1])))
@@ -0,0 +1,162 @@
+import socket
+import time
+from threading import Lock, Thread
+from unittest import TestCase
+
+from imdb import IMDbError
+from imdb._exceptions import IMDbDataAccessError, IMDbParserError
+
+from helpers import FakeClock
+from policy import INVALID, PERMANENT, THROTTLED, TRANSIENT, CircuitBreaker, FetchError, FetchPolicy, classify
+
+
+def http_error(status):
+    return IMDbDataAccessError({'errcode': status, 'errmsg': '', 'url': '', 'proxy': ''})
+
+
+class Flaky:
+    """ An attempt that fails with the given errors, in turn, before succeeding. """
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return 'movie'
+
+
+class TestClassify(TestCase):
+    def test_classify(self):
+        self.assertEqual(INVALID, classify(http_error(404)))
+        self.assertEqual(THROTTLED, classify(http_error(429)))
+        self.assertEqual(THROTTLED, classify(http_error(503)))
+        self.assertEqual(TRANSIENT, classify(http_error(500)))
+        self.assertEqual(TRANSIENT, classify(http_error(None)))
+        self.assertEqual(TRANSIENT, classify(socket.timeout()))
+        self.assertEqual(PERMANENT, classify(http_error(400)))
+        self.assertEqual(PERMANENT, classify(IMDbParserError('unparseable')))
+        self.assertEqual(PERMANENT, classify(ValueError()))
+
+    def test_classify_urllib_errors(self):
+        # Cinemagoer's own opener wraps urllib's HTTPError instead of reporting the status
+        class HTTPError(Exception):
+            code = 429
+        error = IMDbDataAccessError({'errcode': None, 'original exception': HTTPError()})
+        self.assertEqual(THROTTLED, classify(error))
+
+
+class TestFetchPolicy(TestCase):
+    def setUp(self):
+        self.sleeps = []
+        self.policy = FetchPolicy(retries=2, sleep=self.sleeps.append)
+
+    def test_retries_transient_errors(self):
+        attempt = Flaky(http_error(500), http_error(429))
+        self.assertEqual('movie', self.policy.call(attempt))
+        self.assertEqual(3, attempt.calls)
+        self.assertEqual(2, len(self.sleeps))
+        self.assertEqual(2, self.policy.stats()['retries'])
+
+    def test_gives_up(self):
+        attempt = Flaky(http_error(503), http_error(503), http_error(503))
+        with self.assertRaises(FetchError) as raised:
+            self.policy.call(attempt)
+        self.assertEqual(THROTTLED, raised.exception.kind)
+        self.assertEqual(3, attempt.calls)
+
+    def test_does_not_retry_invalid(self):
+        attempt = Flaky(http_error(404))
+        with self.assertRaises(IMDbError):
+            self.policy.call(attempt)
+        self.assertEqual(1, attempt.calls)
+        self.assertListEqual([], self.sleeps)
+
+    def test_delay(self):
+        for retry in range(10):
+            self.assertLessEqual(self.policy.delay(retry), min(0.5 * 2 ** retry, 30))
+        self.assertLessEqual(max(self.policy.delay(0) for _ in range(100)), 0.5)
+        self.assertGreater(max(self.policy.delay(0, THROTTLED) for _ in range(100)), 0.5)
+
+    def test_hedging(self):
+        policy = FetchPolicy(hedge=True, hedge_budget=1.0)
+        for _ in range(policy.latencies.refresh_every):
+            policy.latencies.add(0.01)
+
+        calls = []
+
+        def slow_then_fast():
+            calls.append(None)
+            time.sleep(2 if len(calls) == 1 else 0)
+            return len(calls)
+
+        start = time.monotonic()
+        self.assertEqual(2, policy.call(slow_then_fast))
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertEqual(1, policy.stats()['hedges'])
+        policy.close()
+
+    def test_hedging_keeps_concurrency(self):
+        policy = FetchPolicy(hedge=True)
+        for _ in range(policy.latencies.refresh_every):
+            policy.latencies.add(10)  # so every attempt runs on the hedging pool, without being hedged
+        in_flight, peak, lock = [0], [0], Lock()
+
+        def attempt():
+            with lock:
+                in_flight[0] += 1
+                peak[0] = max(peak[0], in_flight[0])
+            time.sleep(0.2)
+            with lock:
+                in_flight[0] -= 1
+
+        callers = [Thread(target=policy.call, args=(attempt,)) for _ in range(50)]
+        start = time.monotonic()
+        for caller in callers:
+            caller.start()
+        for caller in callers:
+            caller.join()
+        self.assertEqual(50, peak[0])
+        self.assertLess(time.monotonic() - start, 1)
+        policy.close()
+
+    def test_hedge_budget(self):
+        policy = FetchPolicy(hedge=True, hedge_budget=0.0)
+        for _ in range(policy.latencies.refresh_every):
+            policy.latencies.add(0.001)
+        self.assertEqual('movie', policy.call(lambda: time.sleep(0.05) or 'movie'))
+        self.assertEqual(0, policy.stats()['hedges'])
+        policy.close()
+
+
+class TestCircuitBreaker(TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.breaker = CircuitBreaker(threshold=0.5, window=10, min_attempts=4, cooldown=5, clock=self.clock)
+
+    def test_opens_on_errors(self):
+        for success in (True, False, True):
+            self.breaker.record(success)
+        self.assertEqual(CircuitBreaker.CLOSED, self.breaker.state)
+        self.breaker.record(False)
+        self.assertEqual(CircuitBreaker.OPEN, self.breaker.state)
+        self.assertEqual(1, self.breaker.trips)
+
+    def test_probe(self):
+        for _ in range(4):
+            self.breaker.record(False)
+
+        # the first attempt after the cooldown is the probe; a failed probe doubles the cooldown
+        self.clock.now = 5
+        self.breaker.before_attempt()
+        self.assertEqual(CircuitBreaker.HALF_OPEN, self.breaker.state)
+        self.breaker.record(False)
+        self.assertEqual((CircuitBreaker.OPEN, 10), (self.breaker.state, self.breaker.cooldown))
+
+        self.clock.now = 15
+        self.breaker.before_attempt()
+        self.breaker.record(True)
+        self.assertEqual((CircuitBreaker.CLOSED, 5), (self.breaker.state, self.breaker.cooldown))
+        self.breaker.before_attempt()
@@ -0,0 +1,92 @@
+import os
+import tempfile
+from unittest import TestCase
+from unittest.mock import patch
+
+from file_handler import CsvHandler
+from helpers import serve_imdb, use_imdb_client
+from movie_data import DAY, IMDbData
+from refresh import FieldStore, RefreshData, seed_from_output
+
+
+class TestFieldStore(TestCase):
+    def setUp(self):
+        self.store = FieldStore(':memory:')
+
+    def tearDown(self):
+        self.store.close()
+
+    def test_update_and_load(self):
+        self.store.update('0133093', {'Title': 'The Matrix', 'Year': 1999}, 100.0)
+        self.store.update('0133093', {'Year': 1999}, 200.0)
+        self.assertDictEqual({'Title': ('The Matrix', 100.0), 'Year': (1999, 200.0)}, self.store.load('0133093'))
+        self.assertDictEqual({}, self.store.load('0000001'))
+
+    def test_seed(self):
+        self.store.update('0133093', {'Title': 'The Matrix'}, 200.0)
+        rows = [{'IMDb ID': 'tt0133093', 'Title': 'Old title', 'Year': '1999'},
+                {'URL': 'http://www.imdb.com/title/tt0234215', 'Title': 'The Matrix Reloaded'},
+                {'Title': 'No ID'}]
+
+        self.assertEqual(2, self.store.seed(rows, r'tt(\d+)', 100.0))
+        # what is already known wins over the earlier output
+        self.assertEqual(('The Matrix', 200.0), self.store.load('0133093')['Title'])
+        self.assertEqual(('1999', 100.0), self.store.load('0133093')['Year'])
+        self.assertEqual(('The Matrix Reloaded', 100.0), self.store.load('0234215')['Title'])
+
+    def test_seed_from_output(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'movies.jsonl')
+            CsvHandler(r'tt(\d+)').save_file([{'Title': 'The Matrix', 'IMDb ID': 'tt0133093'}], ['Title', 'IMDb ID'],
+                                             path)
+            os.utime(path, (1000, 1000))
+            self.assertEqual(1, seed_from_output(self.store, path, r'tt(\d+)'))
+        self.assertEqual(('The Matrix', 1000), self.store.load('0133093')['Title'])
+
+
+class TestRefreshData(TestCase):
+    def setUp(self):
+        self.server = serve_imdb(self, invalid={'0000999'})
+        use_imdb_client(self, self.server)
+        self.now = 0.0
+        self.store = FieldStore(':memory:')
+        self.data = RefreshData(IMDbData(), self.store, clock=lambda: self.now)
+
+    def tearDown(self):
+        self.store.close()
+
+    def fetch(self, identifier='0133093'):
+        """ Return the data and the info sets fetched for it (None if nothing was). """
+        with patch.object(IMDbData.imdb, 'get_movie', wraps=IMDbData.imdb.get_movie) as get_movie:
+            data = self.data.get_movie_data(identifier)
+        return data, get_movie.call_args.kwargs['info'] if get_movie.called else None
+
+    def test_only_stale_fields_are_fetched(self):
+        self.data.set_chosen_fields(['Title', 'IMDb rating', 'IMDb ID'])
+        data, info = self.fetch()
+        self.assertEqual(('main',), info)
+        self.assertDictEqual({'Title': 'The Matrix', 'IMDb rating': 8.7, 'IMDb ID': 'tt0133093'}, data)
+
+        self.now += DAY / 2
+        self.assertEqual((data, None), self.fetch())
+
+        self.now += DAY
+        self.store.update('0133093', {'Title': 'Stored title'}, self.now)
+        with patch.object(IMDbData, 'get_movie_data', wraps=IMDbData.get_movie_data) as get_movie_data:
+            data, _ = self.fetch()
+        get_movie_data.assert_called_once_with('0133093', ['IMDb rating'], None)
+        self.assertEqual('Stored title', data['Title'])
+        self.assertDictEqual({'fetched': 2, 'skipped': 1}, self.data.stats())
+
+    def test_new_fields_fetch_their_info(self):
+        self.data.set_chosen_fields(['Title'])
+        self.fetch()
+        self.data.set_chosen_fields(['Title', 'Synopsis (long)'])
+        data, info = self.fetch()
+        self.assertEqual(('plot',), info)
+        self.assertEqual('The Matrix', data['Title'])
+
+    def test_invalid(self):
+        self.data.set_chosen_fields(['Title'])
+        self.store.update('0000999', {'Title': 'Gone'}, -2 * IMDbData.STABLE_TTL)
+        self.assertEqual((None, ('main',)), self.fetch('0000999'))
@@ -1,93 +1,223 @@
+import csv
+import io
+import os
+import subprocess
+import sys
+import tempfile
 from unittest import TestCase
-
-from src.scraper import extract_ids, get_title, get_movie, get_year, get_countries, get_director, get_cast, get_runtime, \
-    get_genres, get_rating, get_language, read_csv
-
-#ia = Cinemagoer()
-#movie_id = '0133093'
-#movie = ia.get_movie(movie_id)
-
-
-class Test(TestCase):
+from unittest.mock import MagicMock
+
+from cache import NegativeCache
+from cli import ConsoleProgress
+from clients import ClientPool
+from file_handler import CsvHandler, read_rows
+from helpers import serve_imdb
+from jobs import CancelToken, JobSpec
+from journal import Journal
+from metrics import Metrics
+from movie_data import IMDbData
+from policy import FetchPolicy
+from scraper import ID_PATTERN, Scraper, plausible_id
+
+# scrapes IDs 1 to 300 into an output file, with a row of about 1KB for each, and dies without cleaning up once it
+# reaches the ID given, after the rows before it have been written but (mostly) not yet flushed
+CRASH = '''
+import io, os, sys, time
+from cli import ConsoleProgress
+from file_handler import CsvHandler
+from scraper import ID_PATTERN, Scraper
+
+class DataSource:
+    def get_movie_data(self, identifier, fields=None, limits=None):
+        if identifier == sys.argv[2]:
+            time.sleep(0.5)
+            os._exit(1)
+        return {'IMDb ID': 'tt' + identifier, 'Title': 'x' * 1000}
+
+scraper = Scraper(CsvHandler(ID_PATTERN), DataSource(), concurrency=1)
+scraper.set_ui(ConsoleProgress(interval=3600, stream=io.StringIO()))
+scraper.run([f'{i:07d}' for i in range(1, 301)], ['IMDb ID', 'Title'], {}, sys.argv[1], resume=True)
+'''
+
+
+class TestScraper(TestCase):
     def setUp(self):
-        self.pattern = None
-
-    def test_extract_ids(self):
-        expected = ['3011960', '2463288', '1615147', '4440644']
-        actual = extract_ids('test.csv')
-
-        self.assertListEqual(expected, actual)
-
-    def test_get_movie_valid(self):
-        expected = 'Hangman'
-        actual = get_movie('3011960').get('title')
-        self.assertEqual(expected, actual)
-
-    def test_get_movie_invalid(self):
-        actual = get_movie('0000000')
-        self.assertIsNone(actual)
-
-    def test_get_title(self):
-        expected = 'The Matrix'
-        actual = get_title(movie)
-        self.assertEqual(expected, actual)
-
-    def test_get_synopsis(self):
-        actual = get_title(movie)
-        self.assertIsInstance(actual, str)
-        self.assertIn('Matrix', actual)
-
-    def test_get_year(self):
-        expected = 1999
-        actual = get_year(movie)
-        self.assertEqual(expected, actual)
-
-    def test_get_countries(self):
-        expected = 'United States, Australia'
-        actual = get_countries(movie)
-        self.assertEqual(expected, actual)
-
-    def test_get_director(self):
-        expected = 'Lana Wachowski, Lilly Wachowski'
-        actual = get_director(movie)
-        self.assertEqual(expected, actual)
-
-    def test_get_cast(self):
-        expected = 'Keanu Reeves, Laurence Fishburne'
-        actual = get_cast(movie, 2)
-        self.assertEqual(expected, actual)
-
-    def test_get_runtime(self):
-        expected = '136'
-        actual = get_runtime(movie)
-        self.assertEqual(expected, actual)
-
-    def test_get_genres(self):
-        expected = 'Action / Sci-Fi'
-        actual = get_genres(movie)
-        self.assertEqual(expected, actual)
-
-    def test_get_rating(self):
-        # rating subject to change
-        actual = float(get_rating(movie))
-        self.assertLessEqual(actual, 10)
-        self.assertGreaterEqual(actual, 0)
-
-    def test_get_language(self):
-        expected = 'English'
-        actual = get_language(movie)
-        self.assertEqual(expected, actual)
-
-    def test_export(self):
-        self.fail()
-
-    def test_process(self):
-        self.fail()
-
-    def test_read_csv(self):
-        path = 'test.csv'
-        actual = read_csv(path)
-        expected = {'3011960', '2463288', '1615147', '4440644'}
-
-        self.assertSetEqual(expected, actual)
-
+        self.server = serve_imdb(self, invalid={'0000404'})
+        self.pool = ClientPool(imdbURL_base=self.server.url)
+        self.data_source = IMDbData()
+        self.data_source.set_client_pool(self.pool)
+        self.scraper = Scraper(CsvHandler(ID_PATTERN), self.data_source, concurrency=4)
+        self.progress = ConsoleProgress(interval=3600, stream=io.StringIO())
+        self.scraper.set_ui(self.progress)
+        self.tmp = tempfile.TemporaryDirectory()
+        self.output = os.path.join(self.tmp.name, 'output.csv')
+
+    def tearDown(self):
+        self.scraper.set_negative_cache(None)
+        self.data_source.set_fetch_policy(FetchPolicy())
+        self.scraper.set_metrics(None)
+        self.data_source.set_client_pool(None)
+        self.pool.close()
+        self.tmp.cleanup()
+
+    def read_output(self):
+        with open(self.output, newline='') as output:
+            return list(csv.DictReader(output))
+
+    def test_run(self):
+        ids = ['0133093', '0000404', '0000001', '0000002']
+        self.scraper.run(iter(ids), ['IMDb ID', 'Title', 'Director'], {}, self.output)
+
+        rows = self.read_output()
+        self.assertListEqual(['tt0133093', 'tt0000001', 'tt0000002'], [row['IMDb ID'] for row in rows])
+        self.assertEqual('The Matrix', rows[0]['Title'])
+        self.assertEqual('Lana Wachowski, Lilly Wachowski', rows[0]['Director'])
+        self.assertEqual((3, 1), (self.progress.valid, self.progress.invalid))
+        self.assertSetEqual(set(ids), Journal(Journal.path_for(self.output)).load())
+
+    def test_run_resume(self):
+        self.scraper.run(['0000001', '0000002'], ['IMDb ID'], {}, self.output)
+        requests = self.server.requests
+        self.scraper.run(['0000001', '0000002', '0000003'], ['IMDb ID'], {}, self.output, resume=True)
+
+        self.assertListEqual(['tt0000001', 'tt0000002', 'tt0000003'], [row['IMDb ID'] for row in self.read_output()])
+        self.assertEqual(1, self.server.requests - requests)
+
+    def test_run_metrics(self):
+        self.scraper.set_metrics(Metrics())
+        self.scraper.run(['0133093', '0000404'], ['Title', 'Year'], {}, self.output)
+
+        histograms = self.scraper.metrics.histograms
+        for stage in ('fetch', 'parse'):
+            self.assertEqual(2, histograms[('stage_seconds', (('stage', stage),))].count)
+        self.assertEqual(1, histograms[('stage_seconds', (('stage', 'write'),))].count)
+        self.assertEqual(1, histograms[('extract_seconds', (('field', 'Year'),))].count)
+        self.assertEqual(2, histograms[('title_seconds', ())].count)
+        self.assertEqual(1, self.scraper.metrics.counters[('titles_total', (('result', 'invalid'),))])
+
+    def test_run_retries_errors(self):
+        self.server.error_rate = 0.3
+        self.data_source.set_fetch_policy(FetchPolicy(retries=10, backoff=0.001))
+        ids = [f'{i:07d}' for i in range(1, 21)]
+        self.scraper.run(ids, ['IMDb ID'], {}, self.output)
+
+        self.assertGreater(self.server.errors, 0)
+        self.assertListEqual([f'tt{i}' for i in ids], [row['IMDb ID'] for row in self.read_output()])
+        self.assertListEqual([], self.scraper.stats['failed'])
+
+    def test_run_failed_fetches_are_retried_on_resume(self):
+        self.server.error_rate = 1.0
+        self.data_source.set_fetch_policy(FetchPolicy(retries=1, backoff=0.001))
+        self.scraper.run(['0000001', '0000002'], ['IMDb ID'], {}, self.output)
+        self.assertListEqual(['0000001', '0000002'], sorted(self.scraper.stats['failed']))
+        self.assertEqual(2, self.progress.failed)
+        self.assertSetEqual(set(), Journal(Journal.path_for(self.output)).load())
+
+        self.server.error_rate = 0.0
+        self.scraper.run(['0000001', '0000002'], ['IMDb ID'], {}, self.output, resume=True)
+        self.assertListEqual(['tt0000001', 'tt0000002'], [row['IMDb ID'] for row in self.read_output()])
+
+    def test_run_skips_invalid_ids(self):
+        negative_cache = NegativeCache(':memory:')
+        self.scraper.set_negative_cache(negative_cache)
+        self.scraper.run(['0133093', '0000404', '0'], ['IMDb ID'], {}, self.output)
+        self.assertIn('0000404', negative_cache)
+        requests = self.server.requests
+
+        self.scraper.set_metrics(Metrics())
+        self.scraper.run(['0000404', '123456789', '0000001'], ['IMDb ID'], {}, self.output)
+        self.assertEqual(requests + 1, self.server.requests)
+        self.assertListEqual(['tt0000001'], [row['IMDb ID'] for row in self.read_output()])
+        self.assertEqual(2, self.scraper.stats['skipped_invalid'])
+        counters = self.scraper.metrics.counters
+        self.assertEqual(1, counters[('skipped_total', (('reason', 'known_invalid'),))])
+        self.assertEqual(1, counters[('skipped_total', (('reason', 'implausible'),))])
+        negative_cache.close()
+
+    def test_plausible_id(self):
+        self.assertTrue(plausible_id('0133093'))
+        self.assertTrue(plausible_id('99999999'))
+        self.assertTrue(plausible_id('0099999999'))
+        self.assertFalse(plausible_id('0000000'))
+        self.assertFalse(plausible_id('100000000'))
+        self.assertFalse(plausible_id('12a'))
+        self.assertFalse(plausible_id('١٢٣'))
+
+    def test_submit_concurrent_jobs(self):
+        other = os.path.join(self.tmp.name, 'other.csv')
+        cast, title = (JobSpec(['IMDb ID', 'Cast'], {'Cast': 1}, self.output),
+                       JobSpec(['Title', 'Cast'], {'Cast': 2}, other, progress=ConsoleProgress(stream=io.StringIO())))
+        jobs = self.scraper.run_jobs([(['0133093', '0000404'], cast), (['0133093', '0000001'], title)])
+        self.scraper.close()
+
+        self.assertListEqual([{'IMDb ID': 'tt0133093', 'Cast': 'Keanu Reeves'}], self.read_output())
+        with open(other, newline='') as output:
+            rows = list(csv.DictReader(output))
+        self.assertDictEqual({'Title': 'The Matrix', 'Cast': 'Keanu Reeves, Laurence Fishburne'}, rows[0])
+        self.assertEqual(2, len(rows))
+        self.assertListEqual([[], []], [job.stats['failed'] for job in jobs])
+        self.assertEqual((1, 1), (self.progress.valid, self.progress.invalid))
+        self.assertEqual(2, title.progress.valid)
+
+    def test_cancel_one_job(self):
+        cancel = CancelToken()
+        cancel.cancel()
+        other = os.path.join(self.tmp.name, 'other.csv')
+        cancelled, finished = self.scraper.run_jobs([(['0000001', '0000002'], JobSpec(['IMDb ID'], sink=other,
+                                                                                        cancel=cancel)),
+                                                     (['0000001', '0000002'], JobSpec(['IMDb ID'], sink=self.output))])
+        self.scraper.close()
+        self.assertTrue(cancelled.done)
+        self.assertIsNone(cancelled.error)
+        self.assertEqual(2, len(self.read_output()))
+
+    def test_job_spec_is_immutable(self):
+        spec = JobSpec(['Title'], {'Cast': 2})
+        with self.assertRaises(AttributeError):
+            spec.fields = ('Cast',)
+        with self.assertRaises(TypeError):
+            spec.limits['Cast'] = 3
+
+    def test_process_no_fields(self):
+        ui = MagicMock()
+        self.scraper.set_ui(ui)
+        self.scraper.process('tt0133093', [], {})
+        ui.alert_user.assert_called_once_with('No fields', 'No fields have been selected.')
+
+    def test_process_no_ids(self):
+        ui = MagicMock()
+        self.scraper.set_ui(ui)
+        self.scraper.process('no IDs here', ['Title'], {})
+        ui.alert_user.assert_called_once_with('No IMDb IDs', 'The submitted data contains no potential IMDb IDs.')
+        ui.ask_to_save.assert_not_called()
+
+
+class TestScraperCrash(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def scrape(self, output, crash_at='-'):
+        src = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'src')
+        return subprocess.run([sys.executable, '-c', CRASH, output, crash_at], cwd=src).returncode
+
+    def test_resume_after_crash_with_unflushed_rows(self):
+        output = os.path.join(self.tmp.name, 'output.csv')
+        self.assertEqual(1, self.scrape(output, crash_at='0000251'))
+        # the rows after the last flush have partly reached the file, without being journaled
+        journal = Journal(Journal.path_for(output))
+        self.assertEqual(200, len(journal.load()))
+        self.assertGreater(os.path.getsize(output + '.part'), journal.checkpoint[1])
+
+        self.assertEqual(0, self.scrape(output))
+        self.assertListEqual([f'tt{i:07d}' for i in range(1, 301)], [row['IMDb ID'] for row in read_rows(output)])
+
+    def test_resume_compressed_after_crash(self):
+        for name in ('output.csv.gz', 'output.jsonl.gz'):
+            output = os.path.join(self.tmp.name, name)
+            self.assertEqual(1, self.scrape(output, crash_at='0000251'))
+            self.assertEqual(0, self.scrape(output))
+            self.assertListEqual([f'tt{i:07d}' for i in range(1, 301)],
+                                 [row['IMDb ID'] for row in read_rows(output)], name)
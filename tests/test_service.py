@@ -0,0 +1,126 @@
+import csv
+import json
+import os
+import tempfile
+import time
+from unittest import TestCase
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+from clients import ClientPool
+from file_handler import CsvHandler
+from helpers import serve_imdb
+from jobs import JobSpec
+from movie_data import IMDbData
+from scraper import ID_PATTERN, Scraper
+from service import CANCELLED, DONE, JobServer, JobService
+
+
+class TestJobService(TestCase):
+    def setUp(self):
+        self.imdb = serve_imdb(self, latency=0.2, invalid={'0000404'})
+        self.pool = ClientPool(imdbURL_base=self.imdb.url)
+        self.data_source = IMDbData()
+        self.data_source.set_client_pool(self.pool)
+        self.service = JobService(Scraper(CsvHandler(ID_PATTERN), self.data_source, concurrency=8), max_jobs=2)
+        self.server = JobServer(self.service, port=0).__enter__()
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.service.close()
+        self.server.__exit__()
+        self.data_source.set_inflight(None)
+        self.data_source.set_client_pool(None)
+        self.pool.close()
+        self.tmp.cleanup()
+
+    def request(self, method, path, data=None):
+        body = json.dumps(data).encode() if data is not None else None
+        try:
+            with urlopen(Request(self.server.url + path.lstrip('/'), body, method=method)) as response:
+                return response.status, json.load(response)
+        except HTTPError as e:
+            return e.code, json.load(e)
+
+    def wait(self, *job_ids):
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline:
+            if all(self.service.jobs[job_id].job and self.service.jobs[job_id].job.done for job_id in job_ids):
+                return [self.request('GET', f'/jobs/{job_id}')[1] for job_id in job_ids]
+            time.sleep(0.01)
+        self.fail('jobs did not finish')
+
+    def read(self, name):
+        with open(os.path.join(self.tmp.name, name), newline='') as output:
+            return [row['IMDb ID'] for row in csv.DictReader(output)]
+
+    def test_overlapping_jobs_share_fetches(self):
+        jobs = [{'ids': ['tt0000001', 'tt0000002', 'tt0000404'], 'fields': ['IMDb ID', 'Title'],
+                 'output': os.path.join(self.tmp.name, 'a.csv')},
+                {'ids': ['tt0000002', 'tt0000404', 'tt0000003'], 'fields': ['IMDb ID', 'Cast'], 'limits': {'Cast': 1},
+                 'output': os.path.join(self.tmp.name, 'b.csv')}]
+        submitted = [self.request('POST', '/jobs', job) for job in jobs]
+        self.assertListEqual([202, 202], [status for status, _ in submitted])
+
+        first, second = self.wait(*(status['id'] for _, status in submitted))
+        self.assertEqual((DONE, 2, 1), (first['state'], first['valid'], first['invalid']))
+        self.assertEqual((DONE, 2, 1), (second['state'], second['valid'], second['invalid']))
+        self.assertListEqual(['tt0000001', 'tt0000002'], self.read('a.csv'))
+        self.assertListEqual(['tt0000002', 'tt0000003'], self.read('b.csv'))
+        # tt0000002 and tt0000404 were each fetched once, for both jobs
+        self.assertEqual(4, self.imdb.requests)
+        self.assertEqual(2, self.request('GET', '/stats')[1]['coalesced'])
+
+    def test_priority(self):
+        self.service.max_jobs = 1
+        output = os.path.join(self.tmp.name, '{}.csv')
+        running = self.service.submit(['0000001'], JobSpec(['IMDb ID'], sink=output.format('running')))
+        low = self.service.submit(['0000002'], JobSpec(['IMDb ID'], sink=output.format('low')))
+        high = self.service.submit(['0000003'], JobSpec(['IMDb ID'], sink=output.format('high')), priority=5)
+        self.wait(running.id, low.id, high.id)
+        self.assertLess(high.started, low.started)
+
+    def test_cancel_queued_job(self):
+        self.service.max_jobs = 1
+        output = os.path.join(self.tmp.name, '{}.csv')
+        running = self.service.submit(['0000001'], JobSpec(['IMDb ID'], sink=output.format('running')))
+        queued = self.service.submit(['0000002'], JobSpec(['IMDb ID'], sink=output.format('queued')))
+
+        status, cancelled = self.request('DELETE', f'/jobs/{queued.id}')
+        self.assertEqual((200, CANCELLED), (status, cancelled['state']))
+        self.wait(running.id)
+        self.assertIsNone(queued.job)
+        self.assertEqual(404, self.request('DELETE', '/jobs/99')[0])
+
+    def test_bad_requests(self):
+        output = os.path.join(self.tmp.name, 'out.csv')
+        for job in ({'ids': ['tt0000001'], 'fields': ['Budget'], 'output': output},
+                    {'ids': ['tt0000001']},
+                    {'ids': ['nothing'], 'output': output},
+                    {'ids': ['tt0000001'], 'limits': {'Cast': 0}, 'output': output},
+                    {'ids': ['tt0000001'], 'limits': {'Budget': 5}, 'output': output},
+                    {'ids': 'tt0000001', 'output': output},
+                    {'ids': [{'id': 'tt0000001'}], 'output': output},
+                    {'ids': ['tt0000001'], 'fields': 'Title', 'output': output},
+                    {'ids': ['tt0000001'], 'fields': [['Title']], 'output': output},
+                    ['tt0000001']):
+            status, body = self.request('POST', '/jobs', job)
+            self.assertEqual(400, status)
+            self.assertIn('error', body)
+        self.assertEqual(404, self.request('GET', '/jobs/1')[0])
+        self.assertListEqual([], self.request('GET', '/jobs')[1])
+
+    def test_output_in_use(self):
+        self.service.max_jobs = 1
+        output = os.path.join(self.tmp.name, '{}.csv')
+        running = self.service.submit(['0000001'], JobSpec(['IMDb ID'], sink=output.format('running')))
+        queued = self.service.submit(['0000002'], JobSpec(['IMDb ID'], sink=output.format('queued')))
+
+        for name in ('running', 'queued'):
+            status, body = self.request('POST', '/jobs', {'ids': ['tt0000003'], 'output': output.format(name)})
+            self.assertEqual(409, status)
+            self.assertIn('error', body)
+        self.wait(running.id, queued.id)
+        # once the job writing it is over, the output can be written again
+        status, _ = self.request('POST', '/jobs', {'ids': ['tt0000003'], 'output': output.format('queued')})
+        self.assertEqual(202, status)
@@ -0,0 +1,92 @@
+import csv
+import os
+import tempfile
+from unittest import TestCase
+from unittest.mock import patch
+
+from shard import CLAIMED, DONE, PENDING, WorkQueue, merge_shards, run_sharded
+
+
+class TestWorkQueue(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.queue = WorkQueue(os.path.join(self.tmp.name, 'queue.sqlite'))
+
+    def tearDown(self):
+        self.queue.close()
+        self.tmp.cleanup()
+
+    def test_enqueue_ignores_duplicates(self):
+        self.assertEqual(3, self.queue.enqueue(['0000001', '0000002', '0000003']))
+        self.assertEqual(1, self.queue.enqueue(['3', '0000004']))  # 3 and 0000003 are the same title
+        self.assertDictEqual({PENDING: 4}, self.queue.counts())
+
+    def test_claim_in_input_order(self):
+        self.queue.enqueue(['0000003', '0000001', '0000002'])
+        self.assertListEqual(['0000003', '0000001'], self.queue.claim('a', 2))
+        self.assertListEqual(['0000002'], self.queue.claim('b', 2))
+        self.assertListEqual([], self.queue.claim('a', 2))
+
+    def test_complete_and_requeue(self):
+        self.queue.enqueue(['0000001', '0000002', '0000003'])
+        self.queue.claim('a', 1)
+        self.queue.claim('b', 2)
+        self.queue.complete('a')
+        self.assertDictEqual({DONE: 1, CLAIMED: 2}, self.queue.counts())
+
+        self.assertEqual(2, self.queue.requeue('b'))
+        self.assertListEqual(['0000002', '0000003'], self.queue.claim('c', 5))
+
+    def test_complete_requeues_failed(self):
+        self.queue.enqueue(['0000001', '0000002', '0000003'])
+        self.queue.claim('a', 3)
+        self.queue.complete('a', failed=['0000002'])
+        self.assertDictEqual({DONE: 2, PENDING: 1}, self.queue.counts())
+        self.assertListEqual(['0000002'], self.queue.claim('b', 5))
+        self.assertListEqual(['0000002'], self.queue.unfinished())
+
+    def test_merge_shards(self):
+        self.queue.enqueue(['1', '0000002', '0000003'])  # unpadded, as IDs like tt133093 are read
+        shards = os.path.join(self.tmp.name, 'shards')
+        os.makedirs(shards)
+        for name, ids in (('shard-a.csv', ['0000003', '0000001']), ('shard-b.csv.part', ['0000002', '0000003'])):
+            with open(os.path.join(shards, name), 'w', newline='') as shard:
+                writer = csv.writer(shard)
+                writer.writerow(['Title', 'IMDb ID'])
+                writer.writerows([f'Movie {i}', f'tt{i}'] for i in ids)
+            with open(os.path.join(shards, name), 'a') as shard:
+                shard.write('Truncated')
+
+        output = os.path.join(self.tmp.name, 'output.csv')
+        merge_shards(self.queue, shards, ['Title'], output)
+        with open(output, newline='') as merged:
+            self.assertListEqual(['Movie 0000001', 'Movie 0000002', 'Movie 0000003'],
+                                 [row['Title'] for row in csv.DictReader(merged)])
+
+
+def failing_worker(queue_path, output_dir, worker, fields, limits):
+    """ Stands in for run_worker: claims everything and fails to fetch tt0000002, as if IMDb never answered for it. """
+    queue = WorkQueue(queue_path)
+    ids = queue.claim(worker, 100)
+    path = os.path.join(output_dir, f'shard-{worker}.csv')
+    header = [] if os.path.exists(path) else [['IMDb ID', 'Title']]
+    with open(path, 'a', newline='') as shard:
+        csv.writer(shard).writerows(header + [[f'tt{i}', f'Movie {i}'] for i in ids if i != '0000002'])
+    queue.complete(worker, [i for i in ids if i == '0000002'])
+    with open(os.path.join(output_dir, 'rounds'), 'a') as rounds:
+        rounds.write('.')
+    queue.close()
+
+
+class TestRunSharded(TestCase):
+    def test_unfinished_ids_are_retried_then_reported(self):
+        with tempfile.TemporaryDirectory() as tmp, patch('shard.run_worker', failing_worker):
+            output = os.path.join(tmp, 'output.csv')
+            unfinished = run_sharded(['1', '2', '3'], ['Title'], {}, output, processes=1, rounds=2)
+
+            self.assertListEqual(['0000002'], unfinished)
+            with open(output + '.shards/rounds') as rounds:
+                self.assertEqual('..', rounds.read())
+            with open(output, newline='') as merged:
+                self.assertListEqual(['Movie 0000001', 'Movie 0000003'],
+                                     [row['Title'] for row in csv.DictReader(merged)])
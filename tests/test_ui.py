@@ -0,0 +1,41 @@
+from unittest import TestCase
+
+from helpers import FakeClock
+from ui import ProgressTracker, format_duration
+
+
+class TestProgressTracker(TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.tracker = ProgressTracker(total=1000, window=10, clock=self.clock)
+
+    def test_rate_and_eta(self):
+        self.assertEqual(0.0, self.tracker.rate())
+        self.assertIsNone(self.tracker.eta())
+
+        for _ in range(4):
+            self.clock.now += 1
+            self.tracker.advance(50)
+        self.assertEqual(50.0, self.tracker.rate())
+        self.assertEqual(16.0, self.tracker.eta())
+        self.assertEqual('200/1000 processed, 50.0 titles/s, about 0m 16s left', self.tracker.summary())
+
+    def test_rate_only_covers_window(self):
+        for _ in range(20):
+            self.clock.now += 1
+            self.tracker.advance(10)
+        for _ in range(10):
+            self.clock.now += 1
+            self.tracker.advance(40)
+        self.assertEqual(40.0, self.tracker.rate())
+
+    def test_finished(self):
+        self.clock.now += 10
+        self.tracker.advance(1000)
+        self.clock.now += 100
+        self.assertTrue(self.tracker.finished())
+        self.assertEqual('1000/1000 processed, 100.0 titles/s', self.tracker.summary())
+
+    def test_format_duration(self):
+        self.assertEqual('2m 05s', format_duration(125))
+        self.assertEqual('1h 01m', format_duration(3660))